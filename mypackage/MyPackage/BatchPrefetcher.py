@@ -0,0 +1,215 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+import torch
+
+# Dataset owned by each process worker. Set once by the pool initializer so
+# the data is sent to every worker only once, not with every batch.
+_worker_dataset = None
+
+
+def _init_worker(dataset):
+    global _worker_dataset
+    _worker_dataset = dataset
+
+
+def _gather_worker(positions):
+    return _worker_dataset.gather(positions)
+
+
+class BatchPrefetcher(object):
+    def __init__(self,
+                 dataset,
+                 positions,
+                 batch_size,
+                 num_workers=1,
+                 worker_type='thread',
+                 max_prefetch=None,
+                 pin_memory=False,
+                 reuse_buffer=False):
+        """
+        Background batch pipeline. A pool of workers gathers batches from a
+        WindowDataset ahead of time and keeps a bounded queue of ready batches,
+        so data preparation overlaps with the forward/backward pass.
+        Batches are returned in the same order as positions.
+
+        Parameters
+        ----------
+        dataset : WindowDataset
+            Dataset to gather batches from
+
+        positions : iterator
+            Iterator yielding the start positions of each batch
+
+        batch_size : int
+            Maximum number of positions in one batch
+
+        num_workers : int, default : 1
+            Number of workers gathering batches
+
+        worker_type : str, default : thread
+            thread or process. Thread workers share the dataset, process
+            workers receive one copy of it when the pool starts, or only the
+            handles if it was built over SharedArray buffers.
+
+        max_prefetch : int, optional, default : None
+            Maximum number of batches prepared ahead. Defaults to 2 * num_workers
+
+        pin_memory : boolean, default : False
+            If True batches are placed in page-locked memory for fast host to
+            device copies. The arrays are views of pinned tensors, so
+            torch.from_numpy keeps them pinned. Batches of process workers are
+            pinned by a helper thread. Ignored when CUDA is not available.
+
+        reuse_buffer : boolean, default : False
+            If True thread workers write into a ring of preallocated buffers, and
+            with pin_memory process batches are copied into a pinned ring.
+            Each batch is only valid until the next one is requested. A pinned
+            slot is only overwritten after the device copies issued before the
+            next batch was requested have finished, so non_blocking copies are safe.
+
+        """
+
+        self.executor = None
+        self.pinner = None
+        self.queue = deque()
+
+        assert worker_type in ['thread', 'process'], \
+            'Not Implemented, choose on of the following options - thread, process'
+
+        self.dataset = dataset
+        self.positions = positions
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.worker_type = worker_type
+        self.max_prefetch = max_prefetch if max_prefetch is not None else 2 * num_workers
+        self.pin_memory = pin_memory and torch.cuda.is_available()
+
+        # The consumer holds one batch while max_prefetch are in flight, so a
+        # ring with one more slot is never overwritten while still in use.
+        self.buffers = None
+        if reuse_buffer and (worker_type == 'thread' or self.pin_memory):
+            self.buffers = [self.allocate() for _ in range(self.max_prefetch + 1)]
+        # Recorded when the consumer moves past a pinned slot, waited on before the slot is written again
+        self.events = [None] * len(self.buffers) if self.buffers is not None and self.pin_memory else None
+        self.submitted = 0
+
+        if worker_type == 'thread':
+            self.executor = ThreadPoolExecutor(num_workers)
+        else:
+            self.executor = ProcessPoolExecutor(num_workers,
+                                                initializer=_init_worker,
+                                                initargs=(dataset,))
+            if self.pin_memory:
+                # One thread keeps the batches in order and the pinning off the training loop
+                self.pinner = ThreadPoolExecutor(1)
+
+        for _ in range(self.max_prefetch):
+            self.submit()
+
+    def allocate(self):
+        buffers = list(self.dataset.allocate(self.batch_size))
+        if self.pin_memory:
+            buffers[0], buffers[1] = self.pin(buffers[0]), self.pin(buffers[1])
+        return tuple(buffers)
+
+    def submit(self):
+        # Copy the positions, they may be views of an array the producer reuses
+        positions = np.array(next(self.positions))
+
+        buffers, event = None, None
+        if self.buffers is not None:
+            slot = self.submitted % len(self.buffers)
+            buffers = self.buffers[slot]
+            event = self.events[slot] if self.events is not None else None
+
+        if self.worker_type == 'process':
+            future = self.executor.submit(_gather_worker, positions)
+            if self.pinner is not None:
+                future = self.pinner.submit(self.pin_result, future, buffers, event)
+        elif buffers is not None:
+            future = self.executor.submit(self.gather_into, positions, buffers, event)
+        else:
+            future = self.executor.submit(self.gather, positions)
+
+        self.queue.append(future)
+        self.submitted += 1
+
+    def gather(self,
+               positions):
+        batch = self.dataset.gather(positions)
+        if self.pin_memory:
+            batch = self.pin_batch(batch)
+        return batch
+
+    def gather_into(self,
+                    positions,
+                    buffers,
+                    event):
+        if event is not None:
+            event.synchronize()
+        return self.dataset.gather(positions, buffers)
+
+    def pin_result(self,
+                   future,
+                   buffers,
+                   event):
+        # Pin a batch gathered by a process worker, into the ring slot if buffers are reused
+        batch = future.result()
+
+        if buffers is None:
+            return self.pin_batch(batch)
+
+        if event is not None:
+            event.synchronize()
+
+        length = len(batch[0])
+        batch_x, batch_y = buffers[0][:length], buffers[1][:length]
+        np.copyto(batch_x, batch[0])
+        np.copyto(batch_y, batch[1])
+
+        return (batch_x, batch_y) + tuple(batch[2:])
+
+    def pin(self,
+            array):
+        return torch.from_numpy(array).pin_memory().numpy()
+
+    def pin_batch(self,
+                  batch):
+        # Only the inputs and labels are copied to the device
+        return (self.pin(batch[0]), self.pin(batch[1])) + tuple(batch[2:])
+
+    def close(self):
+        """
+        Stop the workers and drop the pending batches.
+
+        """
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            self.queue.clear()
+
+        if self.pinner is not None:
+            self.pinner.shutdown(wait=False, cancel_futures=True)
+            self.pinner = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        batch = self.queue.popleft().result()
+
+        if self.events is not None:
+            # The next submit reuses the slot of the previous batch, whose device copies are queued by now
+            event = torch.cuda.Event()
+            event.record()
+            self.events[self.submitted % len(self.buffers)] = event
+
+        self.submit()
+
+        return batch
+
+    def __del__(self):
+        self.close()
@@ -0,0 +1,257 @@
+import os, json, hashlib, shutil, tempfile
+
+import numpy as np
+import pandas as pd
+
+
+class DataCache(object):
+    def __init__(self,
+                 cache_dir,
+                 raw_data_path,
+                 chunked=False,
+                 **kwargs):
+        """
+        On-disk binary cache of a parsed DataFrame. Values and index are stored as
+        .npy files, so they can be loaded or memory-mapped without parsing the
+        source file again.
+
+        Parameters
+        ----------
+        cache_dir : str
+            Directory where cached datasets are stored
+
+        raw_data_path : str
+            Source data path. Path, modification time and size identify the cache entry
+
+        chunked : boolean, default : False
+            True if the entry is filled by save_chunks. Part of the cache key, chunked
+            entries store every column as float64 while save keeps the original dtypes
+
+        kwargs : kwargs given to pandas DataFrame loader. Also part of the cache key
+
+        """
+
+        stat = os.stat(raw_data_path)
+
+        key = json.dumps([os.path.abspath(raw_data_path),
+                          stat.st_mtime_ns,
+                          stat.st_size,
+                          chunked,
+                          sorted((name, repr(value)) for name, value in kwargs.items())])
+
+        self.cache_dir = cache_dir
+        self.key = hashlib.sha1(key.encode()).hexdigest()
+        self.path = os.path.join(cache_dir, self.key)
+
+    def exists(self):
+        return os.path.isfile(os.path.join(self.path, 'metadata.json'))
+
+    @staticmethod
+    def is_cacheable(dataframe):
+        """
+        Only single level indexes and numeric columns are cached.
+
+        """
+
+        # pandas dtype checks, np.issubdtype fails on extension dtypes such as strings
+        return dataframe.index.nlevels == 1 and \
+            all(pd.api.types.is_numeric_dtype(dtype) for dtype in dataframe.dtypes) and \
+            (isinstance(dataframe.index, pd.DatetimeIndex) or pd.api.types.is_numeric_dtype(dataframe.index.dtype))
+
+    @staticmethod
+    def metadata(dataframe, dtypes=None):
+        index = dataframe.index
+
+        return {'columns': list(dataframe.columns),
+                'dtypes': dtypes if dtypes is not None else [str(dtype) for dtype in dataframe.dtypes],
+                'index_name': index.name,
+                'index_type': 'datetime' if isinstance(index, pd.DatetimeIndex) else 'numeric',
+                'tz': str(index.tz) if getattr(index, 'tz', None) is not None else None}
+
+    @staticmethod
+    def index_values(index):
+        # Datetimes keep their resolution, stored as naive UTC when the index has a timezone
+        if getattr(index, 'tz', None) is not None:
+            index = index.tz_convert(None)
+
+        return np.asarray(index.values)
+
+    def commit(self,
+               temp_path,
+               metadata):
+        """
+        Move a fully written entry from temp_path in place.
+
+        """
+
+        with open(os.path.join(temp_path, 'metadata.json'), 'w') as file:
+            json.dump(metadata, file)
+
+        try:
+            os.rename(temp_path, self.path)
+        except OSError:
+            # Other process already stored this entry
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    def save(self,
+             dataframe):
+        """
+        Store the DataFrame in the cache. The entry is written to a temporary
+        directory and moved in place, so readers never see a partial entry.
+
+        Returns
+        -------
+        True if the DataFrame was cached
+
+        """
+
+        if not self.is_cacheable(dataframe):
+            return False
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        temp_path = tempfile.mkdtemp(dir=self.cache_dir)
+
+        np.save(os.path.join(temp_path, 'values.npy'), np.ascontiguousarray(dataframe.values))
+        np.save(os.path.join(temp_path, 'index.npy'), self.index_values(dataframe.index))
+
+        self.commit(temp_path, self.metadata(dataframe))
+
+        return True
+
+    def save_chunks(self,
+                    chunks,
+                    dtype='float64'):
+        """
+        Store a DataFrame given as an iterable of chunks, for example from
+        pd.read_csv(chunksize=...). Only one chunk is in memory at a time.
+
+        Parameters
+        ----------
+        chunks : iterable of pd.DataFrame
+
+        dtype : str, default : float64
+            Type used to store all columns
+
+        Returns
+        -------
+        True if the DataFrame was cached
+
+        """
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        temp_path = tempfile.mkdtemp(dir=self.cache_dir)
+
+        metadata = None
+        index_dtype = None
+        length = 0
+
+        # Rows are appended to raw files first, the .npy headers need the final length
+        with open(os.path.join(temp_path, 'values.raw'), 'wb') as values_file, \
+                open(os.path.join(temp_path, 'index.raw'), 'wb') as index_file:
+            for chunk in chunks:
+                if not self.is_cacheable(chunk):
+                    shutil.rmtree(temp_path, ignore_errors=True)
+                    return False
+
+                index = self.index_values(chunk.index)
+
+                if metadata is None:
+                    metadata = self.metadata(chunk, [dtype] * len(chunk.columns))
+                    index_dtype = index.dtype
+
+                np.ascontiguousarray(chunk.values, dtype=dtype).tofile(values_file)
+                np.ascontiguousarray(index, dtype=index_dtype).tofile(index_file)
+                length += len(chunk)
+
+        if metadata is None:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            return False
+
+        self.raw_to_npy(os.path.join(temp_path, 'values.raw'),
+                        os.path.join(temp_path, 'values.npy'),
+                        np.dtype(dtype),
+                        (length, len(metadata['columns'])))
+        self.raw_to_npy(os.path.join(temp_path, 'index.raw'),
+                        os.path.join(temp_path, 'index.npy'),
+                        index_dtype,
+                        (length,))
+
+        self.commit(temp_path, metadata)
+
+        return True
+
+    @staticmethod
+    def raw_to_npy(raw_path,
+                   npy_path,
+                   dtype,
+                   shape):
+        """
+        Prepend a .npy header to a raw C-ordered array file, copying in blocks.
+
+        """
+
+        header = {'descr': np.lib.format.dtype_to_descr(dtype),
+                  'fortran_order': False,
+                  'shape': shape}
+
+        with open(npy_path, 'wb') as npy_file, open(raw_path, 'rb') as raw_file:
+            np.lib.format.write_array_header_1_0(npy_file, header)
+            shutil.copyfileobj(raw_file, npy_file, 2 ** 24)
+
+        os.remove(raw_path)
+
+    def load_metadata(self):
+        with open(os.path.join(self.path, 'metadata.json'), 'r') as file:
+            return json.load(file)
+
+    def load_index(self):
+        metadata = self.load_metadata()
+        index = np.load(os.path.join(self.path, 'index.npy'))
+
+        if metadata['index_type'] == 'datetime':
+            index = pd.DatetimeIndex(index, name=metadata['index_name'])
+            if metadata['tz'] is not None:
+                index = index.tz_localize('UTC').tz_convert(metadata['tz'])
+        else:
+            index = pd.Index(index, name=metadata['index_name'])
+
+        return index
+
+    def load(self,
+             mmap_mode=None):
+        """
+        Load cached values, index and columns.
+
+        Parameters
+        ----------
+        mmap_mode : str, optional, default : None
+            If given values are memory-mapped with this mode instead of read in memory
+
+        Returns
+        -------
+        values : np.array
+
+        index : pd.Index
+
+        columns : list
+
+        """
+
+        values = np.load(os.path.join(self.path, 'values.npy'), mmap_mode=mmap_mode)
+
+        return values, self.load_index(), self.load_metadata()['columns']
+
+    def load_dataframe(self):
+        values, index, columns = self.load()
+        dtypes = self.load_metadata()['dtypes']
+
+        dataframe = pd.DataFrame(values, index=index, columns=columns)
+
+        if any(dtype != str(values.dtype) for dtype in dtypes):
+            dataframe = dataframe.astype(dict(zip(columns, dtypes)))
+
+        return dataframe
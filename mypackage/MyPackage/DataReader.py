@@ -1,4 +1,4 @@
-import os, datetime, time
+import os, datetime, time, hashlib, pickle, shutil, tempfile
 
 import numpy as np
 import pandas as pd
@@ -6,6 +6,14 @@ import pandas as pd
 from sklearn.preprocessing import MinMaxScaler, StandardScaler
 from functools import wraps
 
+from MyPackage.DataCache import DataCache
+from MyPackage.WindowDataset import WindowDataset
+from MyPackage.DeviceWindowDataset import DeviceWindowDataset
+from MyPackage.BatchPrefetcher import BatchPrefetcher
+from MyPackage.Shuffler import Shuffler
+from MyPackage.SeriesNormalizer import SeriesNormalizer
+from MyPackage.SharedArray import SharedArray
+
 SEED = 1337
 
 
@@ -29,6 +37,13 @@ class DataReader(object):
 
     def __init__(self,
                  raw_data_path,
+                 cache_dir=None,
+                 backend='pandas',
+                 chunksize=None,
+                 seed=SEED,
+                 shuffle_block_size=None,
+                 panel=None,
+                 series_column=None,
                  **kwargs):
 
         """
@@ -40,6 +55,42 @@ class DataReader(object):
                         Data path. Currently accept csv, parquet, hdf5,
                         pickle, txt and xlsx extension. yo
 
+        cache_dir : string, optional, default : None
+                    Directory for the binary cache of the parsed data. If given the
+                    parsed DataFrame is stored there on first load and reloaded
+                    from it while the source file and loader kwargs are unchanged.
+
+        backend : string, optional, default : pandas
+                  pandas loads the whole file into a DataFrame.
+                  memmap serves the data from a memory-mapped copy in cache_dir,
+                  so series larger than memory can be used. Only the index is
+                  kept in memory. Requires cache_dir.
+
+        chunksize : int, optional, default : None
+                    If given csv and txt files are parsed chunksize rows at a time and
+                    streamed into the cache, so the file is never fully parsed in
+                    memory. All columns are stored as float64. Requires the memmap
+                    backend, the pandas backend would load the whole cache back into
+                    memory and only the parsing would be bounded.
+
+        seed : int, optional, default : 1337
+               Seed of the training shuffler. Every epoch draws its own order from it.
+
+        shuffle_block_size : int, optional, default : None
+                             If given training windows are shuffled in contiguous blocks
+                             of this size for cache locality, see Shuffler.
+
+        panel : string, optional, default : None
+                Load many series from one file. long expects one row per series and
+                timestamp with the series id in series_column. wide expects one column
+                per series, stacked into a single feature column named value.
+                Series are stored one after the other, windows never cross two series
+                and every series gets its own normalization statistics.
+                Requires the pandas backend.
+
+        series_column : string, optional, default : None
+                        Column with the series id of each row. Required by long panels.
+
         kwargs : kwargs to pandas DataFrame loader
 
 
@@ -50,12 +101,65 @@ class DataReader(object):
         assert raw_data_path.lower().endswith(('.csv', '.parquet', '.hdf5', '.pickle', '.txt', '.xlsx')) is True, \
             'This class can\'t handle this extension. Please specify a .csv, .parquet, .hdf5, .pickle extension'
 
+        assert backend in ['pandas', 'memmap'], \
+            'Not Implemented, choose on of the following options - pandas, memmap'
+        assert backend == 'pandas' or cache_dir is not None, \
+            'The memmap backend reads from the data cache. Please specify a cache_dir'
+        assert chunksize is None or backend == 'memmap', \
+            'Chunked loading only bounds memory with the memmap backend. Please specify backend=memmap'
+        assert chunksize is None or raw_data_path.lower().endswith(('.csv', '.txt')), \
+            'Chunked loading is only available for .csv and .txt files'
+        assert panel in [None, 'long', 'wide'], \
+            'Not Implemented, choose on of the following options - long, wide'
+        assert panel is None or backend == 'pandas', \
+            'Panel datasets are only available with the pandas backend'
+        assert panel != 'long' or series_column is not None, \
+            'Long panels need the series_column with the series id of each row'
+
         self.raw_data_path = raw_data_path
+        self.backend = backend
 
         self.loader = self.loader_engine(**kwargs)
+        self.cache = DataCache(cache_dir, raw_data_path, chunked=chunksize is not None, **kwargs) \
+            if cache_dir is not None else None
+
+        if chunksize is not None and not self.cache.exists():
+            assert self.cache.save_chunks(pd.read_csv(raw_data_path, chunksize=chunksize, **kwargs)), \
+                'Chunked loading only handles numeric columns and a datetime or numeric index'
+
+        if self.backend == 'pandas':
+            if self.cache is not None and self.cache.exists():
+                self.data = self.cache.load_dataframe()
+            else:
+                self.data = self.loader()
+                if self.cache is not None:
+                    self.cache.save(self.data)
+
+            self.series_names, self.series_offsets = None, None
+            if panel is not None:
+                self.data, self.series_names, self.series_offsets = self.panel_frame(self.data, panel, series_column)
+
+            self.values = self.data.values
+            self.index = self.data.index
+            self.columns = list(self.data.columns)
+        else:
+            if not self.cache.exists():
+                assert self.cache.save(self.loader()), \
+                    'The memmap backend only handles numeric columns and a datetime or numeric index'
+
+            # The whole DataFrame is never built, every method reads from the mapping
+            self.data = None
+            self.values, self.index, self.columns = self.cache.load(mmap_mode='r')
+            self.series_names, self.series_offsets = None, None
+
+        self.length = len(self.index)
 
-        self.data = self.loader()
-        self.length = len(self.data)
+        if self.series_offsets is not None:
+            self.number_series = len(self.series_names)
+            self.series = np.repeat(np.arange(self.number_series), np.diff(self.series_offsets))
+        else:
+            self.number_series = 1
+            self.series = None
 
         self.look_back = None
         self.look_further = None
@@ -73,6 +177,11 @@ class DataReader(object):
         self.test_steps = None
 
         self.normalizer = None
+        self.normalized = {}
+        self.window_datasets = {}
+        self.shared_arrays = {}
+
+        self.shuffler = Shuffler(seed, shuffle_block_size)
 
     def loader_engine(self, **kwargs):
         """
@@ -102,6 +211,112 @@ class DataReader(object):
         elif self.raw_data_path.lower().endswith('.xlsx'):
             return lambda: pd.read_excel(self.raw_data_path, **kwargs)
 
+    @staticmethod
+    def panel_frame(data,
+                    panel,
+                    series_column=None):
+        """
+        Reorder a panel DataFrame so each series is one contiguous block of rows,
+        sorted by time.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Long or wide panel DataFrame
+
+        panel : string
+            long or wide
+
+        series_column : string, optional, default : None
+            Column with the series id of each row in long panels
+
+        Returns
+        -------
+        data : pd.DataFrame
+            Series stacked one after the other
+
+        series_names : list
+            Name of each series
+
+        series_offsets : np.array
+            First row of each series, followed by the number of rows
+
+        """
+
+        if panel == 'wide':
+            series_names = list(data.columns)
+            counts = np.full(len(series_names), len(data))
+            data = pd.DataFrame({'value': data.values.T.reshape(-1)},
+                                index=data.index[np.tile(np.arange(len(data)), len(series_names))])
+        else:
+            codes, series_names = pd.factorize(data[series_column], sort=True)
+            order = np.lexsort((data.index.values, codes))
+            data = data.drop(columns=series_column).iloc[order]
+            counts = np.bincount(codes, minlength=len(series_names))
+            series_names = list(series_names)
+
+        return data, series_names, np.concatenate([[0], np.cumsum(counts)])
+
+    def segments(self):
+        """
+        First and last + 1 rows of each series. A single segment if the data is not a panel.
+
+        """
+
+        if self.series_offsets is None:
+            return [(0, self.length)]
+
+        return list(zip(self.series_offsets[:-1], self.series_offsets[1:]))
+
+    def window_positions(self,
+                         indexes,
+                         drop,
+                         shift=0):
+        """
+        Start positions of the windows of a split. The last drop indexes of every
+        series are removed and the rest is shifted back by shift rows.
+
+        """
+
+        if self.series is None:
+            return indexes[:-drop] - shift
+
+        series = self.series[indexes]
+        ends = np.concatenate([np.flatnonzero(np.diff(series)) + 1, [len(indexes)]])
+        end = np.repeat(ends, np.diff(np.concatenate([[0], ends])))
+
+        positions = indexes[np.arange(len(indexes)) < end - drop] - shift
+
+        assert len(positions) == 0 or np.all(self.series[positions] == self.series[positions + shift]), \
+            'Each series needs at least look_back rows before its validation and test sets'
+
+        return positions
+
+    def rows(self,
+             indexes):
+        """
+        Values of the rows in indexes position. Contiguous indexes are returned
+        as a slice, so with the memmap backend only those rows are read.
+
+        """
+
+        if len(indexes) > 0 and np.all(np.diff(indexes) == 1):
+            return self.values[indexes[0]:indexes[-1] + 1]
+
+        return self.values[indexes]
+
+    def frame(self,
+              indexes):
+        """
+        DataFrame with the rows in indexes position.
+
+        """
+
+        if self.data is not None:
+            return self.data.iloc[indexes]
+
+        return pd.DataFrame(np.asarray(self.rows(indexes)), index=self.index[indexes], columns=self.columns)
+
     def split(self,
               split1,
               split2=None,
@@ -129,37 +344,36 @@ class DataReader(object):
 
         """
 
-        arr = np.arange(self.length)
+        splits = []
 
-        if split2 is None:
+        # Panel series are split one by one, each set holds the same share of every series
+        for start, stop in self.segments():
+            arr = np.arange(start, stop)
+            length = stop - start
 
-            assert split1 < 1, "split should be smaller than 1"
+            if split2 is None:
 
-            split = self.length - int(self.length * split1)
+                assert split1 < 1, "split should be smaller than 1"
 
-            train_index = arr[:split]
-            validation_index = arr[split:]
+                split = length - int(length * split1)
+
+                splits.append((arr[:split], arr[split:]))
 
-            if return_df:
-                return self.data.iloc[train_index], self.data.iloc[validation_index]
             else:
-                return train_index, validation_index
 
-        else:
+                assert split1 + split2 < 1, "split1 + split2 should be smaller than 1"
 
-            assert split1 + split2 < 1, "split1 + split2 should be smaller than 1"
+                split_1 = int(length * split1)
+                split_2 = int(length * (split1 + split2))
 
-            split_1 = int(self.length * split1)
-            split_2 = int(self.length * (split1 + split2))
+                splits.append((arr[:split_1], arr[split_1:split_2], arr[split_2:]))
 
-            train_index = arr[:split_1]
-            validation_index = arr[split_1:split_2]
-            test_index = arr[split_2:]
+        indexes = [np.concatenate(split) for split in zip(*splits)]
 
-            if return_df:
-                return self.data.iloc[train_index], self.data.iloc[validation_index], self.data.iloc[test_index]
-            else:
-                return train_index, validation_index, test_index
+        if return_df:
+            return tuple(self.frame(index) for index in indexes)
+        else:
+            return tuple(indexes)
 
     def split_date(self,
                    split_date1,
@@ -184,36 +398,45 @@ class DataReader(object):
                 If True return DataFrames train, validation, (test)
 
         """
-        assert isinstance(self.data.index, pd.DatetimeIndex), \
+        assert isinstance(self.index, pd.DatetimeIndex), \
             'Index should be an DatetimeIndex type'
 
-        if split_date2 is None:
-            validation_split = pd.to_datetime(split_date1)
-            validation_range = len(self.data.loc[validation_split:])
+        splits = []
+
+        # Panel series are split one by one on their own time index
+        for start, stop in self.segments():
+            index = self.index[start:stop]
+            length = stop - start
+
+            if split_date2 is None:
+                validation_split = pd.to_datetime(split_date1)
+                validation_range = length - index.searchsorted(validation_split, side='left')
+
+                train_index = np.arange(start, stop - validation_range)
+                validation_index = np.arange(stop - validation_range, stop)
 
-            train_index = np.arange(self.length - validation_range)
-            validation_index = np.arange(self.length - validation_range, self.length)
+                splits.append((train_index, validation_index))
 
-            if return_df:
-                return self.data.iloc[train_index], self.data.iloc[validation_index]
             else:
-                return train_index, validation_index
+                validation_split = pd.to_datetime(split_date1)
+                test_split = pd.to_datetime(split_date2)
 
-        else:
-            validation_split = pd.to_datetime(split_date1)
-            test_split = pd.to_datetime(split_date2)
+                validation_range = index.searchsorted(test_split, side='right') - \
+                    index.searchsorted(validation_split, side='left') - 1
+                test_range = length - index.searchsorted(test_split, side='left')
 
-            validation_range = len(self.data.loc[validation_split:test_split]) - 1
-            test_range = len(self.data.loc[test_split:])
+                train_index = np.arange(start, stop - validation_range - test_range)
+                validation_index = np.arange(stop - validation_range - test_range, stop - test_range)
+                test_index = np.arange(stop - test_range, stop)
 
-            train_index = np.arange(self.length - validation_range - test_range)
-            validation_index = np.arange(self.length - validation_range - test_range, self.length - test_range)
-            test_index = np.arange(self.length - test_range, self.length)
+                splits.append((train_index, validation_index, test_index))
 
-            if return_df:
-                return self.data.iloc[train_index], self.data.iloc[validation_index], self.data.iloc[test_index]
-            else:
-                return train_index, validation_index, test_index
+        indexes = [np.concatenate(split) for split in zip(*splits)]
+
+        if return_df:
+            return tuple(self.frame(index) for index in indexes)
+        else:
+            return tuple(indexes)
 
     def split_dataset(self,
                       split1,
@@ -263,12 +486,16 @@ class DataReader(object):
 
         normalizer : string, optional, default : None
             Sklearn preprocessing normalizer. Standarization and Min-Max scaler Implemented
+            The whole dataset is normalized once after fitting and shared by all generators
         -------
 
         """
 
         self.look_back = look_back
         self.look_further = look_further
+        self.normalized = {}
+        self.window_datasets = {}
+        self.release_shared()
 
         if test_split is None:
 
@@ -277,8 +504,12 @@ class DataReader(object):
             self.train_length = len(self.train_indexes)
             self.validation_length = len(self.validation_indexes)
 
-            self.train_steps = round((self.train_length - self.look_back - self.look_further + 1) / batch_size + 0.5)
-            self.validation_steps = round((self.validation_length - self.look_further + 1) / batch_size + 0.5)
+            # Every panel series loses its own look_back and look_further rows
+            windows_lost = self.number_series * (self.look_back + self.look_further)
+
+            self.train_steps = round((self.train_length - windows_lost + 1) / batch_size + 0.5)
+            self.validation_steps = round((self.validation_length - self.number_series * self.look_further + 1) /
+                                          batch_size + 0.5)
         else:
             self.train_indexes, self.validation_indexes, self.test_indexes = self.split_dataset(validation_split,
                                                                                                 test_split)
@@ -287,15 +518,17 @@ class DataReader(object):
             self.validation_length = len(self.validation_indexes) - 1
             self.test_length = len(self.test_indexes) - 1
 
-            self.train_steps = round((len(self.train_indexes) - self.look_back - self.look_further) / batch_size + 0.5)
-            self.validation_steps = round((len(self.validation_indexes) - self.look_further) / batch_size + 0.5)
-            self.test_steps = round((len(self.test_indexes) - self.look_further) / batch_size + 0.5)
+            windows_lost = self.number_series * (self.look_back + self.look_further)
+
+            self.train_steps = round((len(self.train_indexes) - windows_lost) / batch_size + 0.5)
+            self.validation_steps = round((len(self.validation_indexes) - self.number_series * self.look_further) /
+                                          batch_size + 0.5)
+            self.test_steps = round((len(self.test_indexes) - self.number_series * self.look_further) /
+                                    batch_size + 0.5)
 
         if normalizer is not None:
-            if normalizer == 'Standardization':
-                self.normalizer = StandardScaler().fit(self.data.iloc[self.train_indexes])
-            elif normalizer == 'MixMaxScaler':
-                self.normalizer = MinMaxScaler(feature_range=(-1, 1)).fit(self.data.iloc[self.train_indexes])
+            self.normalizer = self.fit_normalizer(normalizer, self.train_indexes)
+            self.normalized_data()
 
     def preprocessing_data_cv(self,
                               look_back,
@@ -329,33 +562,562 @@ class DataReader(object):
 
         normalizer : string, optional, default : None
             Sklearn preprocessing normalizer. Standarization and Min-Max scaler Implemented
+            The whole dataset is normalized once after fitting and shared by all generators
         -------
 
         """
 
         self.look_back = look_back
         self.look_further = look_further
+        self.normalized = {}
+        self.window_datasets = {}
+        self.release_shared()
 
         self.train_indexes, self.validation_indexes = cv_train_indexes, cv_val_indexes
 
         self.train_length = len(self.train_indexes) - 1
         self.validation_length = len(self.validation_indexes) - 1
 
-        self.train_steps = round((self.train_length - self.look_back - self.look_further) / batch_size + 0.5)
-        self.validation_steps = round((self.validation_length - self.look_further) / batch_size + 0.5)
+        # Every panel series loses its own look_back and look_further rows
+        windows_lost = self.number_series * (self.look_back + self.look_further)
+
+        self.train_steps = round((self.train_length - windows_lost) / batch_size + 0.5)
+        self.validation_steps = round((self.validation_length - self.number_series * self.look_further) /
+                                      batch_size + 0.5)
 
         if normalizer is not None:
-            if normalizer == 'Standardization':
-                self.normalizer = StandardScaler().fit(self.data.iloc[self.train_indexes])
-            elif normalizer == 'MixMaxScaler':
-                self.normalizer = MinMaxScaler(feature_range=(-1, 1)).fit(self.data.iloc[self.train_indexes])
+            self.normalizer = self.fit_normalizer(normalizer, self.train_indexes)
+            self.normalized_data()
+
+    def fit_normalizer(self,
+                       normalizer,
+                       indexes,
+                       chunk_size=2 ** 16):
+        """
+        Fit the normalizer incrementally with partial_fit, chunk_size rows at a
+        time. Peak memory stays bounded by the chunk size instead of the size of
+        the training set.
+
+        Parameters
+        ----------
+        normalizer : string
+            Sklearn preprocessing normalizer. Standarization and Min-Max scaler Implemented
+
+        indexes : np.array
+            Positions of the rows to fit on
+
+        chunk_size : int, default : 65536
+            Number of rows read at once
+
+        Returns
+        -------
+        Fitted sklearn normalizer, or a SeriesNormalizer for panel datasets
+
+        """
+
+        if normalizer not in ['Standardization', 'MixMaxScaler']:
+            return None
+
+        if self.series is not None:
+            # One set of statistics per panel series
+            scaler = SeriesNormalizer(normalizer, self.number_series)
+            for start in range(0, len(indexes), chunk_size):
+                chunk = indexes[start:start + chunk_size]
+                scaler.partial_fit(self.rows(chunk), self.series[chunk])
+            return scaler
+
+        if normalizer == 'Standardization':
+            scaler = StandardScaler()
+        else:
+            scaler = MinMaxScaler(feature_range=(-1, 1))
+
+        for start in range(0, len(indexes), chunk_size):
+            scaler.partial_fit(self.rows(indexes[start:start + chunk_size]))
+
+        return scaler
+
+    def target_affine(self,
+                      target):
+        """
+        Affine map the fitted normalizer applies to the target column, so that
+        normalized = values * scale + offset.
+
+        Parameters
+        ----------
+        target : string
+            Column name from our target column (column to predict).
+
+        Returns
+        -------
+        scale, offset : float, or np.array with one value per series for panel datasets
+
+        """
+
+        position = self.columns.index(target)
+
+        if isinstance(self.normalizer, SeriesNormalizer):
+            return self.normalizer.scale_[:, position], self.normalizer.min_[:, position]
+
+        if isinstance(self.normalizer, StandardScaler):
+            scale = 1. / self.normalizer.scale_[position]
+            return scale, -self.normalizer.mean_[position] * scale
+
+        return self.normalizer.scale_[position], self.normalizer.min_[position]
+
+    def normalize_target(self,
+                         values,
+                         target,
+                         series=None):
+        """
+        Normalize target values with the fitted statistics of the target column.
+        For panel datasets series gives the series id of each row of values.
+
+        """
+
+        scale, offset = self.series_affine(target, series)
+
+        return np.asarray(values) * scale + offset
+
+    def denormalize_target(self,
+                           values,
+                           target,
+                           series=None):
+        """
+        Map normalized target values, e.g. predictions, back to the original scale.
+        For panel datasets series gives the series id of each row of values.
+
+        """
+
+        scale, offset = self.series_affine(target, series)
+
+        return (np.asarray(values) - offset) / scale
+
+    def series_affine(self,
+                      target,
+                      series=None):
+        scale, offset = self.target_affine(target)
+
+        if isinstance(self.normalizer, SeriesNormalizer):
+            assert series is not None, 'Panel datasets need the series id of each row'
+            # Broadcast over the trailing dimensions, e.g. the predicted steps
+            series = np.asarray(series).reshape(-1, 1)
+            return scale[series], offset[series]
+
+        return scale, offset
+
+    def window_dataset(self,
+                       target,
+                       normalize=True,
+                       return_series=False,
+                       shared=False):
+        """
+        Expose the normalized dataset as a WindowDataset.
+        The dataset is built once per preprocessing and shared by all generators,
+        so train, validation and test windows are strided views over the same buffer.
+
+        Parameters
+        ----------
+        target : string
+            Column name from our target column (column to predict).
+
+        normalize : boolean, default : True
+            If True apply normalization fo the data
+
+        return_series : boolean, default : False
+            If True batches also hold the series id of each window. Panel datasets only
+
+        shared : boolean, default : False
+            If True the dataset is built over the arrays published by share, so
+            process workers attach to them instead of receiving a copy
+
+        Returns
+        -------
+        WindowDataset
+
+        """
+
+        assert not return_series or self.series is not None, 'Series ids are only available for panel datasets'
+
+        key = (target, normalize, return_series, shared)
+
+        if key not in self.window_datasets:
+            if shared:
+                data, labels = self.share(target, normalize)
+                series = self.shared_array('series', self.series) if return_series else None
+            else:
+                data = self.normalized_data(normalize)
+                labels = self.target_labels(data, target)
+                series = self.series if return_series else None
+
+            self.window_datasets[key] = WindowDataset(data,
+                                                      labels,
+                                                      self.look_back,
+                                                      self.look_further,
+                                                      series=series)
+
+        return self.window_datasets[key]
+
+    def device_dataset(self,
+                       target,
+                       device,
+                       normalize=True,
+                       return_series=False):
+        """
+        Upload the normalized dataset once to device as a DeviceWindowDataset.
+        Cached like window_dataset, until the next preprocessing.
+
+        Parameters
+        ----------
+        target : string
+            Column name from our target column (column to predict).
+
+        device : torch.device or str
+            Training device
+
+        normalize : boolean, default : True
+            If True apply normalization fo the data
+
+        return_series : boolean, default : False
+            If True batches also hold the series id of each window. Panel datasets only
+
+        Returns
+        -------
+        DeviceWindowDataset
+
+        """
+
+        assert not return_series or self.series is not None, 'Series ids are only available for panel datasets'
+
+        key = (target, normalize, return_series, str(device))
+
+        if key not in self.window_datasets:
+            data = self.normalized_data(normalize)
+
+            self.window_datasets[key] = DeviceWindowDataset(data,
+                                                            self.target_labels(data, target),
+                                                            self.look_back,
+                                                            self.look_further,
+                                                            device,
+                                                            series=self.series if return_series else None)
+
+        return self.window_datasets[key]
+
+    def normalized_data(self,
+                        normalize=True,
+                        chunk_size=2 ** 16):
+        """
+        Normalize the whole dataset once, in chunks, into a float32 array. The
+        array is kept until the next preprocessing. With the memmap backend it is
+        a memory-mapped file next to the cached data, so it is never fully in
+        memory and is reused while the normalizer is unchanged.
+
+        Parameters
+        ----------
+        normalize : boolean, default : True
+            If True apply normalization fo the data
+
+        chunk_size : int, default : 65536
+            Number of rows normalized at once
+
+        Returns
+        -------
+        Array with shape (length, number of features)
+
+        """
+
+        if normalize in self.normalized:
+            return self.normalized[normalize]
+
+        if self.backend == 'memmap':
+            key = hashlib.sha1(pickle.dumps(self.normalizer if normalize else None)).hexdigest()
+            path = os.path.join(self.cache.path, 'normalized_' + key)
+
+            if not os.path.isdir(path):
+                temp_path = tempfile.mkdtemp(dir=self.cache.path)
+                data = np.lib.format.open_memmap(os.path.join(temp_path, 'data.npy'), mode='w+',
+                                                 dtype='float32', shape=self.values.shape)
+                self.normalize_chunks(data, normalize, chunk_size)
+                data.flush()
+                del data
+                try:
+                    os.rename(temp_path, path)
+                except OSError:
+                    # Other process already normalized the data with the same normalizer
+                    shutil.rmtree(temp_path, ignore_errors=True)
+
+            data = np.load(os.path.join(path, 'data.npy'), mmap_mode='r')
+        else:
+            data = np.empty(self.values.shape, dtype='float32')
+            self.normalize_chunks(data, normalize, chunk_size)
+
+        self.normalized[normalize] = data
+
+        return data
+
+    def share(self,
+              target,
+              normalize=True):
+        """
+        Publish the normalized data and the target labels for other processes.
+        Each array is copied once into shared memory, or referenced in
+        place with the memmap backend, and the handles are kept until the next
+        preprocessing. Workers receiving a handle attach to the same memory, so
+        adding workers does not multiply memory use.
+
+        Parameters
+        ----------
+        target : string
+            Column name from our target column (column to predict).
+
+        normalize : boolean, default : True
+            If True apply normalization fo the data
+
+        Returns
+        -------
+        data, labels : SharedArray
+            Use attach to get the arrays
+
+        """
+
+        data = self.normalized_data(normalize)
+
+        if ('data', normalize) not in self.shared_arrays:
+            # This process also reads from the shared memory, the private copy is dropped
+            self.normalized[normalize] = self.shared_array(('data', normalize), data).attach()
+
+        if ('labels', target, normalize) not in self.shared_arrays:
+            self.shared_array(('labels', target, normalize), self.target_labels(data, target))
+
+        return (self.shared_array(('data', normalize), data),
+                self.shared_arrays[('labels', target, normalize)])
+
+    def share_index(self):
+        """
+        Publish the index values for other processes, like share. Only numeric
+        and datetime indexes can be shared, a timezone aware index is published
+        as UTC datetime64.
+
+        Returns
+        -------
+        index : SharedArray
+            Use attach to get the index values
+
+        """
+
+        index = np.asarray(self.index.values)
+        assert index.dtype != object, 'Only numeric and datetime indexes can be shared'
+
+        return self.shared_array('index', index)
+
+    def shared_array(self,
+                     key,
+                     array):
+
+        if key not in self.shared_arrays:
+            self.shared_arrays[key] = SharedArray(array)
+
+        return self.shared_arrays[key]
+
+    def release_shared(self):
+        """
+        Free the arrays published by share. Processes already attached keep their mapping.
+
+        """
+
+        for handle in self.shared_arrays.values():
+            handle.unlink()
+
+        self.shared_arrays = {}
+
+    def normalize_chunks(self,
+                         out,
+                         normalize,
+                         chunk_size):
+        for start in range(0, self.length, chunk_size):
+            values = self.values[start:start + chunk_size]
+
+            if normalize and self.series is not None:
+                values = self.normalizer.transform(values, self.series[start:start + chunk_size])
+            elif normalize:
+                values = self.normalizer.transform(values)
+
+            out[start:start + chunk_size] = values
+
+    def target_labels(self,
+                      data,
+                      target):
+        """
+        Target column of the normalized data. Each column is normalized with its
+        own statistics, so this is the target normalized with the target mean/scale.
+        With the memmap backend the column is stored once as its own file.
+
+        """
+
+        position = self.columns.index(target)
+
+        if not isinstance(data, np.memmap):
+            return np.ascontiguousarray(data[:, position])
+
+        path = os.path.join(os.path.dirname(data.filename), 'labels_%d.npy' % position)
+
+        if not os.path.isfile(path):
+            temp_file, temp_path = tempfile.mkstemp(suffix='.npy', dir=os.path.dirname(path))
+            os.close(temp_file)
+            labels = np.lib.format.open_memmap(temp_path, mode='w+', dtype='float32', shape=(self.length,))
+            for start in range(0, self.length, 2 ** 16):
+                labels[start:start + 2 ** 16] = data[start:start + 2 ** 16, position]
+            labels.flush()
+            del labels
+            os.replace(temp_path, path)
+
+        return np.load(path, mmap_mode='r')
+
+    def batch_positions(self,
+                        indexes,
+                        batch_size,
+                        shuffle=False,
+                        allow_smaller_batch=True):
+        """
+        Generator of the start positions of each batch.
+
+        Parameters
+        ----------
+        indexes : np.array
+            Start positions of each sample window
+
+        batch_size : int
+
+        shuffle : boolean, default : False
+            If True shuffle data
+
+        allow_smaller_batch : boolean, default : True
+            If True last batch from each epoch can be smaller
+
+        """
+
+        while True:
+            # Each epoch draws a new permutation from the shuffler, indexes is never modified
+            permutation = self.shuffler.permutation(len(indexes)) if shuffle else None
+
+            for start in range(0, len(indexes), batch_size):
+                if permutation is None:
+                    positions = indexes[start:start + batch_size]
+                else:
+                    positions = indexes[permutation[start:start + batch_size]]
+
+                if len(positions) < batch_size and not allow_smaller_batch:
+                    break
+
+                yield positions
+
+    def batch_generator(self,
+                        indexes,
+                        batch_size,
+                        target,
+                        shuffle=False,
+                        allow_smaller_batch=True,
+                        normalize=True,
+                        reuse_buffer=False,
+                        num_workers=0,
+                        worker_type='thread',
+                        pin_memory=False,
+                        return_series=False,
+                        device=None):
+        """
+        Vectorized batch generator. Each batch is gathered from the window views
+        with a single fancy indexing operation.
+
+        Parameters
+        ----------
+        indexes : np.array
+            Start positions of each sample window
+
+        batch_size : int
+
+        target : string
+            Column name from our target column (column to predict).
+
+        shuffle : boolean, default : False
+            If True shuffle data
+
+        allow_smaller_batch : boolean, default : True
+            If True last batch from each epoch can be smaller
+
+        normalize : boolean, default : True
+            If True apply normalization fo the data
+
+        reuse_buffer : boolean, default : False
+            If True every batch is written into the same preallocated buffers.
+            Each yielded batch is only valid until the next one is requested.
+
+        num_workers : int, default : 0
+            If bigger than 0 batches are prepared in the background by a
+            BatchPrefetcher with this number of workers
+
+        worker_type : str, default : thread
+            Prefetching workers type. thread or process
+
+        pin_memory : boolean, default : False
+            If True prefetched batches are placed in page-locked memory
+
+        return_series : boolean, default : False
+            If True yield (X, Y, series ids) batches. Panel datasets only
+
+        device : torch.device or str, optional, default : None
+            If given the dataset is uploaded once to this device and batches are
+            gathered there as torch tensors. Workers and buffers are not used.
+
+        """
+
+        positions = self.batch_positions(indexes, batch_size, shuffle, allow_smaller_batch)
+
+        if device is not None:
+            return self.gather_batches(self.device_dataset(target, device, normalize, return_series),
+                                       positions,
+                                       batch_size)
+
+        # Process workers attach to the shared arrays instead of copying the dataset
+        dataset = self.window_dataset(target, normalize, return_series,
+                                      shared=num_workers > 0 and worker_type == 'process')
+
+        if num_workers > 0:
+            return BatchPrefetcher(dataset,
+                                   positions,
+                                   batch_size,
+                                   num_workers=num_workers,
+                                   worker_type=worker_type,
+                                   pin_memory=pin_memory,
+                                   reuse_buffer=reuse_buffer)
+
+        return self.gather_batches(dataset, positions, batch_size, reuse_buffer)
+
+    @staticmethod
+    def gather_batches(dataset,
+                       positions,
+                       batch_size,
+                       reuse_buffer=False):
+        """
+        Generator gathering the batches for each position array in the current thread.
+
+        """
+
+        buffers = dataset.allocate(batch_size) if reuse_buffer else None
+
+        for batch_positions in positions:
+            yield dataset.gather(batch_positions, buffers)
 
     def generator_train(self,
                         batch_size,
                         target,
                         shuffle=True,
                         allow_smaller_batch=True,
-                        normalize=True):
+                        normalize=True,
+                        reuse_buffer=False,
+                        num_workers=0,
+                        worker_type='thread',
+                        pin_memory=False,
+                        return_series=False,
+                        device=None):
         """
         Train batch generator.
 
@@ -367,7 +1129,7 @@ class DataReader(object):
             Column name from our target column (column to predict).
 
         shuffle : boolean, default : True
-            If True shuffle data
+            If True shuffle data. Every epoch uses a new order drawn from self.shuffler
 
         allow_smaller_batch : boolean, default : True
             If True last batch from each epoch can be smaller
@@ -375,58 +1137,60 @@ class DataReader(object):
         normalize : boolean, default : True
             If True apply normalization fo the data
 
-        """
+        reuse_buffer : boolean, default : False
+            If True every batch is written into the same preallocated buffers.
+            Each yielded batch is only valid until the next one is requested.
 
-        batch_i = 0
-        batch_x = None
-        batch_y = None
+        num_workers : int, default : 0
+            If bigger than 0 batches are prepared in the background by this
+            number of workers
 
-        assert len(self.train_indexes) > self.look_back - self.look_further, \
-            'Train length is too small, since its smaller then self.look_back'
-        assert len(self.train_indexes) > batch_size, \
-            'Reduce batch_size. Train length is bigger then batch size.'
+        worker_type : str, default : thread
+            Prefetching workers type. thread or process
 
-        indexes = self.train_indexes[:(-self.look_back - self.look_further)]
+        pin_memory : boolean, default : False
+            If True prefetched batches are placed in page-locked memory
 
-        while True:
-            if shuffle:
-                np.random.seed(SEED)
-                np.random.shuffle(indexes)
-
-            for position in indexes:
-                if batch_x is None:
-                    batch_x = np.zeros((batch_size, self.look_back, len(self.data.columns)), dtype='float32')
-                    batch_y = np.zeros((batch_size, self.look_further), dtype='float32')
-
-                train_data = self.data.iloc[position:position + self.look_back]
-                train_label = self.data[target].iloc[position +
-                                                     self.look_back:position + self.look_back + self.look_further]
-
-                if normalize:
-                    batch_x[batch_i] = self.normalizer.transform(train_data)
-                    batch_y[batch_i] = self.normalizer.transform(train_label.values.reshape(-1, 1))[:, 0]
-                else:
-                    batch_x[batch_i] = train_data.values
-                    batch_y[batch_i] = train_label.values
+        return_series : boolean, default : False
+            If True also yield the series id of each window, so models can
+            condition on the series. Panel datasets only
 
-                batch_i += 1
+        device : torch.device or str, optional, default : None
+            If given batches are gathered as torch tensors from a copy of the
+            dataset resident on this device, see DeviceWindowDataset
 
-                if batch_i == batch_size:
-                    yield batch_x, batch_y
-                    batch_x = None
-                    batch_y = None
-                    batch_i = 0
+        """
 
-            if allow_smaller_batch:
-                yield batch_x[:batch_i], batch_y[:batch_i]
-                batch_x = None
-                batch_y = None
-                batch_i = 0
+        assert len(self.train_indexes) > self.look_back - self.look_further, \
+            'Train length is too small, since its smaller then self.look_back'
+        assert len(self.train_indexes) > batch_size, \
+            'Reduce batch_size. Train length is bigger then batch size.'
+
+        indexes = self.window_positions(self.train_indexes, self.look_back + self.look_further)
+
+        return self.batch_generator(indexes,
+                                    batch_size,
+                                    target,
+                                    shuffle=shuffle,
+                                    allow_smaller_batch=allow_smaller_batch,
+                                    normalize=normalize,
+                                    reuse_buffer=reuse_buffer,
+                                    num_workers=num_workers,
+                                    worker_type=worker_type,
+                                    pin_memory=pin_memory,
+                                    return_series=return_series,
+                                    device=device)
 
     def generator_validation(self,
                              batch_size,
                              target,
-                             normalize=True):
+                             normalize=True,
+                             reuse_buffer=False,
+                             num_workers=0,
+                             worker_type='thread',
+                             pin_memory=False,
+                             return_series=False,
+                             device=None):
         """
         Validation batch generator.
 
@@ -440,53 +1204,58 @@ class DataReader(object):
         normalize : boolean, default : True
             If True apply normalization fo the data
 
-        """
+        reuse_buffer : boolean, default : False
+            If True every batch is written into the same preallocated buffers.
+            Each yielded batch is only valid until the next one is requested.
+
+        num_workers : int, default : 0
+            If bigger than 0 batches are prepared in the background by this
+            number of workers
+
+        worker_type : str, default : thread
+            Prefetching workers type. thread or process
 
-        batch_i = 0
-        batch_x = None
-        batch_y = None
+        pin_memory : boolean, default : False
+            If True prefetched batches are placed in page-locked memory
+
+        return_series : boolean, default : False
+            If True also yield the series id of each window, so models can
+            condition on the series. Panel datasets only
+
+        device : torch.device or str, optional, default : None
+            If given batches are gathered as torch tensors from a copy of the
+            dataset resident on this device, see DeviceWindowDataset
+
+        """
 
         assert len(self.validation_indexes) > self.look_back - self.look_further + 1, \
             'Validation length is too small, since its smaller then self.look_back'
         assert len(self.validation_indexes) > batch_size, \
             'Reduce batch_size. Validation length is smaller then batch size.'
 
-        indexes = self.validation_indexes[:(-self.look_further)] - self.look_back
-
-        while True:
-            for position in indexes:
-                if batch_x is None:
-                    batch_x = np.zeros((batch_size, self.look_back, len(self.data.columns)), dtype='float32')
-                    batch_y = np.zeros((batch_size, self.look_further), dtype='float32')
-
-                validation_data = self.data.iloc[position:position + self.look_back]
-                validation_labels = self.data[target].iloc[position + self.look_back:
-                                                           position + self.look_back + self.look_further]
-
-                if normalize:
-                    batch_x[batch_i] = self.normalizer.transform(validation_data)
-                    batch_y[batch_i] = self.normalizer.transform(validation_labels.values.reshape(-1, 1))[:, 0]
-                else:
-                    batch_x[batch_i] = validation_data.values
-                    batch_y[batch_i] = validation_labels.values
-
-                batch_i += 1
+        indexes = self.window_positions(self.validation_indexes, self.look_further, self.look_back)
 
-                if batch_i == batch_size:
-                    yield batch_x, batch_y
-                    batch_x = None
-                    batch_y = None
-                    batch_i = 0
-
-            yield batch_x[:batch_i], batch_y[:batch_i]
-            batch_x = None
-            batch_y = None
-            batch_i = 0
+        return self.batch_generator(indexes,
+                                    batch_size,
+                                    target,
+                                    normalize=normalize,
+                                    reuse_buffer=reuse_buffer,
+                                    num_workers=num_workers,
+                                    worker_type=worker_type,
+                                    pin_memory=pin_memory,
+                                    return_series=return_series,
+                                    device=device)
 
     def generator_test(self,
                        batch_size,
                        target,
-                       normalize=True):
+                       normalize=True,
+                       reuse_buffer=False,
+                       num_workers=0,
+                       worker_type='thread',
+                       pin_memory=False,
+                       return_series=False,
+                       device=None):
         """
         Test batch generator.
 
@@ -500,48 +1269,47 @@ class DataReader(object):
         normalize : boolean, default : True
             If True apply normalization fo the data
 
-        """
+        reuse_buffer : boolean, default : False
+            If True every batch is written into the same preallocated buffers.
+            Each yielded batch is only valid until the next one is requested.
+
+        num_workers : int, default : 0
+            If bigger than 0 batches are prepared in the background by this
+            number of workers
 
-        batch_i = 0
-        batch_x = None
-        batch_y = None
+        worker_type : str, default : thread
+            Prefetching workers type. thread or process
+
+        pin_memory : boolean, default : False
+            If True prefetched batches are placed in page-locked memory
+
+        return_series : boolean, default : False
+            If True also yield the series id of each window, so models can
+            condition on the series. Panel datasets only
+
+        device : torch.device or str, optional, default : None
+            If given batches are gathered as torch tensors from a copy of the
+            dataset resident on this device, see DeviceWindowDataset
+
+        """
 
         assert len(self.test_indexes) > self.look_back - self.look_further + 1, \
             'Validation length is too small, since its smaller then self.look_back'
         assert len(self.test_indexes) > batch_size, \
             'Reduce batch_size. Validation length is smaller then batch size.'
 
-        indexes = self.test_indexes[:(-self.look_further)] - self.look_back
+        indexes = self.window_positions(self.test_indexes, self.look_further, self.look_back)
 
-        while True:
-            for position in indexes:
-                if batch_x is None:
-                    batch_x = np.zeros((batch_size, self.look_back, len(self.data.columns)), dtype='float32')
-                    batch_y = np.zeros((batch_size, self.look_further), dtype='float32')
-
-                test_data = self.data.iloc[position:position + self.look_back]
-                test_labels = self.data[target].iloc[position +
-                                                     self.look_back: position + self.look_back + self.look_further]
-
-                if normalize:
-                    batch_x[batch_i] = self.normalizer.transform(test_data)
-                    batch_y[batch_i] = self.normalizer.transform(test_labels.values.reshape(-1, 1))[:, 0]
-                else:
-                    batch_x[batch_i] = test_data.values
-                    batch_y[batch_i] = test_labels.values
-
-                batch_i += 1
-
-                if batch_i == batch_size:
-                    yield batch_x, batch_y
-                    batch_x = None
-                    batch_y = None
-                    batch_i = 0
-
-            yield batch_x[:batch_i], batch_y[:batch_i]
-            batch_x = None
-            batch_y = None
-            batch_i = 0
+        return self.batch_generator(indexes,
+                                    batch_size,
+                                    target,
+                                    normalize=normalize,
+                                    reuse_buffer=reuse_buffer,
+                                    num_workers=num_workers,
+                                    worker_type=worker_type,
+                                    pin_memory=pin_memory,
+                                    return_series=return_series,
+                                    device=device)
 
     def cross_validation_time_series(self,
                                      n_splits,
@@ -563,26 +1331,41 @@ class DataReader(object):
             If dataset has test data use this variable to say where it starts
         Returns
         -------
+        Train and validation indexes of each fold. Panel series are split one by one
+        on their own time index, so every fold holds the same dates of every series
 
         """
 
-        length = int(self.data.index.get_loc(test_date))
+        splits = []
+
+        for start, stop in self.segments():
+            index = self.index[start:stop]
+
+            length = int(index.get_loc(test_date))
+
+            last_index = index[length]
+            validation_index = last_index - datetime.timedelta(days=length_split)
+
+            validation_range = index.searchsorted(last_index, side='right') - \
+                index.searchsorted(validation_index, side='left') - 1
+
+            cv = []
+            cv_val = []
 
-        last_index = self.data.loc[test_date].index[-1]
-        validation_index = last_index - datetime.timedelta(days=length_split)
+            for i in range(n_splits):
+                train_index = np.arange(start, start + length - ((n_splits - i) * validation_range) + 1)
 
-        validation_range = len(self.data.loc[validation_index:last_index]) - 1
+                validation_index = np.arange(start + length - ((n_splits - i) * validation_range),
+                                             start + length - ((n_splits - 1 - i) * validation_range) + 1)
 
-        cv = []
-        cv_val = []
+                cv.append(train_index)
+                cv_val.append(validation_index)
 
-        for i in range(n_splits):
-            train_index = np.arange(length - ((n_splits - i) * validation_range) + 1)
+            splits.append((cv, cv_val))
 
-            validation_index = np.arange(length - ((n_splits - i) * validation_range),
-                                         length - ((n_splits - 1 - i) * validation_range) + 1)
+        if len(splits) == 1:
+            return splits[0]
 
-            cv.append(train_index)
-            cv_val.append(validation_index)
+        cv, cv_val = zip(*splits)
 
-        return cv, cv_val
+        return [np.concatenate(fold) for fold in zip(*cv)], [np.concatenate(fold) for fold in zip(*cv_val)]
@@ -0,0 +1,95 @@
+import numpy as np
+import torch
+
+
+class DeviceWindowDataset(object):
+    def __init__(self,
+                 data,
+                 labels,
+                 look_back,
+                 look_further,
+                 device,
+                 series=None):
+        """
+        Window dataset resident on the training device. The normalized series is
+        uploaded once as a tensor and every batch is gathered on the device with
+        index_select over unfolded window views, so batches never go through
+        NumPy or a host to device copy. Meant for series that fit in device memory.
+
+        Parameters
+        ----------
+        data : np.array
+            Normalized data with shape (length, number of features)
+
+        labels : np.array
+            Normalized target column with shape (length,)
+
+        look_back : int
+            Sequence length to use in training
+
+        look_further : int
+            Sequence length to predict
+
+        device : torch.device or str
+            Device holding the dataset, e.g. cuda or cpu
+
+        series : np.array, optional, default : None
+            Series id of each row of a panel dataset. If given gather also
+            returns the series id of each window
+
+        """
+
+        self.device = torch.device(device)
+        self.look_back = look_back
+        self.look_further = look_further
+
+        self.data = torch.from_numpy(np.ascontiguousarray(data, dtype='float32')).to(self.device)
+        self.labels = torch.from_numpy(np.ascontiguousarray(labels, dtype='float32')).to(self.device)
+        self.series = torch.from_numpy(np.asarray(series, dtype='int64')).to(self.device) \
+            if series is not None else None
+
+        # windows_x[p] = data[p:p + look_back], windows_y[p] = labels[p + look_back:p + look_back + look_further]
+        self.windows_x = self.data.unfold(0, look_back, 1).transpose(1, 2)
+        self.windows_y = self.labels.unfold(0, look_further, 1)[look_back:]
+
+    def __len__(self):
+        return self.windows_y.shape[0]
+
+    def gather(self,
+               positions,
+               out=None):
+        """
+        Gather the windows starting at positions into a batch on the device.
+
+        Parameters
+        ----------
+        positions : np.array or torch.Tensor
+            Start positions of each sample window
+
+        out : ignored
+            Batches are always new device tensors
+
+        Returns
+        -------
+        batch_x : torch.Tensor
+            Tensor with shape (len(positions), look_back, number of features)
+
+        batch_y : torch.Tensor
+            Tensor with shape (len(positions), look_further)
+
+        batch_series : torch.Tensor
+            Only for panel datasets. Series id of each window
+
+        """
+
+        if isinstance(positions, np.ndarray):
+            positions = torch.from_numpy(np.ascontiguousarray(positions, dtype='int64'))
+        positions = positions.to(self.device, non_blocking=True)
+
+        batch_x = self.windows_x.index_select(0, positions)
+        batch_y = self.windows_y.index_select(0, positions)
+
+        if self.series is not None:
+            return batch_x, batch_y, self.series.index_select(0, positions)
+
+        return batch_x, batch_y
@@ -1,16 +1,26 @@
-import os, json, shutil
+import os, json, shutil, time
 import pandas as pd
 import numpy as np
 
+# Fixed-width record of the train, validation and test logs
+LOG_DTYPE = np.dtype([('Step', '<i8'),
+                      ('Epoch_Number', '<i8'),
+                      ('Batch_number', '<i8'),
+                      ('Loss', '<f8'),
+                      ('Timestamp', '<f8')])
+
 
 class FileLogger(object):
     def __init__(self,
                  path,
                  file_name,
                  model_name,
-                 script):
+                 script,
+                 flush_every=256):
         """
         File logger class. This class controls the file system.
+        Train, validation and test logs are append-only binary files of LOG_DTYPE
+        records, buffered in memory and written flush_every records at a time.
 
         Parameters
         ----------
@@ -26,7 +36,14 @@ class FileLogger(object):
         script : boolean
             If True file logging for script, else for notebook
 
+        flush_every : int, optional, default : 256
+            Number of log records buffered before they are appended to disk
+
         """
+
+        self.flush_every = flush_every
+        self.buffers = {}
+        self.buffered = {}
         if script is not True:
             self.path = path + file_name + '/'
             self.load_model = None
@@ -108,7 +125,7 @@ class FileLogger(object):
                              epoch,
                              batch,
                              loss,
-                             'train_log.txt')
+                             'train_log')
 
     def write_valid(self,
                     log_interval,
@@ -126,7 +143,7 @@ class FileLogger(object):
                              epoch,
                              batch,
                              loss,
-                             'valid_log.txt')
+                             'valid_log')
 
     def write_test(self,
                    log_interval,
@@ -144,7 +161,7 @@ class FileLogger(object):
                              epoch,
                              batch,
                              loss,
-                             'test_log.txt')
+                             'test_log')
 
     def write_metadata(self,
                        metadata):
@@ -154,21 +171,12 @@ class FileLogger(object):
 
     def open_writers(self):
 
-        data = {'Step': [],
-                'Epoch_Number': [],
-                'Batch_number': [],
-                'Loss': []
-                }
-
-        self.trainLogger = open(self.path + '/train_log.txt', 'w')
-        self.trainLogger.write(json.dumps(data))
-        self.trainLogger.close()
-        self.validLogger = open(self.path + '/valid_log.txt', 'w')
-        self.validLogger.write(json.dumps(data))
-        self.validLogger.close()
-        self.testLogger = open(self.path + '/test_log.txt', 'w')
-        self.testLogger.write(json.dumps(data))
-        self.testLogger.close()
+        self.flush()
+
+        for file_name in ['train_log', 'valid_log', 'test_log']:
+            open(self.path + '/' + file_name + '.bin', 'wb').close()
+            self.buffers[file_name] = np.empty(self.flush_every, dtype=LOG_DTYPE)
+            self.buffered[file_name] = 0
 
     def update_file(self,
                     step,
@@ -176,27 +184,57 @@ class FileLogger(object):
                     batch,
                     loss,
                     file_name):
+        """
+        Buffer one log record. Full buffers are appended to disk, so each record
+        costs O(1) no matter how long the run is.
+
+        """
 
-        data_temp = {
-            'Step': [int(step)],
-            'Epoch_Number': [int(epoch)],
-            'Batch_number': [int(batch)],
-            'Loss': [float(loss)]
-        }
+        if file_name not in self.buffers:
+            self.buffers[file_name] = np.empty(self.flush_every, dtype=LOG_DTYPE)
+            self.buffered[file_name] = 0
 
-        with open(self.path + '/' + file_name, 'r') as file:
-            data = (json.load(file))
+        self.buffers[file_name][self.buffered[file_name]] = (step, epoch, batch, loss, time.time())
+        self.buffered[file_name] += 1
+
+        if self.buffered[file_name] == self.flush_every:
+            self.flush(file_name)
 
-        for key, value in zip(data.items(), data_temp.items()):
-            key[1].append(value[1][0])
+    def flush(self,
+              file_name=None):
+        """
+        Append the buffered records of file_name, or of every log if None, to disk.
+
+        """
 
-        with open(self.path + '/' + file_name, 'w') as file:
-            json.dump(data, file)
+        file_names = [file_name] if file_name is not None else list(self.buffers)
+
+        for name in file_names:
+            if self.buffered.get(name, 0) > 0:
+                with open(self.path + '/' + name + '.bin', 'ab') as file:
+                    self.buffers[name][:self.buffered[name]].tofile(file)
+                self.buffered[name] = 0
 
     def read_files(self,
                    file_name):
+        """
+        Load a log into a DataFrame with one vectorized read. Logs written as
+        JSON by older versions (.txt) are still read.
+
+        Parameters
+        ----------
+        file_name : str
+            Log name, e.g. train_log, valid_log or test_log
 
-        with open(self.path + '/' + file_name, 'r') as file:
+        """
+
+        name = os.path.splitext(file_name)[0]
+
+        if os.path.isfile(self.path + '/' + name + '.bin'):
+            self.flush(name)
+            return pd.DataFrame(np.fromfile(self.path + '/' + name + '.bin', dtype=LOG_DTYPE))
+
+        with open(self.path + '/' + name + '.txt', 'r') as file:
             data = (json.load(file))
 
         dataframe = []
@@ -217,6 +255,9 @@ class FileLogger(object):
 
         if name is not None:
 
+            # Records of the previous run belong to the previous path
+            self.flush()
+
             self.path = self.file_path + '/' + name
 
             if not os.path.exists(self.path):
@@ -0,0 +1,208 @@
+import os
+import multiprocessing as mp
+
+from queue import Empty, Queue
+
+import numpy as np
+import torch
+
+from skopt import Optimizer
+
+
+def pin_worker(cpu_sets,
+               threads):
+    """
+    Pool initializer, pins the worker to the next free CPU subset and uses one torch
+    thread per CPU, so concurrent trials do not oversubscribe the cores. A worker
+    started after the subsets ran out, e.g. replacing one that died, is not pinned
+    and uses threads torch threads.
+
+    """
+
+    try:
+        # The timeout only covers the queue's feeder thread, the subsets are put before the pool starts
+        cpus = cpu_sets.get(timeout=1)
+    except Empty:
+        torch.set_num_threads(threads)
+        return
+
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(len(cpus))
+
+
+def evaluate(task):
+    objective, params, run_number = task
+    return objective(params, run_number)
+
+
+class Search(object):
+    def __init__(self,
+                 objective,
+                 space,
+                 n_calls,
+                 n_random_starts=10,
+                 x0=None,
+                 n_jobs=1,
+                 random_state=None,
+                 verbose=True):
+        """
+        Bayesian hyperparameter search, as skopt gp_minimize, evaluating n_jobs
+        candidate points concurrently in a process pool. The search is asynchronous,
+        as soon as a point finishes its score is reported with Optimizer.tell and a
+        new point, proposed with the constant liar strategy over the points still
+        running, goes to the free worker. A trial stopped early, e.g. by
+        SuccessiveHalving, frees its worker at once. Each worker process is pinned
+        to its own subset of the available CPUs.
+
+        Parameters
+        ----------
+        objective : callable
+            objective(params, run_number) returning the score to minimize. run_number
+            counts the evaluations from 1, in the order the points are proposed, to name
+            each run. Must be picklable, e.g. a module level function
+
+        space : list
+            skopt search space dimensions
+
+        n_calls : int
+            Number of evaluations, including x0
+
+        n_random_starts : int, optional, default : 10
+            Number of random points evaluated before fitting the surrogate model
+
+        x0 : list, optional, default : None
+            Initial point, or list of points, evaluated first
+
+        n_jobs : int, optional, default : 1
+            Number of points evaluated concurrently. If 1 the objective runs in this process
+
+        random_state : int, optional, default : None
+
+        verbose : boolean, optional, default : True
+            If True print every evaluation
+
+        """
+
+        self.objective = objective
+        self.space = space
+        self.n_calls = n_calls
+        self.n_jobs = n_jobs
+        self.verbose = verbose
+
+        if x0 is None:
+            x0 = []
+        elif not isinstance(x0[0], (list, tuple)):
+            x0 = [x0]
+        self.x0 = [list(x) for x in x0]
+
+        self.optimizer = Optimizer(space,
+                                   'GP',
+                                   n_initial_points=n_random_starts + len(self.x0),
+                                   acq_func='gp_hedge',
+                                   random_state=random_state)
+
+        self.run_number = 0
+
+    def cpu_sets(self):
+        if hasattr(os, 'sched_getaffinity'):
+            cpus = sorted(os.sched_getaffinity(0))
+        else:
+            cpus = list(range(os.cpu_count()))
+
+        # With more workers than CPUs the subsets are shared round robin
+        if self.n_jobs > len(cpus):
+            return [{cpus[i % len(cpus)]} for i in range(self.n_jobs)]
+
+        return [set(int(cpu) for cpu in chunk) for chunk in np.array_split(cpus, self.n_jobs)]
+
+    def ask(self,
+            pending):
+        """
+        Next point to evaluate, with the points still running told to a copy of the
+        optimizer with the best score so far, as Optimizer.ask does for a batch.
+
+        """
+
+        if not pending:
+            return self.optimizer.ask()
+
+        optimizer = self.optimizer.copy(random_state=self.optimizer.rng.randint(0, np.iinfo(np.int32).max))
+        lie = np.min(self.optimizer.yi) if self.optimizer.yi else 0.0
+        optimizer.tell(pending, [lie] * len(pending))
+
+        return optimizer.ask()
+
+    def submit(self,
+               pool,
+               params,
+               results):
+        # Evaluate a point, its run number and score, or exception, are put in results when it finishes
+        self.run_number += 1
+        run_number = self.run_number
+        task = (self.objective, params, run_number)
+
+        if pool is None:
+            results.put((run_number, evaluate(task)))
+        else:
+            pool.apply_async(evaluate,
+                             (task,),
+                             callback=lambda score: results.put((run_number, score)),
+                             error_callback=lambda error: results.put((run_number, error)))
+
+        return run_number
+
+    def run(self):
+        """
+        Run the search.
+
+        Returns
+        -------
+        result : scipy.optimize.OptimizeResult
+            skopt result, as returned by gp_minimize. Best point in result.x and score in result.fun
+
+        """
+
+        pool = None
+        if self.n_jobs > 1:
+            methods = mp.get_all_start_methods()
+            # fork keeps the objective's script globals in the workers
+            context = mp.get_context('fork' if 'fork' in methods else None)
+
+            cpu_sets = context.Queue()
+            for cpus in self.cpu_sets():
+                cpu_sets.put(cpus)
+            # Unpinned workers use as many threads as the smallest subset
+            threads = min(len(cpus) for cpus in self.cpu_sets())
+
+            pool = context.Pool(self.n_jobs, initializer=pin_worker, initargs=(cpu_sets, threads))
+
+        try:
+            result = None
+            results = Queue()
+            running = {}
+            submitted = 0
+
+            x0 = self.x0[:self.n_calls]
+            while submitted < self.n_calls or running:
+                # Keep every worker busy, initial points go first
+                while submitted < self.n_calls and len(running) < self.n_jobs:
+                    params = x0.pop(0) if x0 else self.ask(list(running.values()))
+                    running[self.submit(pool, params, results)] = params
+                    submitted += 1
+
+                run_number, score = results.get()
+                params = running.pop(run_number)
+                if isinstance(score, BaseException):
+                    raise score
+
+                if self.verbose:
+                    print('Run number {} - {} - score {}'.format(run_number, params, score))
+
+                result = self.optimizer.tell(params, float(score))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        return result
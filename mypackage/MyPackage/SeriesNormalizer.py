@@ -0,0 +1,113 @@
+import numpy as np
+
+
+class SeriesNormalizer(object):
+    def __init__(self,
+                 normalizer,
+                 number_series):
+        """
+        Per-series normalizer for panel datasets. The statistics of every series
+        are fitted together, with one vectorized pass over each chunk of rows.
+        Transformations are the affine map values * scale_[series] + min_[series].
+
+        Parameters
+        ----------
+        normalizer : string
+            Standardization or MixMaxScaler, as the sklearn normalizers used by DataReader
+
+        number_series : int
+            Number of series in the panel
+
+        """
+
+        assert normalizer in ['Standardization', 'MixMaxScaler'], \
+            'Not Implemented, choose on of the following options - Standardization, MixMaxScaler'
+
+        self.normalizer = normalizer
+        self.number_series = number_series
+
+        self.n_samples_seen_ = np.zeros(number_series)
+        self.mean_ = None
+        self.m2_ = None
+        self.data_min_ = None
+        self.data_max_ = None
+
+        self.scale_ = None
+        self.min_ = None
+
+    def partial_fit(self,
+                    values,
+                    series):
+        """
+        Update the statistics with a chunk of rows.
+
+        Parameters
+        ----------
+        values : np.array
+            Array with shape (rows, number of features)
+
+        series : np.array
+            Series id of each row
+
+        """
+
+        values = np.asarray(values, dtype='float64')
+        number_features = values.shape[1]
+
+        if self.mean_ is None:
+            self.mean_ = np.zeros((self.number_series, number_features))
+            self.m2_ = np.zeros((self.number_series, number_features))
+            self.data_min_ = np.full((self.number_series, number_features), np.inf)
+            self.data_max_ = np.full((self.number_series, number_features), -np.inf)
+
+        counts = np.bincount(series, minlength=self.number_series).astype('float64')
+        seen = counts > 0
+
+        sums = np.stack([np.bincount(series, weights=values[:, feature], minlength=self.number_series)
+                         for feature in range(number_features)], axis=1)
+        mean = sums / np.maximum(counts, 1)[:, None]
+
+        deviations = (values - mean[series]) ** 2
+        m2 = np.stack([np.bincount(series, weights=deviations[:, feature], minlength=self.number_series)
+                       for feature in range(number_features)], axis=1)
+
+        # Combine with the previous chunks (Chan et al. parallel variance)
+        total = self.n_samples_seen_ + counts
+        delta = mean - self.mean_
+        weight = np.where(seen, counts / np.maximum(total, 1), 0.)[:, None]
+
+        self.mean_ += delta * weight
+        self.m2_ += m2 + delta ** 2 * (self.n_samples_seen_[:, None] * weight)
+        self.n_samples_seen_ = total
+
+        np.minimum.at(self.data_min_, series, values)
+        np.maximum.at(self.data_max_, series, values)
+
+        self.update_affine()
+
+        return self
+
+    def update_affine(self):
+        if self.normalizer == 'Standardization':
+            std = np.sqrt(self.m2_ / np.maximum(self.n_samples_seen_, 1)[:, None])
+            # Constant series are left unscaled, as sklearn does
+            std[std == 0.] = 1.
+
+            self.scale_ = 1. / std
+            self.min_ = -self.mean_ * self.scale_
+        else:
+            data_range = self.data_max_ - self.data_min_
+            data_range[data_range == 0.] = 1.
+
+            self.scale_ = 2. / data_range
+            self.min_ = -1. - self.data_min_ * self.scale_
+
+    def transform(self,
+                  values,
+                  series):
+        return values * self.scale_[series] + self.min_[series]
+
+    def inverse_transform(self,
+                          values,
+                          series):
+        return (values - self.min_[series]) / self.scale_[series]
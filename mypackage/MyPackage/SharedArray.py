@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+
+from multiprocessing import shared_memory
+
+
+class SharedArray(object):
+    def __init__(self,
+                 array):
+        """
+        Lightweight picklable handle to an array published for other processes.
+        The array is copied once into a multiprocessing.shared_memory block, or,
+        if it is already a memory-mapped file, the handle just points at the file.
+        Only the name, shape and dtype are pickled, so sending the handle to a
+        worker costs a few bytes and the worker attaches to the same memory with
+        no copy. The process creating the handle owns the block and frees it
+        with unlink.
+
+        Parameters
+        ----------
+        array : np.array or np.memmap
+            Array to publish
+
+        """
+
+        self.shape = array.shape
+        self.dtype = np.dtype(array.dtype).str
+        self.owner = os.getpid()
+        self.memory = None
+
+        if isinstance(array, np.memmap) and array.filename is not None:
+            self.name = None
+            self.path = array.filename
+            self.offset = array.offset
+        else:
+            self.path = None
+            self.offset = 0
+            self.memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            self.name = self.memory.name
+            np.copyto(self.view(), array, casting='no')
+
+        self.array = self.view()
+        if self.memory is not None:
+            self.array.flags.writeable = False
+
+    def view(self):
+        if self.path is not None:
+            return np.memmap(self.path, dtype=self.dtype, mode='r', offset=self.offset, shape=self.shape)
+
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=self.memory.buf)
+
+    def attach(self):
+        """
+        Read-only view of the published array, without copying it.
+
+        Returns
+        -------
+        np.array
+
+        """
+
+        return self.array
+
+    def close(self):
+        """
+        Detach this process from the shared memory block. Views returned by attach
+        must not be used after closing.
+
+        """
+
+        self.array = None
+        if self.memory is not None:
+            try:
+                self.memory.close()
+            except BufferError:
+                # A view is still alive, the block is released when it is collected
+                pass
+            self.memory = None
+
+    def unlink(self):
+        """
+        Free the shared memory block. Only the creating process frees it, processes
+        already attached keep their mapping until they close it.
+
+        """
+
+        if self.memory is not None and os.getpid() == self.owner:
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:
+                pass
+            self.name = None
+
+        self.close()
+
+    def __getstate__(self):
+        # Only the handle is pickled, the memory is attached on load
+        return {'name': self.name,
+                'path': self.path,
+                'offset': self.offset,
+                'shape': self.shape,
+                'dtype': self.dtype,
+                'owner': self.owner}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.memory = shared_memory.SharedMemory(name=self.name) if self.name is not None else None
+        self.array = self.view()
+        if self.memory is not None:
+            self.array.flags.writeable = False
+
+    def __del__(self):
+        self.unlink()
@@ -0,0 +1,97 @@
+import numpy as np
+
+
+class Shuffler(object):
+    def __init__(self,
+                 seed=None,
+                 block_size=None):
+        """
+        Epoch shuffling with a dedicated random generator. Every epoch draws
+        its own seed, so each pass sees a different order while the whole run
+        stays reproducible from one seed, and the global NumPy RNG is untouched.
+        Permutations are written into a reused buffer of positions, the index
+        array being shuffled is never copied or modified.
+
+        Parameters
+        ----------
+        seed : int, optional, default : None
+            Seed of the generator drawing the epoch seeds
+
+        block_size : int, optional, default : None
+            If given contiguous blocks of block_size positions are shuffled as a
+            unit. Consecutive samples of a batch then read neighbouring rows,
+            which keeps gathering cache friendly on large or memory-mapped data.
+
+        """
+
+        assert block_size is None or block_size > 0, 'block_size must be a positive integer'
+
+        self.seed = seed
+        self.block_size = block_size
+
+        self.rng = np.random.default_rng(seed)
+        self.epoch = 0
+        self.epoch_seed = None
+
+        self.buffer = None
+        self.blocks = None
+
+    def permutation(self,
+                    length):
+        """
+        Permutation of range(length) for the next epoch.
+
+        Returns
+        -------
+        np.array with the shuffled positions. The buffer is reused, so it is
+        only valid until the next call.
+
+        """
+
+        self.epoch_seed = int(self.rng.integers(2 ** 63))
+        self.epoch += 1
+        rng = np.random.default_rng(self.epoch_seed)
+
+        if self.block_size is None or self.block_size >= length:
+            return self.shuffle(rng, length)
+
+        return self.shuffle_blocks(rng, length)
+
+    def shuffle(self,
+                rng,
+                length):
+        if self.buffer is None or self.buffer.shape != (length,):
+            self.buffer = np.empty(length, dtype='int64')
+            self.blocks = np.arange(length)
+
+        np.copyto(self.buffer, self.blocks)
+        rng.shuffle(self.buffer)
+
+        return self.buffer
+
+    def shuffle_blocks(self,
+                       rng,
+                       length):
+        number_blocks = -(-length // self.block_size)
+        remainder = length % self.block_size
+
+        if self.buffer is None or self.buffer.shape != (number_blocks, self.block_size):
+            self.buffer = np.empty((number_blocks, self.block_size), dtype='int64')
+            self.blocks = np.empty(number_blocks, dtype='int64')
+
+        self.blocks[:] = np.arange(number_blocks)
+        rng.shuffle(self.blocks)
+
+        # Row b holds the positions of block blocks[b]
+        np.multiply(self.blocks[:, None], self.block_size, out=self.buffer)
+        self.buffer += np.arange(self.block_size)
+
+        permutation = self.buffer.reshape(-1)
+
+        if remainder:
+            # Drop the positions past the end of the last, partial block
+            last = int(np.flatnonzero(self.blocks == number_blocks - 1)[0])
+            start = last * self.block_size + remainder
+            permutation[start:length] = permutation[start + self.block_size - remainder:]
+
+        return permutation[:length]
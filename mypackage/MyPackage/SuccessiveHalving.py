@@ -0,0 +1,92 @@
+import threading
+
+import numpy as np
+
+
+class SuccessiveHalving(object):
+    def __init__(self,
+                 min_resource=1,
+                 reduction_factor=3,
+                 max_resource=None,
+                 manager=None):
+        """
+        Asynchronous successive halving (ASHA) pruning of hyperparameter search trials.
+        Trials report their validation loss as they train, rungs are placed at
+        min_resource * reduction_factor ** k epochs, and a trial reaching a rung is
+        stopped unless its loss is in the best 1 / reduction_factor of the losses
+        recorded at that rung so far. The epochs of stopped trials go to new points.
+
+        Parameters
+        ----------
+        min_resource : int, optional, default : 1
+            Epochs trained before the first rung
+
+        reduction_factor : int, optional, default : 3
+            Only 1 / reduction_factor of the trials continue at every rung
+
+        max_resource : int, optional, default : None
+            Epochs of a complete trial, no rung at or past it. If None rungs are unbounded
+
+        manager : multiprocessing.Manager, optional, default : None
+            If given the rungs are shared by the processes of a parallel search
+
+        """
+
+        assert min_resource >= 1 and reduction_factor >= 2, \
+            'min_resource must be at least 1 and reduction_factor at least 2'
+
+        self.min_resource = min_resource
+        self.reduction_factor = reduction_factor
+        self.max_resource = max_resource
+
+        if manager is not None:
+            self.rungs = manager.dict()
+            self.lock = manager.Lock()
+        else:
+            self.rungs = {}
+            self.lock = threading.Lock()
+
+    def is_rung(self,
+                resource):
+
+        if self.max_resource is not None and resource >= self.max_resource:
+            return False
+
+        rung = self.min_resource
+        while rung < resource:
+            rung *= self.reduction_factor
+
+        return rung == resource
+
+    def report(self,
+               resource,
+               loss):
+        """
+        Record the validation loss of a trial.
+
+        Parameters
+        ----------
+        resource : int
+            Epochs trained by the trial, over all its cross validation folds
+
+        loss : float
+            Validation loss of the trial
+
+        Returns
+        -------
+        stop : boolean
+            True if the trial should stop
+
+        """
+
+        if not self.is_rung(resource):
+            return False
+
+        with self.lock:
+            # Reassigned, not appended, so shared dicts see the change
+            losses = self.rungs.get(resource, []) + [float(loss)]
+            self.rungs[resource] = losses
+
+        cutoff = np.percentile(losses, (1. - 1. / self.reduction_factor) * 100)
+
+        return loss > cutoff
@@ -0,0 +1,93 @@
+import sys, threading, traceback
+
+from queue import Queue
+
+
+class Telemetry(object):
+    def __init__(self,
+                 tensorboard,
+                 filelogger,
+                 max_queue=1024):
+        """
+        Asynchronous telemetry sink. Scalars are queued by the training loop and
+        written to TensorBoard and the FileLogger by a background thread, so the
+        loop never blocks on I/O. Values can be device tensors, they are only
+        converted to floats, and synchronized, by the writer thread.
+
+        Parameters
+        ----------
+        tensorboard : tensorboardX.SummaryWriter
+
+        filelogger : FileLogger
+
+        max_queue : int, optional, default : 1024
+            Maximum number of queued records. When full the training loop waits
+            for the writer, which bounds the memory used by pending records.
+
+        """
+
+        self.tensorboard = tensorboard
+        self.filelogger = filelogger
+
+        self.queue = Queue(max_queue)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def add_scalar(self,
+                   tag,
+                   value,
+                   step):
+        """
+        Queue a TensorBoard scalar.
+
+        """
+
+        self.queue.put((tag, value, step, None))
+
+    def log(self,
+            tag,
+            file_name,
+            step,
+            epoch,
+            batch,
+            loss):
+        """
+        Queue a loss for TensorBoard, under tag, and for the file_name FileLogger log.
+
+        """
+
+        self.queue.put((tag, loss, step, (file_name, epoch, batch)))
+
+    def run(self):
+        while True:
+            record = self.queue.get()
+
+            if record is None:
+                break
+
+            try:
+                tag, value, step, log = record
+                value = float(value)
+
+                self.tensorboard.add_scalar(tag, value, step)
+
+                if log is not None:
+                    file_name, epoch, batch = log
+                    self.filelogger.update_file(step, epoch, batch, value, file_name)
+            except Exception:
+                # A failed write must not stop the training loop
+                traceback.print_exc(file=sys.stdout)
+
+    def close(self):
+        """
+        Write the queued records, stop the writer thread, flush the logs and
+        close the TensorBoard writer, which also stops its event file thread.
+
+        """
+
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+        self.filelogger.flush()
+        self.tensorboard.close()
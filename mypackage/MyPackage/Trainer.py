@@ -1,17 +1,22 @@
 import sys, traceback, os, re
+import multiprocessing as mp
 
 import torch
 import numpy as np
 import pandas as pd
 
+from functools import partial
+from queue import Empty
 from tqdm import trange
 
 from sklearn.metrics import mean_squared_error, mean_absolute_error
 
 from MyPackage import FileLogger
 from MyPackage import DataReader
+from MyPackage.Telemetry import Telemetry
 from MyPackage.utils import mean_predictions
 
+from torch.optim.lr_scheduler import ReduceLROnPlateau
 from tensorboardX import SummaryWriter
 from glob import glob
 
@@ -25,6 +30,10 @@ class Trainer(object):
                  valid_log_interval,
                  load_model_name=None,
                  use_script=True,
+                 num_workers=0,
+                 worker_type='thread',
+                 device_dataset=False,
+                 mixed_precision=False,
                  **kwargs):
 
         """
@@ -54,6 +63,23 @@ class Trainer(object):
         use_script : boolean, optional, default : True
             If True filelogger initialze as a script.
             If False initilize for notebook
+
+        num_workers : int, optional, default : 0
+            Number of background workers preparing train and validation batches.
+            If 0 batches are prepared synchronously in the training loop
+
+        worker_type : str, optional, default : thread
+            Background workers type. thread or process
+
+        device_dataset : boolean, optional, default : False
+            If True the normalized series is uploaded once to the training device
+            and train and validation batches are gathered there. Only for series
+            that fit in device memory
+
+        mixed_precision : boolean, optional, default : False
+            If True the forward passes of training, validation and prediction run under
+            bfloat16 autocast. Weights, gradients and optimizer state stay in float32.
+            Checked once before training, see check_mixed_precision
         """
 
         # Data Reader
@@ -67,15 +93,149 @@ class Trainer(object):
 
         # Check cuda availability
         self.use_cuda = torch.cuda.is_available()
+        self.device = torch.device('cuda' if self.use_cuda else 'cpu')
 
         # Variables
         self.logger_path = logger_path
         self.model_name = model_name
         self.train_log_interval = train_log_interval
         self.valid_log_interval = valid_log_interval
+        self.num_workers = num_workers
+        self.worker_type = worker_type
+        self.device_dataset = device_dataset
+        self.mixed_precision = mixed_precision
+
+        # Panel datasets also yield the series id of each window
+        self.panel = self.datareader.series is not None
 
         self.model = None
         self.tensorboard = None
+        self.telemetry = None
+
+        self.epoch = 0
+        self.batch_train = 0
+        self.batch_valid = 0
+        self.pruned = False
+
+    def to_device(self,
+                  batch):
+        """
+        Float tensor on the training device from a NumPy array or tensor.
+        Tensors already on the device are returned as they are.
+
+        """
+
+        if isinstance(batch, np.ndarray):
+            batch = torch.from_numpy(batch)
+
+        return batch.to(self.device, dtype=torch.float32, non_blocking=True)
+
+    def next_batch(self,
+                   generator):
+        """
+        Next batch of a generator on the training device.
+
+        Returns
+        -------
+        X, Y : torch.Tensor
+            Float inputs and labels
+
+        series : torch.LongTensor or None
+            Series id of each window for panel datasets, else None
+
+        """
+
+        batch = next(generator)
+        X, Y = self.to_device(batch[0]), self.to_device(batch[1])
+
+        if len(batch) < 3:
+            return X, Y, None
+
+        return X, Y, torch.as_tensor(batch[2]).to(self.device, dtype=torch.int64, non_blocking=True)
+
+    def autocast(self):
+        """
+        Autocast context of the mixed precision mode. Inside it matmuls and convolutions
+        run in bfloat16, losses and the weights they update stay in float32.
+        A no-op unless mixed_precision is set.
+
+        """
+
+        return torch.autocast(device_type=self.device.type,
+                              dtype=torch.bfloat16,
+                              enabled=self.mixed_precision)
+
+    def validation_loss(self):
+        """
+        Mean loss of one pass over the validation set, without logging.
+
+        """
+
+        self.model.eval()
+
+        total_valid_loss = 0
+        for _ in range(int(self.datareader.validation_steps)):
+            _, total_loss = self.evaluation_step()
+            total_valid_loss += total_loss
+
+        return float(total_valid_loss) / (self.datareader.validation_length)
+
+    def check_mixed_precision(self,
+                              tolerance=0.05):
+        """
+        Accuracy regression check of the mixed precision mode, run once before training.
+        The validation set is evaluated with the current weights under bfloat16 autocast
+        and in float32. If the losses differ by more than tolerance mixed_precision is
+        turned off and the model trains in float32. Both losses and the outcome are
+        written to TensorBoard.
+
+        Parameters
+        ----------
+        tolerance : float, optional, default : 0.05
+            Maximum relative difference between the two validation losses
+
+        Returns
+        -------
+        mixed_loss : float
+
+        full_loss : float
+
+        """
+
+        mixed_precision = self.mixed_precision
+        try:
+            self.mixed_precision = True
+            mixed_loss = self.validation_loss()
+            self.mixed_precision = False
+            full_loss = self.validation_loss()
+        finally:
+            self.mixed_precision = mixed_precision
+
+        if abs(mixed_loss - full_loss) > tolerance * abs(full_loss):
+            self.mixed_precision = False
+
+        self.telemetry.add_scalar('Validation loss bfloat16', mixed_loss, 0)
+        self.telemetry.add_scalar('Validation loss float32', full_loss, 0)
+        self.telemetry.add_scalar('Mixed precision', int(self.mixed_precision), 0)
+
+        return mixed_loss, full_loss
+
+    @staticmethod
+    def direct_targets(X,
+                       Y):
+        """
+        Targets of a direct multi-horizon head. For every input position t the next
+        number_steps_predict values of the target, the first feature of X followed by Y.
+
+        Returns
+        -------
+        targets : torch.Tensor
+            Tensor with shape (batch, number_steps_train, number_steps_predict)
+
+        """
+
+        series = torch.cat((X[:, :, 0], Y), dim=1)
+        return series[:, 1:].unfold(1, Y.shape[1], 1)
 
     def save(self,
              model_name):
@@ -108,301 +268,595 @@ class Trainer(object):
         self.prepare_datareader()
         self.model.apply(self.init_weights)
         self.filelogger.start()
-        self.tensorboard = SummaryWriter(self.filelogger.path + '/tensorboard/')
+        self.start_telemetry()
+
+        self.epoch, self.batch_train, self.batch_valid = 0, 0, 0
 
         try:
-            training_step = 0
-            validation_step = 0
+            if self.mixed_precision:
+                self.check_mixed_precision()
 
-            best_validation_loss = 1000
-            validation_loss = 1000
-            train_loss = 1000
-            best_validation_epoch = 0
+            best_validation_loss, early_stop = self.fit(patience)
 
-            patience_step = 0
+            if early_stop:
+                print('Train is donne, 3 epochs in a row without improving validation loss!')
+            else:
+                print('Train is donne after 10 epochs!')
+            return best_validation_loss
 
-            epoch_range = trange(int(self.num_epoch),
-                                 desc='1st loop',
-                                 unit=' Epochs')
+        except KeyboardInterrupt:
+            if self.epoch > 0:
+                print("Shutdown requested...saving and exiting")
+                self.save('Model_save_before_exiting_epoch_' + str(self.epoch + 1) + '_batch_' + str(
+                    self.batch_train) + '_batch_valid_' + str(self.batch_valid) + '.pth')
+            else:
+                print('Shutdown requested!')
 
-            for epoch in epoch_range:
-                batch_train_range = trange(int(self.datareader.train_steps),
-                                           desc='2st loop',
-                                           unit=' Batch',
-                                           leave=True)
+        except Exception:
+            if self.epoch > 0:
+                self.save('Model_save_before_exiting_epoch_' + str(self.epoch + 1) + '_batch_' + str(
+                    self.batch_train) + '_batch_valid_' + str(self.batch_valid) + '.pth')
+            traceback.print_exc(file=sys.stdout)
+            sys.exit(0)
 
-                batch_valid_range = trange(int(self.datareader.validation_steps),
-                                           desc='2st loop',
-                                           unit=' Batch',
-                                           leave=True)
+        finally:
+            self.telemetry.close()
 
-                total_train_loss = 0
+    def train_cv(self, number_splits, days, patience, callback=None, n_jobs=1, pruned_score=10000.0):
+        """
+        Train with Cross-Validation
 
-                for batch_train in batch_train_range:
-                    batch_train_range.set_description("Training on %i points --- " % self.datareader.train_length)
+        Parameters
+        ----------
+        number_splits : int
 
-                    self.model.train()
+        days : int
+            Size in days of each validation fold
 
-                    loss, total_loss = self.training_step()
+        patience : int
 
-                    total_train_loss += total_loss
+        callback : callable, optional, default : None
+            callback(resource, loss) called after every epoch with the number of epochs
+            trained over all folds, as if every fold ran num_epoch epochs, and the best
+            validation loss of the current fold. If it returns True the remaining epochs
+            and folds are skipped and pruned_score is returned, e.g. SuccessiveHalving.report
 
-                    batch_train_range.set_postfix(MSE = loss,
-                                                  Last_batch_MSE = train_loss,
-                                                  Epoch = epoch)
+        n_jobs : int, optional, default : 1
+            Number of folds trained at the same time, each in a forked process with its own
+            copy of the model and optimizer and the data shared copy-on-write.
+            Folds run sequentially on CUDA, where fork is not safe, and inside daemonic
+            processes such as the Search workers
 
-                    self.tensorboard.add_scalar('Training Mean Squared Error loss per batch',
-                                                loss,
-                                                training_step)
+        pruned_score : float, optional, default : 10000.0
+            Score of a pruned trial. The losses of its partial folds are not comparable
+            with complete trials, so a penalty keeps it from becoming the best point
 
-                    self.filelogger.write_train(self.train_log_interval,
-                                                training_step,
-                                                epoch,
-                                                batch_train,
-                                                loss)
+        Returns
+        -------
+        score : float
+            Mean of the best validation loss of each fold, or pruned_score if the trial was pruned
 
-                    training_step += 1
+        """
 
-                train_loss = total_train_loss / (self.datareader.train_length)
+        try:
+            mean_score = []
+            self.pruned = False
+            cv_train_indexes, cv_val_indexes = self.datareader.cross_validation_time_series(number_splits,
+                                                                                            days,
+                                                                                            self.test_date)
 
-                self.tensorboard.add_scalar('Training Mean Squared Error loss per epoch',
-                                            train_loss,
-                                            epoch)
+            if self.mixed_precision:
+                self.check_mixed_precision_cv(cv_train_indexes[0], cv_val_indexes[0])
 
-                total_valid_loss = 0
+            if n_jobs > 1 and self.fork_available():
+                mean_score = self.train_folds_parallel(cv_train_indexes,
+                                                       cv_val_indexes,
+                                                       patience,
+                                                       callback,
+                                                       n_jobs)
+            else:
+                for model_number in range(number_splits):
 
-                for batch_valid in batch_valid_range:
-                    batch_valid_range.set_description("Validate on %i points --- " % self.datareader.validation_length)
+                    best_validation_loss = self.train_fold(model_number,
+                                                           cv_train_indexes[model_number],
+                                                           cv_val_indexes[model_number],
+                                                           patience,
+                                                           callback)
 
-                    batch_valid_range.set_postfix(Last_Batch_MSE=' {0:.9f} MSE'.format(validation_loss),
-                                                  Best_MSE=best_validation_loss,
-                                                  Best_Epoch = best_validation_epoch,
-                                                  Current_Epoch=epoch)
+                    mean_score.append(best_validation_loss)
 
-                    self.model.eval()
+                    if self.pruned:
+                        print('Trial stopped after {} folds'.format(model_number + 1))
+                        break
 
-                    valid_loss, total_loss = self.evaluation_step()
+            if self.pruned:
+                return pruned_score
 
-                    total_valid_loss += total_loss
+            return np.mean(mean_score)
 
-                    self.tensorboard.add_scalar('Validation Mean Squared Error loss per batch',
-                                                valid_loss,
-                                                validation_step)
+        except KeyboardInterrupt:
+            print('Shutdown requested!')
 
-                    self.filelogger.write_valid(self.valid_log_interval,
-                                                validation_step,
-                                                epoch,
-                                                batch_valid,
-                                                valid_loss)
-                    validation_step += 1
+        except Exception:
+            traceback.print_exc(file=sys.stdout)
+            sys.exit(0)
 
-                validation_loss = total_valid_loss / (self.datareader.validation_length)
+    def train_fold(self,
+                   model_number,
+                   cv_train,
+                   cv_val,
+                   patience,
+                   callback=None):
+        """
+        Train one cross validation fold from freshly initialized weights. As before the
+        folds, the optimizer state carries over from the previous fold when they run
+        sequentially. Forked folds, see run_fold, start from a new optimizer.
 
-                self.tensorboard.add_scalar('Validation Mean Squared Error loss per epoch',
-                                            validation_loss,
-                                            epoch)
+        Returns
+        -------
+        best_validation_loss : float
 
-                if self.use_scheduler:
-                    self.scheduler.step(validation_loss)
+        """
 
-                if validation_loss < best_validation_loss:
-                    best_validation_loss = validation_loss
-                    best_validation_epoch = epoch + 1
-                    patience_step = 0
-                    self.save('Model_Checkpoint' + str(epoch + 1) + '_valid_loss_' + str(best_validation_loss) + '.pth')
-                else:
-                    patience_step += 1
-                    if patience_step > patience:
-                        print('Train is donne, 3 epochs in a row without improving validation loss!')
-                        return best_validation_loss
+        self.model.apply(self.init_weights)
 
-            print('Train is donne after 10 epochs!')
-            return best_validation_loss
+        self.filelogger.start('Fold_Number{0}'.format(model_number + 1))
+        self.start_telemetry()
 
-        except KeyboardInterrupt:
-            if epoch > 0:
-                print("Shutdown requested...saving and exiting")
-                self.save('Model_save_before_exiting_epoch_' + str(epoch + 1) + '_batch_' + str(
-                    batch_train) + '_batch_valid_' + str(batch_valid) + '.pth')
-            else:
-                print('Shutdown requested!')
+        self.prepare_datareader_cv(cv_train,
+                                   cv_val)
 
-        except Exception:
-            if epoch > 0:
-                self.save('Model_save_before_exiting_epoch_' + str(epoch + 1) + '_batch_' + str(
-                    batch_train) + '_batch_valid_' + str(batch_valid) + '.pth')
-            traceback.print_exc(file=sys.stdout)
-            sys.exit(0)
+        fold_callback = None
+        if callback is not None:
+            fold_callback = partial(self.report_epoch, callback, model_number * int(self.num_epoch))
 
-    def train_cv(self, number_splits, days, patience):
+        try:
+            best_validation_loss, _ = self.fit(patience, leave=False, callback=fold_callback)
+        finally:
+            self.telemetry.close()
+
+        return best_validation_loss
+
+    def check_mixed_precision_cv(self,
+                                 cv_train,
+                                 cv_val):
         """
-        Train with Cross-Validation
+        check_mixed_precision on the first fold, once for all folds and before any of
+        them trains, so the folds, forked ones included, share its outcome.
 
         """
 
+        self.model.apply(self.init_weights)
+
+        self.filelogger.start('Mixed_Precision_Check')
+        self.start_telemetry()
+
+        self.prepare_datareader_cv(cv_train,
+                                   cv_val)
+
         try:
-            mean_score = []
-            cv_train_indexes, cv_val_indexes = self.datareader.cross_validation_time_series(number_splits,
-                                                                                            days,
-                                                                                            self.test_date)
+            self.check_mixed_precision()
+        finally:
+            self.telemetry.close()
+
+    @staticmethod
+    def fork_available():
+        if 'fork' not in mp.get_all_start_methods():
+            return False
+        if torch.cuda.is_initialized() or mp.current_process().daemon:
+            print('Folds trained sequentially, fork is not available in this process')
+            return False
+        return True
+
+    def train_folds_parallel(self,
+                             cv_train_indexes,
+                             cv_val_indexes,
+                             patience,
+                             callback,
+                             n_jobs):
+        """
+        Train the folds in forked processes, n_jobs at a time. Each child trains its own
+        copy of the model and optimizer, the parent only gathers the best validation losses.
+        When the callback prunes a fold the folds still training are terminated, no new
+        folds are started and self.pruned is set.
+
+        Returns
+        -------
+        scores : list
+            Best validation loss of each fold that finished, in fold order
+
+        """
+
+        context = mp.get_context('fork')
+        threads = max(1, torch.get_num_threads() // n_jobs)
+        folds = list(range(len(cv_train_indexes)))
+
+        scores = {}
+        for start in range(0, len(folds), n_jobs):
+            queue = context.Queue()
+            processes = [context.Process(target=self.run_fold,
+                                         args=(queue,
+                                               model_number,
+                                               cv_train_indexes[model_number],
+                                               cv_val_indexes[model_number],
+                                               patience,
+                                               callback,
+                                               threads))
+                         for model_number in folds[start:start + n_jobs]]
+
+            for process in processes:
+                process.start()
+
+            try:
+                while len(scores) < start + len(processes):
+                    try:
+                        model_number, best_validation_loss, pruned, error = queue.get(timeout=1)
+                    except Empty:
+                        if not any(process.is_alive() for process in processes) and queue.empty():
+                            raise RuntimeError('A fold process exited without a result')
+                        continue
+
+                    if error is not None:
+                        raise RuntimeError('Fold {} failed\n{}'.format(model_number + 1, error))
+                    scores[model_number] = best_validation_loss
+
+                    if pruned:
+                        self.pruned = True
+                        break
+            finally:
+                for process in processes:
+                    if process.is_alive() and len(scores) < start + len(processes):
+                        process.terminate()
+                    process.join()
+
+            if self.pruned:
+                print('Trial stopped after {} folds'.format(len(scores)))
+                break
+
+        return [scores[model_number] for model_number in folds if model_number in scores]
+
+    def run_fold(self,
+                 queue,
+                 model_number,
+                 cv_train,
+                 cv_val,
+                 patience,
+                 callback,
+                 threads):
+        # Fold process target, forked so self is already a private copy of the trainer.
+        # Parallel folds have no previous fold to carry the optimizer state over from, so each starts a new one.
+        # train_fold closes the telemetry, and its writer threads, before the result is sent
+        torch.set_num_threads(threads)
+        try:
+            self.reset_optimizer()
+            best_validation_loss = self.train_fold(model_number, cv_train, cv_val, patience, callback)
+            queue.put((model_number, best_validation_loss, self.pruned, None))
+        except Exception:
+            queue.put((model_number, None, False, traceback.format_exc()))
+
+    def reset_optimizer(self):
+        """
+        New optimizer, and scheduler, with the same hyper-parameters, so forked folds do
+        not start from the optimizer state of the parent.
+
+        """
+
+        self.model_optimizer = type(self.model_optimizer)(self.model.parameters(),
+                                                          **self.model_optimizer.defaults)
+
+        if self.use_scheduler:
+            self.scheduler = ReduceLROnPlateau(self.model_optimizer, 'min', patience=2, threshold=1e-5)
+
+    def report_epoch(self,
+                     callback,
+                     offset,
+                     epoch,
+                     loss):
+        # fit callback of a train_cv fold, offset is the number of epochs of the previous folds
+        self.pruned = bool(callback(offset + epoch + 1, loss))
+        return self.pruned
+
+    def start_telemetry(self):
+        """
+        New TensorBoard writer and telemetry thread for the current FileLogger path.
 
-            for model_number in range(number_splits):
+        """
+
+        self.tensorboard = SummaryWriter(self.filelogger.path + '/tensorboard/')
+        self.telemetry = Telemetry(self.tensorboard, self.filelogger)
 
-                self.model.apply(self.init_weights)
+    def fit(self,
+            patience,
+            leave=True,
+            callback=None):
+        """
+        Train and validate for num_epoch epochs, saving a checkpoint each time
+        the validation loss improves.
 
-                self.filelogger.start('Fold_Number{0}'.format(model_number + 1))
-                self.tensorboard = SummaryWriter(self.filelogger.path + '/tensorboard/')
+        Parameters
+        ----------
+        patience : int
+            Number of epochs without improving validation loss before stopping
 
-                self.prepare_datareader_cv(cv_train_indexes[model_number],
-                                           cv_val_indexes[model_number])
+        leave : boolean, optional, default : True
+            If True keep the batch progress bars of each epoch
+
+        callback : callable, optional, default : None
+            callback(epoch, best_validation_loss) called after every epoch.
+            If it returns True training stops
+
+        Returns
+        -------
+        best_validation_loss : float
+
+        early_stop : boolean
+            True if training stopped because the patience ran out or by the callback
+
+        """
 
-                training_step = 0
-                validation_step = 0
+        training_step = 0
+        validation_step = 0
 
-                best_validation_loss = 1000
-                validation_loss = 1000
-                train_loss = 1000
-                best_validation_epoch = 0
+        best_validation_loss = 1000
+        validation_loss = 1000
+        train_loss = 1000
+        best_validation_epoch = 0
 
+        patience_step = 0
+
+        epoch_range = trange(int(self.num_epoch),
+                             desc='1st loop',
+                             unit=' Epochs',
+                             leave=True)
+
+        for epoch in epoch_range:
+            self.epoch = epoch
+
+            train_loss, training_step = self.train_epoch(epoch,
+                                                         training_step,
+                                                         train_loss,
+                                                         leave)
+
+            validation_loss, validation_step = self.validate_epoch(epoch,
+                                                                   validation_step,
+                                                                   validation_loss,
+                                                                   best_validation_loss,
+                                                                   best_validation_epoch,
+                                                                   leave)
+
+            if self.use_scheduler:
+                self.scheduler.step(validation_loss)
+
+            if validation_loss < best_validation_loss:
+                best_validation_loss = validation_loss
+                best_validation_epoch = epoch + 1
                 patience_step = 0
+                self.save('Model_Checkpoint' + str(epoch + 1) + '_valid_loss_' + str(best_validation_loss) + '.pth')
+            else:
+                patience_step += 1
+                if patience_step > patience:
+                    return best_validation_loss, True
+
+            if callback is not None and callback(epoch, best_validation_loss):
+                return best_validation_loss, True
+
+        return best_validation_loss, False
+
+    def train_epoch(self,
+                    epoch,
+                    training_step,
+                    last_train_loss,
+                    leave=True):
+        """
+        One pass over the training set. Batch losses stay on the device, they are
+        only read at the log interval and summed once at the end of the epoch.
 
-                epoch_range = trange(int(self.num_epoch),
-                                     desc='1st loop',
-                                     unit=' Epochs',
-                                     leave=True)
+        Returns
+        -------
+        train_loss : float
+            Mean loss of the epoch
 
-                for epoch in epoch_range:
-                    batch_train_range = trange(int(self.datareader.train_steps),
-                                               desc='2st loop',
-                                               unit=' Batch',
-                                               leave=False)
+        training_step : int
+            Step counter after the epoch
 
-                    batch_valid_range = trange(int(self.datareader.validation_steps),
-                                               desc='2st loop',
-                                               unit=' Batch',
-                                               leave=False)
+        """
 
-                    total_train_loss = 0
-                    for batch_train in batch_train_range:
-                        batch_train_range.set_description("Training on %i points --- " % self.datareader.train_length)
+        batch_train_range = trange(int(self.datareader.train_steps),
+                                   desc='2st loop',
+                                   unit=' Batch',
+                                   leave=leave)
+        batch_train_range.set_description("Training on %i points --- " % self.datareader.train_length)
 
-                        self.model.train()
+        total_train_loss = 0
 
-                        loss, total_loss = self.training_step()
+        for batch_train in batch_train_range:
+            self.batch_train = batch_train
 
-                        total_train_loss += total_loss
+            self.model.train()
 
-                        batch_train_range.set_postfix(MSE = loss,
-                                                      Last_batch_MSE = train_loss,
-                                                      Epoch = epoch)
+            loss, total_loss = self.training_step()
 
-                        self.tensorboard.add_scalar('Training Mean Squared Error loss per batch',
-                                                    loss,
-                                                    training_step)
+            total_train_loss += total_loss
 
-                        self.filelogger.write_train(self.train_log_interval,
-                                                    training_step,
-                                                    epoch,
-                                                    batch_train,
-                                                    loss)
+            if batch_train % self.train_log_interval == 0:
+                self.telemetry.log('Training Mean Squared Error loss per batch',
+                                   'train_log',
+                                   training_step,
+                                   epoch,
+                                   batch_train,
+                                   loss)
 
-                        training_step += 1
+                batch_train_range.set_postfix(MSE=float(loss),
+                                              Last_batch_MSE=last_train_loss,
+                                              Epoch=epoch)
 
-                    train_loss = total_train_loss / (self.datareader.train_length)
+            training_step += 1
 
-                    self.tensorboard.add_scalar('Training Mean Squared Error loss per epoch',
-                                                train_loss,
-                                                epoch)
+        train_loss = float(total_train_loss) / (self.datareader.train_length)
 
-                    total_valid_loss = 0
+        self.telemetry.add_scalar('Training Mean Squared Error loss per epoch',
+                                  train_loss,
+                                  epoch)
 
-                    for batch_valid in batch_valid_range:
-                        batch_valid_range.set_description("Validate on %i points --- " % self.datareader.validation_length)
+        return train_loss, training_step
 
-                        batch_valid_range.set_postfix(Last_Batch_MSE=' {0:.9f} MSE'.format(validation_loss),
-                                                      Best_MSE=best_validation_loss,
-                                                      Best_Epoch=best_validation_epoch,
-                                                      Current_Epoch=epoch)
+    def validate_epoch(self,
+                       epoch,
+                       validation_step,
+                       last_validation_loss,
+                       best_validation_loss,
+                       best_validation_epoch,
+                       leave=True):
+        """
+        One pass over the validation set.
 
-                        self.model.eval()
+        Returns
+        -------
+        validation_loss : float
+            Mean loss of the epoch
 
-                        valid_loss, total_loss = self.evaluation_step()
+        validation_step : int
+            Step counter after the epoch
 
-                        total_valid_loss += total_loss
+        """
 
-                        self.tensorboard.add_scalar('Validation Mean Squared Error loss per batch',
-                                                    valid_loss,
-                                                    validation_step)
+        batch_valid_range = trange(int(self.datareader.validation_steps),
+                                   desc='2st loop',
+                                   unit=' Batch',
+                                   leave=leave)
+        batch_valid_range.set_description("Validate on %i points --- " % self.datareader.validation_length)
+        batch_valid_range.set_postfix(Last_Batch_MSE=' {0:.9f} MSE'.format(last_validation_loss),
+                                      Best_MSE=best_validation_loss,
+                                      Best_Epoch=best_validation_epoch,
+                                      Current_Epoch=epoch)
 
-                        self.filelogger.write_valid(self.valid_log_interval,
-                                                    validation_step,
-                                                    epoch,
-                                                    batch_valid,
-                                                    valid_loss)
+        total_valid_loss = 0
 
-                        validation_step += 1
+        for batch_valid in batch_valid_range:
+            self.batch_valid = batch_valid
 
-                    validation_loss = total_valid_loss / (self.datareader.validation_length)
+            self.model.eval()
 
-                    self.tensorboard.add_scalar('Validation Mean Squared Error loss per epoch',
-                                                validation_loss,
-                                                epoch)
+            valid_loss, total_loss = self.evaluation_step()
 
-                    if self.use_scheduler:
-                        self.scheduler.step(validation_loss)
+            total_valid_loss += total_loss
 
-                    if validation_loss < best_validation_loss:
-                        best_validation_loss = validation_loss
-                        best_validation_epoch = epoch + 1
-                        patience_step = 0
-                        self.save('Model_Checkpoint' + str(epoch + 1) + '_valid_loss_' + str(best_validation_loss) + '.pth')
-                    else:
-                        patience_step += 1
-                        if patience_step > patience:
-                            break
+            if batch_valid % self.valid_log_interval == 0:
+                self.telemetry.log('Validation Mean Squared Error loss per batch',
+                                   'valid_log',
+                                   validation_step,
+                                   epoch,
+                                   batch_valid,
+                                   valid_loss)
 
-                mean_score.append(best_validation_loss)
+            validation_step += 1
 
-            return np.mean(mean_score)
+        validation_loss = float(total_valid_loss) / (self.datareader.validation_length)
 
-        except KeyboardInterrupt:
-            print('Shutdown requested!')
+        self.telemetry.add_scalar('Validation Mean Squared Error loss per epoch',
+                                  validation_loss,
+                                  epoch)
 
-        except Exception:
-            traceback.print_exc(file=sys.stdout)
-            sys.exit(0)
+        return validation_loss, validation_step
 
-    def predict(self):
+    def predict(self, number_steps_predict=None):
 
         """
         Prediction loop
 
+        Parameters
+        ----------
+        number_steps_predict : int, optional, default : None
+            Horizon to predict, the test windows are prepared for it. Defaults to the
+            horizon of the trainer. A direct head serves any horizon up to the one it was
+            trained for, autoregressive models any horizon
+
+        Returns
+        -------
+        predictions, labels : np.array
+
+        series : np.array
+            Only for panel datasets. Series id of each prediction
+
         """
 
-        self.prepare_datareader()
+        trained_steps_predict = self.number_steps_predict
+        if number_steps_predict is None:
+            number_steps_predict = trained_steps_predict
+
+        # The test windows, and test_indexes used by postprocess, are built for the predicted horizon
+        self.number_steps_predict = number_steps_predict
+        try:
+            self.prepare_datareader()
+        finally:
+            self.number_steps_predict = trained_steps_predict
 
         predictions = []
         labels = []
+        series_ids = []
 
         for batch_test in range(self.datareader.test_steps):
             self.model.eval()
 
-            prediction, Y = self.prediction_step()
-            predictions.append(prediction.cpu().data.numpy())
-            labels.append(Y)
+            prediction, Y, series = self.prediction_step(number_steps_predict)
+            # Mixed precision predictions are bfloat16, which NumPy does not have
+            predictions.append(prediction.cpu().data.float().numpy())
+            labels.append(Y.cpu().numpy())
+            if series is not None:
+                series_ids.append(series.cpu().numpy())
+
+        if self.panel:
+            return np.concatenate(predictions), np.concatenate(labels), np.concatenate(series_ids)
 
         return np.concatenate(predictions), np.concatenate(labels)
 
-    def postprocess(self, predictions, labels):
+    def postprocess(self, predictions, labels, series=None):
+        """
+        Denormalize the predictions, score them and average the overlapping forecasts
+        of every test step.
 
-        predictions = self.datareader.normalizer.inverse_transform(predictions)
-        labels = self.datareader.normalizer.inverse_transform(labels)
+        Parameters
+        ----------
+        predictions, labels : np.array
+            As returned by predict
+
+        series : np.array, optional, default : None
+            Series id of each prediction, as returned by predict. Needed for panel datasets
+
+        Returns
+        -------
+        results : pd.DataFrame
+            Test rows with the mean prediction of each step. Panel datasets also get the series name
+
+        mse, mae : float
+
+        """
+
+        assert not self.panel or series is not None, 'Panel datasets need the series id of each prediction'
+
+        predictions = self.datareader.denormalize_target(predictions, self.target_column, series)
+        labels = self.datareader.denormalize_target(labels, self.target_column, series)
 
         mse = mean_squared_error(labels, predictions)
         mae = mean_absolute_error(labels, predictions)
 
-        target = self.datareader.data.iloc[self.datareader.test_indexes[:-1]]
-        results = target.assign(predictions=pd.Series(mean_predictions(predictions), index=target.index).values)
+        test_indexes = self.datareader.test_indexes
+
+        if series is None:
+            target = self.datareader.frame(test_indexes[:-1])
+            results = target.assign(predictions=pd.Series(mean_predictions(predictions), index=target.index).values)
+            return results, mse, mae
+
+        # Forecasts only overlap within a series, each one is averaged on its own
+        test_series = self.datareader.series[test_indexes]
+        indexes, means, names = [], [], []
+        for number in np.unique(series):
+            indexes.append(test_indexes[test_series == number][:-1])
+            means.append(mean_predictions(predictions[series == number]))
+            names.append(np.repeat(self.datareader.series_names[number], len(indexes[-1])))
+
+        target = self.datareader.frame(np.concatenate(indexes))
+        results = target.assign(series=np.concatenate(names), predictions=np.concatenate(means))
 
         return results, mse, mae
 
@@ -439,7 +893,7 @@ class Trainer(object):
     def evaluation_steo(self):
         raise NotImplementedError
 
-    def prediction_steo(self):
+    def prediction_steo(self, number_steps_predict):
         raise NotImplementedError
 
 
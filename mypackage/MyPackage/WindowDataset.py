@@ -0,0 +1,153 @@
+import numpy as np
+
+from numpy.lib.stride_tricks import sliding_window_view
+
+from MyPackage.SharedArray import SharedArray
+
+
+class WindowDataset(object):
+    def __init__(self,
+                 data,
+                 labels,
+                 look_back,
+                 look_further,
+                 series=None):
+        """
+        Zero-copy window dataset. Every sample window is a strided view over one
+        normalized buffer, so no window is ever materialized until it is gathered
+        into a batch.
+
+        Parameters
+        ----------
+        data : np.array or SharedArray
+            Normalized data with shape (length, number of features)
+
+        labels : np.array or SharedArray
+            Normalized target column with shape (length,)
+
+        look_back : int
+            Sequence length to use in training
+
+        look_further : int
+            Sequence length to predict
+
+        series : np.array or SharedArray, optional, default : None
+            Series id of each row of a panel dataset. If given gather also
+            returns the series id of each window
+
+        Shared arrays are pickled as their handles, so a process worker attaches
+        to the published buffers instead of receiving a copy of them.
+
+        """
+
+        arrays = {'data': data, 'labels': labels, 'series': series}
+        self.handles = {name: array for name, array in arrays.items() if isinstance(array, SharedArray)}
+        data, labels, series = [value.attach() if isinstance(value, SharedArray) else value
+                                for value in (data, labels, series)]
+
+        self.data = np.ascontiguousarray(data, dtype='float32')
+        self.labels = np.ascontiguousarray(labels, dtype='float32')
+        self.series = series
+
+        self.look_back = look_back
+        self.look_further = look_further
+        self.number_features = self.data.shape[1]
+
+        # windows_x[p] = data[p:p + look_back], windows_y[p] = labels[p + look_back:p + look_back + look_further]
+        self.windows_x = sliding_window_view(self.data, look_back, axis=0).transpose(0, 2, 1)
+        self.windows_y = sliding_window_view(self.labels, look_further)[look_back:]
+
+        self.offsets_x = np.arange(look_back)
+        self.offsets_y = np.arange(look_back, look_back + look_further)
+
+    def __len__(self):
+        return len(self.windows_y)
+
+    def __getstate__(self):
+        # Only the buffers, or their shared handles, are pickled, the window views are rebuilt on load
+        return {'data': self.handles.get('data', self.data),
+                'labels': self.handles.get('labels', self.labels),
+                'look_back': self.look_back,
+                'look_further': self.look_further,
+                'series': self.handles.get('series', self.series)}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def allocate(self,
+                 batch_size):
+        """
+        Allocate output buffers for one batch.
+
+        Returns
+        -------
+        Tuple (batch_x, batch_y, index_x, index_y), with a batch_series buffer
+        appended for panel datasets. The index buffers hold the row positions of
+        each gathered value, so gathering never allocates.
+
+        """
+
+        batch_x = np.empty((batch_size, self.look_back, self.number_features), dtype='float32')
+        batch_y = np.empty((batch_size, self.look_further), dtype='float32')
+        index_x = np.empty((batch_size, self.look_back), dtype='int64')
+        index_y = np.empty((batch_size, self.look_further), dtype='int64')
+
+        if self.series is not None:
+            return batch_x, batch_y, index_x, index_y, np.empty(batch_size, dtype='int64')
+
+        return batch_x, batch_y, index_x, index_y
+
+    def gather(self,
+               positions,
+               out=None):
+        """
+        Gather the windows starting at positions into a batch.
+
+        Parameters
+        ----------
+        positions : np.array
+            Start positions of each sample window
+
+        out : tuple of np.array, optional, default : None
+            Preallocated buffers from allocate. If given the batch is
+            written into them and nothing is allocated.
+
+        Returns
+        -------
+        batch_x : np.array
+            Array with shape (len(positions), look_back, number of features)
+
+        batch_y : np.array
+            Array with shape (len(positions), look_further)
+
+        batch_series : np.array
+            Only for panel datasets. Series id of each window
+
+        """
+
+        if out is None:
+            if self.series is not None:
+                return self.windows_x[positions], self.windows_y[positions], self.series[positions]
+            return self.windows_x[positions], self.windows_y[positions]
+
+        length = len(positions)
+        batch_x, batch_y, index_x, index_y = [buffer[:length] for buffer in out[:4]]
+
+        # Checked once per batch, mode='clip' below would silently clamp bad positions
+        if length and (positions.min() < 0 or positions.max() >= len(self)):
+            raise IndexError('Window positions must be in [0, {})'.format(len(self)))
+
+        # Gather rows from the contiguous buffers. Taking from the strided window
+        # views would force numpy to make them contiguous first.
+        np.add(positions[:, None], self.offsets_x, out=index_x)
+        np.add(positions[:, None], self.offsets_y, out=index_y)
+        # mode='clip' avoids the temporary buffer np.take uses to check bounds
+        np.take(self.data, index_x, axis=0, out=batch_x, mode='clip')
+        np.take(self.labels, index_y, axis=0, out=batch_y, mode='clip')
+
+        if self.series is not None:
+            batch_series = out[4][:length]
+            np.take(self.series, positions, out=batch_series, mode='clip')
+            return batch_x, batch_y, batch_series
+
+        return batch_x, batch_y
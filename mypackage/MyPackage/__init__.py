@@ -1,6 +1,14 @@
 #from .DataFrame_Manipulator import DataFrame, DataReader
 from .FileLogger import FileLogger
+from .DataCache import DataCache
+from .SharedArray import SharedArray
+from .WindowDataset import WindowDataset
+from .DeviceWindowDataset import DeviceWindowDataset
+from .Shuffler import Shuffler
+from .SeriesNormalizer import SeriesNormalizer
 from .DataReader import DataReader
+from .Telemetry import Telemetry
+from .SuccessiveHalving import SuccessiveHalving
 from .Trainer import Trainer
 
 from .utils import mean_predictions
\ No newline at end of file
@@ -1,14 +1,13 @@
 import torch
 import torch.nn as nn
-from torch.autograd import Variable
 from torch.optim.lr_scheduler import *
 import torch.optim as optim
 import torch.nn.functional as F
 
 import math
-import numpy as np
 
 from MyPackage import Trainer
+from ..SeriesEmbedding import SeriesEmbedding
 
 SEED = 1337
 
@@ -54,28 +53,41 @@ class Attn(nn.Module):
         stdv = 1. / math.sqrt(self.v.size(0))
         self.v.data.normal_(mean=0, std=stdv)
 
-    def forward(self, hidden, encoder_outputs):
+    def project(self, encoder_outputs):
+        """
+        Encoder half of self.attn, with the bias. It does not depend on the decoder state,
+        so it is computed once per sequence and reused at every decode step.
+
+        :param encoder_outputs:
+            encoder outputs from Encoder, in shape (B, T, H)
+        :return
+            projected encoder outputs in shape (B, T, H)
+        """
+
+        return F.linear(encoder_outputs, self.attn.weight[:, self.hidden_size:], self.attn.bias)
+
+    def forward(self, hidden, encoder_outputs, projected=None):
         """
         :param hidden:
-            previous hidden state of the decoder, in shape (layers*directions, B, H)
+            previous hidden state of the last decoder layer, in shape (B, H)
         :param encoder_outputs:
-            encoder outputs from Encoder, in shape (T, B, H)
+            encoder outputs from Encoder, in shape (B, T, H)
+        :param projected:
+            encoder outputs already projected with project, computed here if None
         :return
-            attention energies in shape (B, T)
+            attention weights in shape (B, 1, T)
         """
 
-        max_len = encoder_outputs.size(1)  # check dimensions, len dimension
-        this_batch_size = encoder_outputs.size(0)  # batch size dimensio
-        H = hidden.repeat(max_len, 1, 1).transpose(0, 1)  # Repeat hidden from decoder
-        attn_score = self.score(H, encoder_outputs)  # compute attention score
-        return F.softmax(attn_score, dim=1).unsqueeze(1)  # normalize with softmax - attn weights, check dimensions
+        if projected is None:
+            projected = self.project(encoder_outputs)
+        attn_score = self.score(hidden, projected)  # compute attention score
+        return F.softmax(attn_score, dim=1).unsqueeze(1)  # normalize with softmax - attn weights
 
-    def score(self, hidden, encoder_outputs):
-        energy = F.tanh(self.attn(torch.cat([hidden, encoder_outputs], 2)))  # [B*T*2H]->[B*T*H]
-        energy = energy.transpose(2, 1)  # [B*H*T] - This is probably wrong!
-        v = self.v.repeat(encoder_outputs.data.shape[0], 1).unsqueeze(1)  # [B*1*H]
-        energy = torch.bmm(v, energy)  # [B*1*T]
-        return energy.squeeze(1)
+    def score(self, hidden, projected):
+        # self.attn(cat([hidden, encoder_outputs])) split in its decoder and encoder halves, the decoder one broadcast over T
+        hidden = F.linear(hidden, self.attn.weight[:, :self.hidden_size]).unsqueeze(1)  # [B*1*H]
+        energy = torch.tanh(projected + hidden)  # [B*T*H]
+        return energy.matmul(self.v)  # [B*T]
 
 
 class Decoder(nn.Module):
@@ -144,7 +156,9 @@ class EncoderDecoder(nn.Module):
                  cell_type_encoder,
                  cell_type_decoder,
                  number_features_output,
-                 use_attention=False):
+                 use_attention=False,
+                 use_direct_head=False,
+                 number_series=None):
         super(EncoderDecoder, self).__init__()
 
         self.use_attention = use_attention
@@ -157,54 +171,90 @@ class EncoderDecoder(nn.Module):
                                    number_steps_predict, num_layers, hidden_size_decoder, cell_type_decoder)
             self.attention = Attn('concat', hidden_size_encoder)
 
+        # Direct multi-horizon head on the encoder outputs, all steps in one pass without the decoder
+        self.direct_head = nn.Linear(hidden_size_encoder, number_steps_predict) if use_direct_head else None
+
+        # Series embedding of a panel dataset, added to the encoder outputs and final state
+        self.series_embedding = SeriesEmbedding(number_series, hidden_size_encoder) \
+            if number_series is not None else None
+
     def forward(self):
         pass
 
-    def train_step(self, X_encoder, X_decoder):
+    def encode(self, X_encoder, series=None):
+        output, hidden = self.encoder(X_encoder)
+
+        if self.series_embedding is None:
+            return output, hidden
+
+        output = self.series_embedding(output, series)
+        if isinstance(hidden, tuple):
+            # LSTM, only the hidden state, not the cell state
+            hidden = (self.series_embedding(hidden[0], series, batch_dim=1), hidden[1])
+        else:
+            hidden = self.series_embedding(hidden, series, batch_dim=1)
 
-        if self.use_attention:
-            output, hidden = self.encoder(X_encoder)
+        return output, hidden
+
+    def train_step(self, X_encoder, X_decoder, series=None):
+
+        if self.direct_head is not None:
+            output, hidden = self.encode(X_encoder, series)
+            # all horizons from every position, shape (batch, seq_len, number_steps_predict)
+            predictions, hidden_decoder = self.direct_head(output), hidden
+        elif self.use_attention:
+            output, hidden = self.encode(X_encoder, series)
+            projected = self.attention.project(output)
             hidden_decoder = hidden
             predictions = []
             for step in range(self.number_steps_predict):
                 input_decoder = X_decoder[:, step, :]
                 input_decoder = input_decoder.unsqueeze(1)
                 if self.encoder.cell_type == 'LSTM':
-                    attn_weights = self.attention(hidden_decoder[0][-1], output)  # hidden_state -1 ou 1
+                    attn_weights = self.attention(hidden_decoder[0][-1], output, projected)  # hidden_state -1 ou 1
                 else:
-                    attn_weights = self.attention(hidden_decoder[-1], output)  # hidden_state -1 ou 1
+                    attn_weights = self.attention(hidden_decoder[-1], output, projected)  # hidden_state -1 ou 1
                 context = attn_weights.bmm(output)  # (B,1,V)
                 input_decoder = torch.cat((input_decoder, context), 2)
                 output_decoder, hidden_decoder = self.decoder.forward_attention(input_decoder, hidden_decoder)
                 predictions.append(output_decoder)
             predictions = torch.stack(predictions, dim=1)[:, :, 0]
         else:
-            output, hidden = self.encoder(X_encoder)
+            output, hidden = self.encode(X_encoder, series)
 
             predictions, hidden_decoder = self.decoder(X_decoder, hidden)
         return predictions, hidden_decoder
 
-    def predict(self, X_encoder, X_decoder):
-
-        if self.use_attention:
-            output, hidden = self.encoder(X_encoder)
+    def predict(self, X_encoder, X_decoder, series=None, number_steps_predict=None):
+        # number_steps_predict defaults to the horizon the model was built for
+        if number_steps_predict is None:
+            number_steps_predict = self.number_steps_predict
+
+        if self.direct_head is not None:
+            assert number_steps_predict <= self.direct_head.out_features, \
+                'Direct head trained for {} steps'.format(self.direct_head.out_features)
+            output, hidden = self.encode(X_encoder, series)
+            predictions = self.direct_head(output[:, -1, :])[:, :number_steps_predict]
+        elif self.use_attention:
+            output, hidden = self.encode(X_encoder, series)
+            projected = self.attention.project(output)
             hidden_decoder = hidden
             predictions = []
             input_decoder = X_decoder[:, 0, :]
-            for step in range(self.number_steps_predict):
+            for step in range(number_steps_predict):
                 input_decoder = input_decoder.unsqueeze(1)
                 if self.encoder.cell_type == 'LSTM':
-                    attn_weights = self.attention(hidden_decoder[0][-1], output)  # hidden_state -1 ou 1
+                    attn_weights = self.attention(hidden_decoder[0][-1], output, projected)  # hidden_state -1 ou 1
                 else:
-                    attn_weights = self.attention(hidden_decoder[-1], output)
+                    attn_weights = self.attention(hidden_decoder[-1], output, projected)
                 context = attn_weights.bmm(output)  # (B,1,V)
                 input_decoder = torch.cat((input_decoder, context), 2)
                 input_decoder, hidden_decoder = self.decoder.forward_attention(input_decoder, hidden_decoder)
                 predictions.append(input_decoder)
             predictions = torch.stack(predictions, dim=1)[:, :, 0]
         else:
-            output, hidden = self.encoder(X_encoder)
-            predictions = self.decoder.predict(X_decoder, hidden)
+            output, hidden = self.encode(X_encoder, series)
+            predictions = self.decoder.predict_generating(X_decoder, hidden, number_steps_predict)
 
         return predictions
 
@@ -232,6 +282,8 @@ class EncoderDecoderTrainer(Trainer):
                  use_scheduler=False,
                  validation_date=None,
                  test_date=None,
+                 use_direct_head=False,
+                 use_series_embedding=False,
                  **kwargs):
         """
         Trainer class for encoder-decoder models
@@ -292,6 +344,15 @@ class EncoderDecoderTrainer(Trainer):
         test_date : int or datetime
             Test split
 
+        use_direct_head : boolean, default : False
+            If True the encoder outputs go to a head predicting all number_steps_predict
+            steps in one forward pass, instead of the decoder.
+            Can then predict any shorter horizon with the same model
+
+        use_series_embedding : boolean, default : False
+            If True the model learns an embedding per series of a panel dataset and
+            conditions its forecasts on the series of each window. Panel datasets only
+
         kwargs : **
         """
 
@@ -321,6 +382,10 @@ class EncoderDecoderTrainer(Trainer):
         self.normalizer = normalizer
         self.validation_date = validation_date
         self.test_date = test_date
+        self.use_direct_head = use_direct_head
+        self.use_series_embedding = use_series_embedding
+
+        assert not use_series_embedding or self.panel, 'Series embeddings are only available for panel datasets'
 
         self.file_name = self.filelogger.file_name
 
@@ -340,7 +405,9 @@ class EncoderDecoderTrainer(Trainer):
                         'num_epoch',
                         'target_column',
                         'validation_date',
-                        'test_date']
+                        'test_date',
+                        'use_direct_head',
+                        'use_series_embedding']
 
         metadata_value = [self.number_steps_train,
                           self.number_steps_predict,
@@ -353,7 +420,9 @@ class EncoderDecoderTrainer(Trainer):
                           self.num_epoch,
                           self.target_column,
                           self.validation_date,
-                          self.test_date]
+                          self.test_date,
+                          self.use_direct_head,
+                          self.use_series_embedding]
 
         metadata_dict = {}
         for i in range(len(metadata_key)):
@@ -374,7 +443,9 @@ class EncoderDecoderTrainer(Trainer):
                                         self.cell_type_encoder,
                                         self.cell_type_decoder,
                                         self.number_features_output,
-                                        self.use_attention)
+                                        self.use_attention,
+                                        self.use_direct_head,
+                                        self.datareader.number_series if self.use_series_embedding else None)
 
             self.filelogger.write_metadata(metadata_dict)
 
@@ -411,6 +482,8 @@ class EncoderDecoderTrainer(Trainer):
         if type(m) in [nn.Linear, nn.Conv1d]:
             torch.nn.init.xavier_uniform(m.weight)
             m.bias.data.fill_(0.00)
+        if type(m) == SeriesEmbedding:
+            m.reset_parameters()
 
     def prepare_datareader(self):
         # prepare datareader
@@ -423,16 +496,29 @@ class EncoderDecoderTrainer(Trainer):
         # Initialize train generator
         self.train_generator = self.datareader.generator_train(self.batch_size,
                                                                self.target_column,
-                                                               allow_smaller_batch=True)
+                                                               allow_smaller_batch=True,
+                                                               reuse_buffer=True,
+                                                               num_workers=self.num_workers,
+                                                               worker_type=self.worker_type,
+                                                               pin_memory=self.use_cuda,
+                                                               return_series=self.panel,
+                                                               device=self.device if self.device_dataset else None)
 
         # Initialize validation and test generator
         if self.validation_date is not None:
             self.validation_generator = self.datareader.generator_validation(self.batch_size,
-                                                                             self.target_column)
+                                                                             self.target_column,
+                                                                             reuse_buffer=True,
+                                                                             num_workers=self.num_workers,
+                                                                             worker_type=self.worker_type,
+                                                                             pin_memory=self.use_cuda,
+                                                                             return_series=self.panel,
+                                                                             device=self.device if self.device_dataset else None)
 
         if self.test_date is not None:
             self.test_generator = self.datareader.generator_test(self.batch_size,
-                                                                 self.target_column)
+                                                                 self.target_column,
+                                                                 return_series=self.panel)
 
     def prepare_datareader_cv(self,
                               cv_train,
@@ -447,51 +533,63 @@ class EncoderDecoderTrainer(Trainer):
         # Initialize train generator
         self.train_generator = self.datareader.generator_train(self.batch_size,
                                                                self.target_column,
-                                                               allow_smaller_batch=True)
+                                                               allow_smaller_batch=True,
+                                                               reuse_buffer=True,
+                                                               num_workers=self.num_workers,
+                                                               worker_type=self.worker_type,
+                                                               pin_memory=self.use_cuda,
+                                                               return_series=self.panel,
+                                                               device=self.device if self.device_dataset else None)
 
         if self.validation_date is not None:
             self.validation_generator = self.datareader.generator_validation(self.batch_size,
-                                                                             self.target_column)
+                                                                             self.target_column,
+                                                                             reuse_buffer=True,
+                                                                             num_workers=self.num_workers,
+                                                                             worker_type=self.worker_type,
+                                                                             pin_memory=self.use_cuda,
+                                                                             return_series=self.panel,
+                                                                             device=self.device if self.device_dataset else None)
 
     def training_step(self):
 
         self.model_optimizer.zero_grad()
-        X, Y = next(self.train_generator)
+        X, Y, series = self.next_batch(self.train_generator)
         length = X.shape[0]
-        X = Variable(torch.from_numpy(X)).float().cuda()
-        Y = Variable(torch.from_numpy(Y)).float()
-        temp_array = np.empty((Y.shape[0], 1))
-        temp_array.fill(-100)
-        temp = Variable(torch.from_numpy(temp_array)).float()
-        decoder_input = torch.cat((temp, Y), dim=1)[:, :-1].unsqueeze(2)
-        results, _ = self.model.train_step(X, decoder_input.cuda())
-        loss = self.criterion(results, Y.unsqueeze(2).cuda())
+        with self.autocast():
+            if self.use_direct_head:
+                results, _ = self.model.train_step(X, None, series)
+                loss = self.criterion(results, self.direct_targets(X, Y))
+            else:
+                temp = Y.new_full((Y.shape[0], 1), -100)
+                decoder_input = torch.cat((temp, Y), dim=1)[:, :-1].unsqueeze(2)
+                results, _ = self.model.train_step(X, decoder_input, series)
+                loss = self.criterion(results, Y.unsqueeze(2))
         loss.backward()
         self.model_optimizer.step()
 
-        return loss.data[0], loss.data[0] * length
+        return loss.detach(), loss.detach() * length
 
     def evaluation_step(self):
 
-        X, Y = next(self.validation_generator)
+        X, Y, series = self.next_batch(self.validation_generator)
         length = X.shape[0]
-        X = Variable(torch.from_numpy(X), requires_grad=False, volatile=True).float().cuda()
-        Y = Variable(torch.from_numpy(Y), requires_grad=False, volatile=True).float().cuda()
-        temp_array = np.empty((Y.shape[0], 1))
-        temp_array.fill(-100)
-        decoder_input = Variable(torch.from_numpy(temp_array), requires_grad=False, volatile=True).float()
-        results = self.model.predict(X, decoder_input.unsqueeze(1).cuda())
-        valid_loss = self.criterion(results, Y.unsqueeze(2).cuda())
-
-        return valid_loss.data[0], valid_loss.data[0] * length
-
-    def prediction_step(self):
-
-        X, Y = next(self.test_generator)
-        X = Variable(torch.from_numpy(X), requires_grad=False, volatile=True).float().cuda()
-        temp_array = np.empty((Y.shape[0], 1))
-        temp_array.fill(-100)
-        decoder_input = Variable(torch.from_numpy(temp_array), requires_grad=False, volatile=True).float()
-        results = self.model.predict(X, decoder_input.unsqueeze(2).cuda())
-
-        return results, Y
+        decoder_input = Y.new_full((Y.shape[0], 1), -100)
+        with torch.no_grad(), self.autocast():
+            if self.use_direct_head:
+                results, _ = self.model.train_step(X, None, series)
+                valid_loss = self.criterion(results, self.direct_targets(X, Y))
+            else:
+                results = self.model.predict(X, decoder_input.unsqueeze(1), series)
+                valid_loss = self.criterion(results, Y.unsqueeze(2))
+
+        return valid_loss.detach(), valid_loss.detach() * length
+
+    def prediction_step(self, number_steps_predict=None):
+
+        X, Y, series = self.next_batch(self.test_generator)
+        decoder_input = X.new_full((X.shape[0], 1), -100)
+        with torch.no_grad(), self.autocast():
+            results = self.model.predict(X, decoder_input.unsqueeze(2), series, number_steps_predict)
+
+        return results, Y, series
@@ -1,12 +1,10 @@
 import torch
 import torch.nn as nn
-from torch.autograd import Variable
 from torch.optim.lr_scheduler import *
 import torch.optim as optim
 
-import numpy as np
-
 from MyPackage import Trainer
+from ..SeriesEmbedding import SeriesEmbedding
 from .QRNN import QRNN
 from .TCN import TemporalConvNet
 from .DRNN import DRNN
@@ -22,7 +20,9 @@ class RNNModel(nn.Module):
                  kernel_size=None,
                  num_layers=1,
                  hidden_size=10,
-                 cell_type='LSTM'):
+                 cell_type='LSTM',
+                 use_direct_head=False,
+                 number_series=None):
 
         """
         Class to create each model instance and forward and predict steps.
@@ -51,6 +51,14 @@ class RNNModel(nn.Module):
         cell_type : str
             Choose the model to implemnet
 
+        use_direct_head : boolean, optional, default : False
+            If True a linear head emits all number_steps_predict steps at once from the
+            last hidden state, instead of feeding predictions back autoregressively
+
+        number_series : int, optional, default : None
+            Number of series of a panel dataset. If given a series embedding is added to
+            the encoder outputs, and forward and predict take the series id of each window
+
         """
 
         super(RNNModel, self).__init__()
@@ -82,35 +90,67 @@ class RNNModel(nn.Module):
             self.encoder_cell = TemporalConvNet(self.input_size, self.hidden_size, self.num_layers, self.kernel_size)
 
         self.output_layer = nn.Linear(self.hidden_size, self.output_size)
+        self.direct_head = nn.Linear(self.hidden_size, self.number_steps_predict) if use_direct_head else None
+        self.series_embedding = SeriesEmbedding(number_series, self.hidden_size) if number_series is not None else None
 
-    def forward(self, x, hidden=None):
+    def condition(self, output, series):
+        # Add the series embedding to the encoder outputs, before the output layers
+        if self.series_embedding is None:
+            return output
+        return self.series_embedding(output, series)
+
+    def forward(self, x, hidden=None, series=None):
         # returns output variable - all hidden states for seq_len, hindden state - last hidden state
         outputs, hidden_state = self.encoder_cell(x, hidden)
+        outputs = self.condition(outputs, series)
+        if self.direct_head is not None:
+            # all horizons from every position, shape (batch, seq_len, number_steps_predict)
+            return self.direct_head(outputs)
         outputs = self.output_layer(outputs)
         return outputs
 
-    def predict(self, x, hidden=None):
-        # loop to concat output to input in last position and run all the model again
-        if self.cell_type == 'DRNN' or 'QRNN' or 'TCN':
+    def predict(self, x, hidden=None, series=None, number_steps_predict=None):
+        # number_steps_predict defaults to the horizon the model was built for
+        if number_steps_predict is None:
+            number_steps_predict = self.number_steps_predict
+
+        if self.direct_head is not None:
+            # one pass, a head trained for a longer horizon also serves the shorter ones
+            assert number_steps_predict <= self.direct_head.out_features, \
+                'Direct head trained for {} steps'.format(self.direct_head.out_features)
+            output, hidden_state = self.encoder_cell(x, hidden)
+            return self.direct_head(self.condition(output[:, -1, :], series))[:, :number_steps_predict]
+        elif self.cell_type == 'TCN' and self.encoder_cell.receptive_field <= x.shape[1]:
+            # encode the history once, then step the cached causal buffers with the last prediction.
+            # Only when the receptive field fits in the window, otherwise the buffers see older inputs
+            output, state = self.encoder_cell.encode(x)
+            result = self.output_layer(self.condition(output[:, -1, :], series))
+
+            predictions = [result]
+            for step in range(1, number_steps_predict):
+                output, state = self.encoder_cell.step(result, state)
+                result = self.output_layer(self.condition(output, series))
+                predictions.append(result)
+            return torch.stack(predictions, dim=1)[:, :, 0]
+        elif self.cell_type in ['DRNN', 'QRNN', 'TCN']:
+            # loop to concat output to input in last position and run all the model again
             predictions = []
             seq_len = x.shape[1]
-            for step in range(self.number_steps_predict):
+            for step in range(number_steps_predict):
                 output, hidden_state = self.encoder_cell(x[:, -seq_len:, :])
-                result = self.output_layer(output[:, -1, :])
+                result = self.output_layer(self.condition(output[:, -1, :], series))
                 x = torch.cat([x, result.unsqueeze(1)], dim=1)
                 predictions.append(result)
             return torch.stack(predictions, dim=1)[:, :, 0]
         else:
-            predictions = []
-            for step in range(self.number_steps_predict):
-                if step == 0:
-                    # returns output variable - all hidden states for seq_len, hidden state - last hidden state
-                    output, hidden_state = self.encoder_cell(x, hidden)
-                    result = self.output_layer(output[:, -1, :])
-                else:
-                    # returns output variable - all hidden states for seq_len, hidden state - last hidden state
-                    output, hidden_state = self.encoder_cell(result.unsqueeze(1), hidden_state)
-                    result = self.output_layer(output[:, -1, :])
+            # encode the history once, then feed only the last prediction with the carried hidden state
+            output, hidden_state = self.encoder_cell(x, hidden)
+            result = self.output_layer(self.condition(output[:, -1, :], series))
+
+            predictions = [result]
+            for step in range(1, number_steps_predict):
+                output, hidden_state = self.encoder_cell(result.unsqueeze(1), hidden_state)
+                result = self.output_layer(self.condition(output[:, -1, :], series))
                 predictions.append(result)
             return torch.stack(predictions, dim=1)[:, :, 0]
 
@@ -135,6 +175,8 @@ class RNNTrainer(Trainer):
                  use_scheduler=False,
                  validation_date=None,
                  test_date=None,
+                 use_direct_head=False,
+                 use_series_embedding=False,
                  **kwargs):
 
         """
@@ -192,6 +234,14 @@ class RNNTrainer(Trainer):
         test_date : int or datetime
             Test split
 
+        use_direct_head : boolean, default : False
+            If True the model predicts all number_steps_predict steps in one forward pass.
+            Can then predict any shorter horizon with the same model
+
+        use_series_embedding : boolean, default : False
+            If True the model learns an embedding per series of a panel dataset and
+            conditions its forecasts on the series of each window. Panel datasets only
+
         kwargs : **
         """
 
@@ -218,6 +268,10 @@ class RNNTrainer(Trainer):
         self.validation_date = validation_date
         self.test_date = test_date
         self.target_column = target_column
+        self.use_direct_head = use_direct_head
+        self.use_series_embedding = use_series_embedding
+
+        assert not use_series_embedding or self.panel, 'Series embeddings are only available for panel datasets'
 
         self.file_name = self.filelogger.file_name
 
@@ -237,7 +291,9 @@ class RNNTrainer(Trainer):
                         'num_epoch',
                         'target_column',
                         'validation_date',
-                        'test_date']
+                        'test_date',
+                        'use_direct_head',
+                        'use_series_embedding']
 
         metadata_value = [self.number_steps_train,
                           self.number_steps_predict,
@@ -250,7 +306,9 @@ class RNNTrainer(Trainer):
                           self.num_epoch,
                           self.target_column,
                           self.validation_date,
-                          self.test_date]
+                          self.test_date,
+                          self.use_direct_head,
+                          self.use_series_embedding]
 
         metadata_dict = {}
         for i in range(len(metadata_key)):
@@ -268,7 +326,9 @@ class RNNTrainer(Trainer):
                                   self.kernel_size,
                                   self.num_layers,
                                   self.hidden_size,
-                                  self.cell_type)
+                                  self.cell_type,
+                                  self.use_direct_head,
+                                  self.datareader.number_series if self.use_series_embedding else None)
 
             self.filelogger.write_metadata(metadata_dict)
 
@@ -306,6 +366,8 @@ class RNNTrainer(Trainer):
         if type(m) in [nn.Linear, nn.Conv1d]:
             torch.nn.init.xavier_uniform(m.weight)
             m.bias.data.fill_(0.00)
+        if type(m) == SeriesEmbedding:
+            m.reset_parameters()
 
     def prepare_datareader(self):
         # prepare datareader
@@ -318,16 +380,29 @@ class RNNTrainer(Trainer):
         # Initialize train generator
         self.train_generator = self.datareader.generator_train(self.batch_size,
                                                                self.target_column,
-                                                               allow_smaller_batch=True)
+                                                               allow_smaller_batch=True,
+                                                               reuse_buffer=True,
+                                                               num_workers=self.num_workers,
+                                                               worker_type=self.worker_type,
+                                                               pin_memory=self.use_cuda,
+                                                               return_series=self.panel,
+                                                               device=self.device if self.device_dataset else None)
 
         # Initialize validation and test generator
         if self.validation_date is not None:
             self.validation_generator = self.datareader.generator_validation(self.batch_size,
-                                                                             self.target_column)
+                                                                             self.target_column,
+                                                                             reuse_buffer=True,
+                                                                             num_workers=self.num_workers,
+                                                                             worker_type=self.worker_type,
+                                                                             pin_memory=self.use_cuda,
+                                                                             return_series=self.panel,
+                                                                             device=self.device if self.device_dataset else None)
 
         if self.test_date is not None:
             self.test_generator = self.datareader.generator_test(self.batch_size,
-                                                                 self.target_column)
+                                                                 self.target_column,
+                                                                 return_series=self.panel)
 
     def prepare_datareader_cv(self,
                               cv_train,
@@ -343,49 +418,65 @@ class RNNTrainer(Trainer):
         # Initialize train generator
         self.train_generator = self.datareader.generator_train(self.batch_size,
                                                                self.target_column,
-                                                               allow_smaller_batch=True)
+                                                               allow_smaller_batch=True,
+                                                               reuse_buffer=True,
+                                                               num_workers=self.num_workers,
+                                                               worker_type=self.worker_type,
+                                                               pin_memory=self.use_cuda,
+                                                               return_series=self.panel,
+                                                               device=self.device if self.device_dataset else None)
 
         if self.validation_date is not None:
             self.validation_generator = self.datareader.generator_validation(self.batch_size,
-                                                                             self.target_column)
+                                                                             self.target_column,
+                                                                             reuse_buffer=True,
+                                                                             num_workers=self.num_workers,
+                                                                             worker_type=self.worker_type,
+                                                                             pin_memory=self.use_cuda,
+                                                                             return_series=self.panel,
+                                                                             device=self.device if self.device_dataset else None)
 
     def training_step(self):
 
         self.model_optimizer.zero_grad()
-        X, Y = next(self.train_generator)
+        X, Y, series = self.next_batch(self.train_generator)
         length = X.shape[0]
-        Y = np.concatenate((X[:, 1:, 0], np.expand_dims(Y[:, 0], axis=1)), axis=1)
-        X = Variable(torch.from_numpy(X)).float().cuda()
-        Y = Variable(torch.from_numpy(Y)).float()
 
-        results = self.model(X)
+        with self.autocast():
+            results = self.model(X, series=series)
 
-        loss = self.criterion(results, Y.unsqueeze(2).cuda())
+            if self.use_direct_head:
+                loss = self.criterion(results, self.direct_targets(X, Y))
+            else:
+                Y = torch.cat((X[:, 1:, 0], Y[:, :1]), dim=1)
+                loss = self.criterion(results, Y.unsqueeze(2))
 
         loss.backward()
         self.model_optimizer.step()
 
-        return loss.data[0], loss.data[0] * length
+        return loss.detach(), loss.detach() * length
 
     def evaluation_step(self):
 
-        X, Y = next(self.validation_generator)
+        X, Y, series = self.next_batch(self.validation_generator)
         length = X.shape[0]
-        Y = np.concatenate((X[:, 1:, 0], np.expand_dims(Y[:, 0], axis=1)), axis=1)
-        X = Variable(torch.from_numpy(X), requires_grad=False, volatile=True).float().cuda()
-        Y = Variable(torch.from_numpy(Y), requires_grad=False, volatile=True).float()
 
-        results = self.model(X)
+        with torch.no_grad(), self.autocast():
+            results = self.model(X, series=series)
 
-        valid_loss = self.criterion(results, Y.unsqueeze(2).cuda())
+            if self.use_direct_head:
+                valid_loss = self.criterion(results, self.direct_targets(X, Y))
+            else:
+                Y = torch.cat((X[:, 1:, 0], Y[:, :1]), dim=1)
+                valid_loss = self.criterion(results, Y.unsqueeze(2))
 
-        return valid_loss.data[0], valid_loss.data[0] * length
+        return valid_loss.detach(), valid_loss.detach() * length
 
-    def prediction_step(self):
+    def prediction_step(self, number_steps_predict=None):
 
-        X, Y = next(self.test_generator)
-        X = Variable(torch.from_numpy(X), requires_grad=False, volatile=True).float().cuda()
+        X, Y, series = self.next_batch(self.test_generator)
 
-        results = self.model.predict(X)
+        with torch.no_grad(), self.autocast():
+            results = self.model.predict(X, series=series, number_steps_predict=number_steps_predict)
 
-        return results, Y
+        return results, Y, series
@@ -2,11 +2,21 @@ import math
 import torch
 import torch.nn as nn
 from torch.autograd import Variable
-from cupy.cuda import function
-from pynvrtc.compiler import Program
 from collections import namedtuple
 
 
+def cuda_kernel_available():
+    # cupy and pynvrtc are only needed, and imported, for the CUDA kernel
+    if not torch.cuda.is_available():
+        return False
+    try:
+        import cupy.cuda.function
+        import pynvrtc.compiler
+    except ImportError:
+        return False
+    return True
+
+
 kernel = '''
 extern "C"
 __global__ void recurrent_forget_mult(float *dst, const float *f, const float *x, int SEQ, int BATCH, int HIDDEN)
@@ -68,53 +78,90 @@ __global__ void bwd_recurrent_forget_mult(const float *h, const float *f, const
 
 ###
 
-class CPUForgetMult(torch.nn.Module):
-    def __init__(self):
-        super(CPUForgetMult, self).__init__()
+@torch.jit.script
+def scan(a, b):
+    # In place over time: after the step with offset k, (a_t, b_t) composes the maps t - 2k + 1 .. t
+    a, b = a.clone(), b.clone()
+    offset = 1
+    while offset < a.size(0):
+        b[offset:] = b[offset:] + a[offset:] * b[:-offset]
+        a[offset:] = a[offset:] * a[:-offset]
+        offset *= 2
+    return a, b
 
-    def forward(self, f, x, hidden_init=None):
-        result = []
-        ###
-        forgets = f.split(1, dim=0)
-        prev_h = hidden_init
-        for i, h in enumerate((f * x).split(1, dim=0)):
-            if prev_h is not None: h = h + (1 - forgets[i]) * prev_h
-            # h is (1, batch, hidden) when it needs to be (batch_hidden)
-            # Calling squeeze will result in badness if batch size is 1
-            h = h.view(h.size()[1:])
-            result.append(h)
-            prev_h = h
-        ###
-        return torch.stack(result)
+
+class CPUForgetMult(torch.autograd.Function):
+    """
+    ForgetMult on CPU as a parallel scan. h_t = (1 - f_t) * h_{t-1} + f_t * x_t is the
+    composition of the affine maps (a_t, b_t) = (1 - f_t, f_t * x_t), which is associative,
+    so a doubling (Hillis-Steele) scan computes every h_t with log2(seq_len) vectorized steps.
+    The scan only multiplies and adds, it never divides or takes logs, so it cannot
+    underflow the way a cumprod or log-space cumsum formulation does on long sequences.
+    The backward is the same scan run in reverse over the gradients, as the CUDA kernel.
+    The scan is compiled with TorchScript and runs on any device, so it is also the
+    fallback on GPUs without cupy or pynvrtc.
+    """
+
+    @staticmethod
+    def forward(ctx, f, x, hidden_init=None):
+        forgets, h = scan(1 - f, f * x)
+        if hidden_init is not None:
+            h = h + forgets * hidden_init.view(1, *f.size()[1:])
+
+        ctx.save_for_backward(f, x, h, hidden_init)
+        return h
+
+    @staticmethod
+    def backward(ctx, grad_h):
+        f, x, h, hidden_init = ctx.saved_tensors
+
+        # grad_c_t = grad_h_t + (1 - f_{t+1}) * grad_c_{t+1}, a scan over the reversed sequence
+        retain = torch.cat([1 - f[1:], f.new_zeros(1, *f.size()[1:])])
+        _, grad_c = scan(retain.flip(0), grad_h.contiguous().flip(0))
+        grad_c = grad_c.flip(0)
+
+        prev_h = hidden_init.view(1, *f.size()[1:]) if hidden_init is not None else f.new_zeros(1, *f.size()[1:])
+        prev_h = torch.cat([prev_h, h[:-1]])
+
+        grad_f = (x - prev_h) * grad_c
+        grad_x = f * grad_c
+        grad_h_init = None
+        if hidden_init is not None:
+            grad_h_init = ((1 - f[0]) * grad_c[0]).view_as(hidden_init)
+
+        return grad_f, grad_x, grad_h_init
 
 
 class GPUForgetMult(torch.autograd.Function):
     configured_gpus = {}
     ptx = None
-    def __init__(self):
-        super(GPUForgetMult, self).__init__()
 
-    def compile(self):
-        if self.ptx is None:
+    @staticmethod
+    def compile():
+        from cupy.cuda import function
+        from pynvrtc.compiler import Program
+
+        if GPUForgetMult.ptx is None:
             program = Program(kernel.encode(), 'recurrent_forget_mult.cu'.encode())
             GPUForgetMult.ptx = program.compile()
 
         if torch.cuda.current_device() not in GPUForgetMult.configured_gpus:
             m = function.Module()
-            m.load(bytes(self.ptx.encode()))
+            m.load(bytes(GPUForgetMult.ptx.encode()))
 
-            self.forget_mult = m.get_function('recurrent_forget_mult')
-            self.bwd_forget_mult = m.get_function('bwd_recurrent_forget_mult')
+            forget_mult = m.get_function('recurrent_forget_mult')
+            bwd_forget_mult = m.get_function('bwd_recurrent_forget_mult')
 
             Stream = namedtuple('Stream', ['ptr'])
-            self.stream = Stream(ptr=torch.cuda.current_stream().cuda_stream)
+            stream = Stream(ptr=torch.cuda.current_stream().cuda_stream)
 
-            GPUForgetMult.configured_gpus[torch.cuda.current_device()] = (self.forget_mult, self.bwd_forget_mult, self.stream)
+            GPUForgetMult.configured_gpus[torch.cuda.current_device()] = (forget_mult, bwd_forget_mult, stream)
 
-        self.forget_mult, self.bwd_forget_mult, self.stream = GPUForgetMult.configured_gpus[torch.cuda.current_device()]
+        return GPUForgetMult.configured_gpus[torch.cuda.current_device()]
 
-    def forward(self, f, x, hidden_init=None):
-        self.compile()
+    @staticmethod
+    def forward(ctx, f, x, hidden_init=None):
+        forget_mult, _, stream = GPUForgetMult.compile()
         seq_size, batch_size, hidden_size = f.size()
         result = f.new(seq_size + 1, batch_size, hidden_size)
         # We only zero the result array (result[0]) if we don't set a hidden initial state
@@ -124,15 +171,17 @@ class GPUForgetMult(torch.autograd.Function):
         ###
         grid_hidden_size = min(hidden_size, 512)
         grid = (math.ceil(hidden_size / grid_hidden_size), batch_size)
-        self.forget_mult(grid=grid, block=(grid_hidden_size, 1), args=[result.data_ptr(), f.data_ptr(), x.data_ptr(), seq_size, batch_size, hidden_size], stream=self.stream)
-        self.save_for_backward(f, x, hidden_init)
-        self.result = result
-        return result[1:, :, :]
-
-    def backward(self, grad_h):
-        self.compile()
-        f, x, hidden_init = self.saved_tensors
-        h = self.result
+        forget_mult(grid=grid, block=(grid_hidden_size, 1), args=[result.data_ptr(), f.data_ptr(), x.data_ptr(), seq_size, batch_size, hidden_size], stream=stream)
+        ctx.save_for_backward(f, x, hidden_init)
+        ctx.result = result
+        return result[1:, :, :].clone()
+
+    @staticmethod
+    def backward(ctx, grad_h):
+        _, bwd_forget_mult, stream = GPUForgetMult.compile()
+        f, x, hidden_init = ctx.saved_tensors
+        h = ctx.result
+        grad_h = grad_h.contiguous()
         ###
         seq_size, batch_size, hidden_size = f.size()
         # Zeroing is not necessary as these will be overwritten
@@ -142,11 +191,11 @@ class GPUForgetMult(torch.autograd.Function):
         ###
         grid_hidden_size = min(hidden_size, 512)
         grid = (math.ceil(hidden_size / grid_hidden_size), batch_size)
-        self.bwd_forget_mult(grid=grid, block=(grid_hidden_size, 1), args=[h.data_ptr(), f.data_ptr(), x.data_ptr(), grad_h.data_ptr(), grad_f.data_ptr(), grad_x.data_ptr(), grad_h_init.data_ptr(), seq_size, batch_size, hidden_size], stream=self.stream)
+        bwd_forget_mult(grid=grid, block=(grid_hidden_size, 1), args=[h.data_ptr(), f.data_ptr(), x.data_ptr(), grad_h.data_ptr(), grad_f.data_ptr(), grad_x.data_ptr(), grad_h_init.data_ptr(), seq_size, batch_size, hidden_size], stream=stream)
         ###
         if hidden_init is not None:
-            return grad_f, grad_x, grad_h_init
-        return grad_f, grad_x
+            return grad_f, grad_x, grad_h_init.view_as(hidden_init)
+        return grad_f, grad_x, None
 
 
 class ForgetMult(torch.nn.Module):
@@ -157,21 +206,22 @@ class ForgetMult(torch.nn.Module):
         - X (seq_len, batch, input_size): tensor containing the features of the input sequence.
         - F (seq_len, batch, input_size): tensor containing the forget gate values, assumed in range [0, 1].
         - hidden_init (batch, input_size): tensor containing the initial hidden state for the recurrence (h_{t-1}).
-        - use_cuda: If True, use the fast element-wise CUDA kernel for recurrence. If False, uses naive for loop. Default: True.
+        - use_cuda: If True, use the fast element-wise CUDA kernel for recurrence when the tensors are on a GPU
+          and cupy and pynvrtc are installed. Otherwise uses the compiled parallel scan. Default: True.
     """
 
+    use_cuda_kernel = None
+
     def __init__(self):
         super(ForgetMult, self).__init__()
 
     def forward(self, f, x, hidden_init=None, use_cuda=True):
-        # Use CUDA by default unless it's available
-        use_cuda = use_cuda and torch.cuda.is_available()
-        # Ensure the user is aware when ForgetMult is not GPU version as it's far faster
-        if use_cuda: assert f.is_cuda and x.is_cuda, 'GPU ForgetMult with fast element-wise CUDA kernel requested but tensors not on GPU'
+        # The CUDA kernel is only selected when the tensors are on a GPU and cupy and pynvrtc can be imported
+        if ForgetMult.use_cuda_kernel is None:
+            ForgetMult.use_cuda_kernel = cuda_kernel_available()
+        use_cuda = use_cuda and ForgetMult.use_cuda_kernel and f.is_cuda and x.is_cuda
         ###
-        # Avoiding 'RuntimeError: expected a Variable argument, but got NoneType' when hidden_init is None
-        if hidden_init is None: return GPUForgetMult()(f, x) if use_cuda else CPUForgetMult()(f, x)
-        return GPUForgetMult()(f, x, hidden_init) if use_cuda else CPUForgetMult()(f, x, hidden_init)
+        return GPUForgetMult.apply(f, x, hidden_init) if use_cuda else CPUForgetMult.apply(f, x, hidden_init)
 
 
 class QRNNLayer(nn.Module):
@@ -183,7 +233,7 @@ class QRNNLayer(nn.Module):
         window: Defines the size of the convolutional window (how many previous tokens to look when computing the QRNN values). Supports 1 and 2. Default: 1.
         zoneout: Whether to apply zoneout (i.e. failing to update elements in the hidden state) to the hidden state updates. Default: 0.
         output_gate: If True, performs QRNN-fo (applying an output gate to the output). If False, performs QRNN-f. Default: True.
-        use_cuda: If True, uses fast custom CUDA kernel. If False, uses naive for loop. Default: True.
+        use_cuda: If True, uses fast custom CUDA kernel when available on the device. If False, uses the compiled parallel scan. Default: True.
     Inputs: X, hidden
         - X (seq_len, batch, input_size): tensor containing the features of the input sequence.
         - hidden (batch, hidden_size): tensor containing the initial hidden state for the QRNN.
@@ -218,9 +268,9 @@ class QRNNLayer(nn.Module):
         X = X.contiguous().permute(1, 0, 2)
         seq_len, batch_size, features_dim = X.size()
 
+        source = X
         if self.window > 1:
-            K = torch.autograd.Variable(torch.zeros(self.window - 1, batch_size, features_dim),
-                                        requires_grad=False).cuda()
+            K = X.new_zeros(self.window - 1, batch_size, features_dim)
             source = torch.cat((K, X), dim=0)
 
         source = source.contiguous().permute(1, 2, 0)
@@ -284,7 +334,7 @@ class QRNN(torch.nn.Module):
         window: Defines the size of the convolutional window (how many previous tokens to look when computing the QRNN values). Supports 1 and 2. Default: 1.
         zoneout: Whether to apply zoneout (i.e. failing to update elements in the hidden state) to the hidden state updates. Default: 0.
         output_gate: If True, performs QRNN-fo (applying an output gate to the output). If False, performs QRNN-f. Default: True.
-        use_cuda: If True, uses fast custom CUDA kernel. If False, uses naive for loop. Default: True.
+        use_cuda: If True, uses fast custom CUDA kernel when available on the device. If False, uses the compiled parallel scan. Default: True.
     Inputs: X, hidden
         - X (seq_len, batch, input_size): tensor containing the features of the input sequence.
         - hidden (layers, batch, hidden_size): tensor containing the initial hidden state for the QRNN.
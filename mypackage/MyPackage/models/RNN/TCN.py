@@ -1,5 +1,23 @@
+import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from torch.nn.utils import weight_norm
+from torch.nn.utils.weight_norm import WeightNorm
+
+
+def conv_weight(conv):
+    # weight_norm only recomputes conv.weight when the module is called, so build it from weight_g and weight_v
+    for hook in conv._forward_pre_hooks.values():
+        if isinstance(hook, WeightNorm):
+            return hook.compute_weight(conv)
+    return conv.weight
+
+
+def causal_buffer(x, padding):
+    # last padding steps of x with shape (batch, channels, seq_len), left padded with zeros as the causal convolution
+    if x.shape[2] >= padding:
+        return x[:, :, x.shape[2] - padding:]
+    return F.pad(x, (padding - x.shape[2], 0))
 
 
 class Chomp1d(nn.Module):
@@ -28,6 +46,8 @@ class TemporalBlock(nn.Module):
 
         self.net = nn.Sequential(self.conv1, self.chomp1, self.relu1, self.dropout1,
                                  self.conv2, self.chomp2, self.relu2, self.dropout2)
+        self.padding = padding
+        self.dilation = dilation
         self.downsample = nn.Conv1d(n_inputs, n_outputs, 1) if n_inputs != n_outputs else None
         self.relu = nn.ReLU()
         self.init_weights()
@@ -43,6 +63,86 @@ class TemporalBlock(nn.Module):
         res = x if self.downsample is None else self.downsample(x)
         return self.relu(out + res)
 
+    def encode(self, x):
+        """
+        Run the block over a sequence and return the streaming state after its last step.
+
+        Parameters
+        ----------
+        x : torch.Tensor
+            Tensor with shape (batch, channels, seq_len)
+
+        Returns
+        -------
+        output : torch.Tensor
+            Same as forward
+
+        state : tuple
+            Causal buffers of conv1 and conv2, the last padding inputs of each convolution
+
+        """
+
+        hidden = self.dropout1(self.relu1(self.chomp1(self.conv1(x))))
+        out = self.dropout2(self.relu2(self.chomp2(self.conv2(hidden))))
+        res = x if self.downsample is None else self.downsample(x)
+
+        return self.relu(out + res), (causal_buffer(x, self.padding), causal_buffer(hidden, self.padding))
+
+    def init_state(self, x):
+        """
+        Empty streaming state, the zero padding seen by the first step of forward.
+
+        Parameters
+        ----------
+        x : torch.Tensor
+            Tensor with shape (batch, channels), used for batch size, dtype and device
+
+        """
+
+        buffer1 = x.new_zeros(x.shape[0], self.conv1.in_channels, self.padding)
+        buffer2 = x.new_zeros(x.shape[0], self.conv2.in_channels, self.padding)
+
+        return buffer1, buffer2
+
+    def step(self, x_t, state):
+        """
+        Advance the block one timestep. Each convolution only sees its kernel_size
+        dilated taps from the cached buffer, instead of the whole window.
+
+        Parameters
+        ----------
+        x_t : torch.Tensor
+            Tensor with shape (batch, channels)
+
+        state : tuple
+            Causal buffers returned by encode, init_state or a previous step
+
+        Returns
+        -------
+        output : torch.Tensor
+            Tensor with shape (batch, n_outputs)
+
+        state : tuple
+            Updated causal buffers
+
+        """
+
+        buffer1, buffer2 = state
+        x_t = x_t.unsqueeze(2)
+
+        window1 = torch.cat([buffer1, x_t], dim=2)
+        hidden = F.conv1d(window1, conv_weight(self.conv1), self.conv1.bias, dilation=self.dilation)
+        hidden = self.dropout1(self.relu1(hidden))
+
+        window2 = torch.cat([buffer2, hidden], dim=2)
+        out = F.conv1d(window2, conv_weight(self.conv2), self.conv2.bias, dilation=self.dilation)
+        out = self.dropout2(self.relu2(out))
+
+        res = x_t if self.downsample is None else self.downsample(x_t)
+        output = self.relu(out + res)
+
+        return output.squeeze(2), (window1[:, :, 1:], window2[:, :, 1:])
+
 
 class TemporalConvNet(nn.Module):
     def __init__(self, num_inputs, hidden_size, num_layers, kernel_size=2, dropout=0.0):
@@ -59,9 +159,93 @@ class TemporalConvNet(nn.Module):
 
         self.network = nn.Sequential(*layers)
 
+    @property
+    def receptive_field(self):
+        # Inputs seen by one output, each block has two convolutions of (kernel_size - 1) * dilation padding
+        return 1 + sum(2 * block.padding for block in self.network)
+
     def forward(self, x, hidden=None):
         x = x.permute(0, 2, 1)
         output = self.network(x)
         output = output.permute(0, 2, 1)
 
-        return output, hidden
\ No newline at end of file
+        return output, hidden
+
+    def encode(self, x):
+        """
+        Run the network over the history and return the streaming state to continue from it with step.
+
+        Parameters
+        ----------
+        x : torch.Tensor
+            Tensor with shape (batch, seq_len, num_inputs)
+
+        Returns
+        -------
+        output : torch.Tensor
+            Tensor with shape (batch, seq_len, hidden_size), same as forward
+
+        state : list
+            Causal buffers of each TemporalBlock
+
+        """
+
+        output = x.permute(0, 2, 1)
+        state = []
+        for block in self.network:
+            output, block_state = block.encode(output)
+            state.append(block_state)
+
+        return output.permute(0, 2, 1), state
+
+    def init_state(self, x_t):
+        """
+        Streaming state of an empty history.
+
+        Parameters
+        ----------
+        x_t : torch.Tensor
+            Tensor with shape (batch, num_inputs)
+
+        """
+
+        state = []
+        for block in self.network:
+            state.append(block.init_state(x_t))
+            x_t = x_t.new_zeros(x_t.shape[0], block.conv2.out_channels)
+
+        return state
+
+    def step(self, x_t, state=None):
+        """
+        Advance the network one timestep, costing O(num_layers * kernel_size) per step.
+        The buffers hold the last receptive_field inputs, so the output matches a forward
+        over a window of the last seq_len inputs only if receptive_field <= seq_len.
+
+        Parameters
+        ----------
+        x_t : torch.Tensor
+            Tensor with shape (batch, num_inputs)
+
+        state : list, optional, default : None
+            State returned by encode or a previous step. If None starts from an empty history
+
+        Returns
+        -------
+        output : torch.Tensor
+            Tensor with shape (batch, hidden_size)
+
+        state : list
+            Updated state
+
+        """
+
+        if state is None:
+            state = self.init_state(x_t)
+
+        new_state = []
+        for block, block_state in zip(self.network, state):
+            x_t, block_state = block.step(x_t, block_state)
+            new_state.append(block_state)
+
+        return x_t, new_state
\ No newline at end of file
@@ -0,0 +1,61 @@
+import torch.nn as nn
+
+
+class SeriesEmbedding(nn.Module):
+    def __init__(self,
+                 number_series,
+                 embedding_size):
+        """
+        Learned vector per series of a panel dataset, added to the features of a model
+        so one model can condition its forecasts on the series of each window.
+        Initialized to zeros, so training starts from the unconditioned model.
+
+        Parameters
+        ----------
+        number_series : int
+            Number of series in the panel
+
+        embedding_size : int
+            Size of the features the embedding is added to
+
+        """
+
+        super(SeriesEmbedding, self).__init__()
+
+        self.embedding = nn.Embedding(number_series, embedding_size)
+        self.reset_parameters()
+
+    def reset_parameters(self):
+        nn.init.zeros_(self.embedding.weight)
+
+    def forward(self,
+                features,
+                series,
+                batch_dim=0,
+                feature_dim=-1):
+        """
+        Add the embedding of each window's series to its features.
+
+        Parameters
+        ----------
+        features : torch.Tensor
+            Features with the batch in batch_dim and the embedding_size features in feature_dim
+
+        series : torch.LongTensor or None
+            Series id of each window. If None features are returned unchanged
+
+        batch_dim : int, default : 0
+
+        feature_dim : int, default : -1
+            Must come after batch_dim
+
+        """
+
+        if series is None:
+            return features
+
+        shape = [1] * features.dim()
+        shape[batch_dim] = series.shape[0]
+        shape[feature_dim] = self.embedding.embedding_dim
+
+        return features + self.embedding(series).view(shape).to(features.dtype)
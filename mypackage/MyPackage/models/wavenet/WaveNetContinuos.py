@@ -1,12 +1,12 @@
 import torch
 from torch import nn
-from torch.autograd import Variable
 from torch.optim.lr_scheduler import *
 import torch.optim as optim
-import torch.functional as F
+import torch.nn.functional as F
 import numpy as np
 
 from MyPackage import Trainer
+from ..SeriesEmbedding import SeriesEmbedding
 
 SEED = 1337
 
@@ -18,7 +18,9 @@ class WaveNetModelContinuos(nn.Module):
                  n_residue=32,
                  n_skip=512,
                  dilation_depth=10,
-                 n_repeat=5):
+                 n_repeat=5,
+                 use_direct_head=False,
+                 number_series=None):
         super(WaveNetModelContinuos, self).__init__()
 
         self.dilation_depth = dilation_depth
@@ -51,11 +53,19 @@ class WaveNetModelContinuos(nn.Module):
 
         self.conv_post_2 = nn.Conv1d(in_channels=n_skip, out_channels=1, kernel_size=1)
 
+        # Direct multi-horizon head, all number_steps_predict steps from each output position
+        self.direct_head = nn.Conv1d(in_channels=n_skip, out_channels=number_steps_predict, kernel_size=1) \
+            if use_direct_head else None
+
+        # Series embedding of a panel dataset, added to the summed skip connections
+        self.series_embedding = SeriesEmbedding(number_series, n_skip) if number_series is not None else None
+
         self.receptive_field = None
         self.output_receptive_field = None
 
     def forward(self,
-                input):
+                input,
+                series=None):
 
         output = input.permute(0, 2, 1)
         output = self.from_input(output)
@@ -65,13 +75,23 @@ class WaveNetModelContinuos(nn.Module):
             output, skip = self.residue_forward(output, s, t, skip_scale, residue_scale)
             skip_connections.append(skip)
         output = sum([s[:, :, -output.size(2):] for s in skip_connections])
-        output = self.postprocess(output)
+        output = self.postprocess(output, series)
+        if self.direct_head is not None:
+            # shape (batch, output length, number_steps_predict)
+            return output.permute(0, 2, 1)
         return output
 
-    def postprocess(self, input):
-        output = F.elu(input)
+    def condition(self, skip, series):
+        if self.series_embedding is None:
+            return skip
+        return self.series_embedding(skip, series, feature_dim=1)
+
+    def postprocess(self, input, series=None):
+        output = F.elu(self.condition(input, series))
         output = self.conv_post_1(output)
         output = F.elu(output)
+        if self.direct_head is not None:
+            return self.direct_head(output)
         output = self.conv_post_2(output)
         return output
 
@@ -100,15 +120,91 @@ class WaveNetModelContinuos(nn.Module):
 
         return self.output_receptive_field
 
-    def predict(self, input):
+    def predict(self, input, incremental=True, series=None, number_steps_predict=None):
+        # number_steps_predict defaults to the horizon the model was built for
+        if number_steps_predict is None:
+            number_steps_predict = self.number_steps_predict
+
+        if self.direct_head is not None:
+            # one pass, a head trained for a longer horizon also serves the shorter ones
+            assert number_steps_predict <= self.direct_head.out_channels, \
+                'Direct head trained for {} steps'.format(self.direct_head.out_channels)
+            return self.forward(input, series)[:, -1, :number_steps_predict]
+
+        if incremental:
+            return self.generate(input, series, number_steps_predict)
+
         res = input
-        for _ in range(self.number_steps_predict):
+        for _ in range(number_steps_predict):
             x = res[:, -self.receptive_field:, :]
-            y = self.forward(x)
+            y = self.forward(x, series)
             i = y.permute(0, 2, 1)
             del y
             res = torch.cat((res, i[:, -1:, :]), dim=1)
-        return res[:, -self.number_steps_predict:, 0]
+        return res[:, -number_steps_predict:, 0]
+
+    def generate(self, input, series=None, number_steps_predict=None):
+        """
+        Fast WaveNet generation. The history is encoded once, keeping for each layer
+        a FIFO queue with its last dilation inputs. Every new step then only runs
+        each layer on a single timestep, paired with the input dilation steps back.
+        Same outputs as re-running forward over the receptive field.
+
+        """
+
+        output, queues = self.encode_queues(input, series)
+
+        # Kernel size 2 convolutions on [h(t - d), h(t)] as one matrix product
+        weights = [(s.weight.permute(0, 2, 1).reshape(s.out_channels, -1), s.bias,
+                    t.weight.permute(0, 2, 1).reshape(t.out_channels, -1), t.bias)
+                   for s, t in zip(self.conv_sigmoid, self.conv_tanh)]
+
+        if number_steps_predict is None:
+            number_steps_predict = self.number_steps_predict
+
+        predictions = [output]
+        for step in range(1, number_steps_predict):
+            output = self.generate_step(output, queues, weights, step - 1, series)
+            predictions.append(output)
+
+        return torch.cat(predictions, dim=1)
+
+    def encode_queues(self, input, series=None):
+        output = self.from_input(input.permute(0, 2, 1))
+
+        queues = []
+        skip = 0
+        for d, s, t, skip_scale, residue_scale in zip(self.dilations, self.conv_sigmoid, self.conv_tanh,
+                                                      self.skip_scale, self.residue_scale):
+            # Inputs of the last d timesteps as (d, batch, channels), the oldest is used by the next step
+            queues.append(output[:, :, -d:].permute(2, 0, 1).contiguous())
+            output, layer_skip = self.residue_forward(output, s, t, skip_scale, residue_scale)
+            skip = skip + layer_skip[:, :, -1:]
+
+        return self.postprocess(skip, series)[:, :, 0], queues
+
+    def generate_step(self, input, queues, weights, step, series=None):
+        output = self.pointwise(self.from_input, input)
+
+        skip = 0
+        for d, queue, (weight_sigmoid, bias_sigmoid, weight_tanh, bias_tanh), skip_scale, residue_scale in zip(
+                self.dilations, queues, weights, self.skip_scale, self.residue_scale):
+            position = step % d
+            pair = torch.cat((queue[position], output), dim=1)
+            queue[position] = output
+
+            gated = torch.sigmoid(F.linear(pair, weight_sigmoid, bias_sigmoid)) * \
+                torch.tanh(F.linear(pair, weight_tanh, bias_tanh))
+            skip = skip + self.pointwise(skip_scale, gated)
+            output = self.pointwise(residue_scale, gated) + output
+
+        output = self.pointwise(self.conv_post_1, F.elu(self.condition(skip, series)))
+        return self.pointwise(self.conv_post_2, F.elu(output))
+
+    @staticmethod
+    def pointwise(conv, input):
+        # kernel size 1 convolution on a single timestep with shape (batch, channels)
+        return F.linear(input, conv.weight[:, :, 0], conv.bias)
 
 
 class WaveNetContinuosTrainer(Trainer):
@@ -131,6 +227,8 @@ class WaveNetContinuosTrainer(Trainer):
                  validation_date=None,
                  test_date=None,
                  load_model_name=None,
+                 use_direct_head=False,
+                 use_series_embedding=False,
                  **kwargs):
 
         """
@@ -183,6 +281,14 @@ class WaveNetContinuosTrainer(Trainer):
         test_date : int or datetime
             Test split
 
+        use_direct_head : boolean, default : False
+            If True the model predicts all number_steps_predict steps in one forward pass.
+            Can then predict any shorter horizon with the same model
+
+        use_series_embedding : boolean, default : False
+            If True the model learns an embedding per series of a panel dataset and
+            conditions its forecasts on the series of each window. Panel datasets only
+
         kwargs : **
         """
 
@@ -208,6 +314,10 @@ class WaveNetContinuosTrainer(Trainer):
         self.validation_date = validation_date
         self.test_date = test_date
         self.load_model_name = load_model_name
+        self.use_direct_head = use_direct_head
+        self.use_series_embedding = use_series_embedding
+
+        assert not use_series_embedding or self.panel, 'Series embeddings are only available for panel datasets'
 
         self.train_generator = None
         self .validation_generator = None
@@ -224,7 +334,9 @@ class WaveNetContinuosTrainer(Trainer):
                                                self.n_residue,
                                                self.n_skip,
                                                self.dilation_depth,
-                                               self.n_repeat)
+                                               self.n_repeat,
+                                               self.use_direct_head,
+                                               self.datareader.number_series if self.use_series_embedding else None)
 
             self.number_steps_train = self.model.calculate_receptive_field(self.number_steps_predict)
 
@@ -239,7 +351,9 @@ class WaveNetContinuosTrainer(Trainer):
                             'num_epoch',
                             'target_column',
                             'validation_date',
-                            'test_date']
+                            'test_date',
+                            'use_direct_head',
+                            'use_series_embedding']
 
             metadata_value = [self.n_residue,
                               self.n_skip,
@@ -252,7 +366,9 @@ class WaveNetContinuosTrainer(Trainer):
                               self.num_epoch,
                               self.target_column,
                               self.validation_date,
-                              self.test_date]
+                              self.test_date,
+                              self.use_direct_head,
+                              self.use_series_embedding]
 
             metadata_dict = {}
             for i in range(len(metadata_key)):
@@ -294,6 +410,8 @@ class WaveNetContinuosTrainer(Trainer):
         if type(m) in [nn.Linear, nn.Conv1d]:
             torch.nn.init.xavier_uniform(m.weight)
             m.bias.data.fill_(0.00)
+        if type(m) == SeriesEmbedding:
+            m.reset_parameters()
 
     def prepare_datareader(self):
         # prepare datareader
@@ -307,16 +425,29 @@ class WaveNetContinuosTrainer(Trainer):
         # Initialize train generator
         self.train_generator = self.datareader.generator_train(self.batch_size,
                                                                self.target_column,
-                                                               allow_smaller_batch=True)
+                                                               allow_smaller_batch=True,
+                                                               reuse_buffer=True,
+                                                               num_workers=self.num_workers,
+                                                               worker_type=self.worker_type,
+                                                               pin_memory=self.use_cuda,
+                                                               return_series=self.panel,
+                                                               device=self.device if self.device_dataset else None)
 
         # Initialize validation and test generator
         if self.validation_date is not None:
             self.validation_generator = self.datareader.generator_validation(self.batch_size,
-                                                                             self.target_column)
+                                                                             self.target_column,
+                                                                             reuse_buffer=True,
+                                                                             num_workers=self.num_workers,
+                                                                             worker_type=self.worker_type,
+                                                                             pin_memory=self.use_cuda,
+                                                                             return_series=self.panel,
+                                                                             device=self.device if self.device_dataset else None)
 
         if self.test_date is not None:
             self.test_generator = self.datareader.generator_test(self.batch_size,
-                                                                 self.target_column)
+                                                                 self.target_column,
+                                                                 return_series=self.panel)
 
     def prepare_datareader_cv(self, cv_train, cv_val):
         # prepare datareader
@@ -329,52 +460,68 @@ class WaveNetContinuosTrainer(Trainer):
         # Initialize train generator
         self.train_generator = self.datareader.generator_train(self.batch_size,
                                                                self.target_column,
-                                                               allow_smaller_batch=True)
+                                                               allow_smaller_batch=True,
+                                                               reuse_buffer=True,
+                                                               num_workers=self.num_workers,
+                                                               worker_type=self.worker_type,
+                                                               pin_memory=self.use_cuda,
+                                                               return_series=self.panel,
+                                                               device=self.device if self.device_dataset else None)
 
         if self.validation_date is not None:
             self.validation_generator = self.datareader.generator_validation(self.batch_size,
-                                                                             self.target_column)
+                                                                             self.target_column,
+                                                                             reuse_buffer=True,
+                                                                             num_workers=self.num_workers,
+                                                                             worker_type=self.worker_type,
+                                                                             pin_memory=self.use_cuda,
+                                                                             return_series=self.panel,
+                                                                             device=self.device if self.device_dataset else None)
 
     def training_step(self):
 
         self.model_optimizer.zero_grad()
         loss = 0
-        X, Y = next(self.train_generator)
+        X, Y, series = self.next_batch(self.train_generator)
         length = X.shape[0]
-        Y = np.concatenate((X[:, 1:, 0], np.expand_dims(Y[:, 0], axis=1)), axis=1)
-        Y = Y[:, -self.number_steps_predict:]
-        X = Variable(torch.from_numpy(X)).float().cuda()
-        Y = Variable(torch.from_numpy(Y)).float()
 
-        results = self.model(X)
+        with self.autocast():
+            results = self.model(X, series)
 
-        loss = self.criterion(results, Y.unsqueeze(2).cuda())
+            if self.use_direct_head:
+                loss = self.criterion(results, self.direct_targets(X, Y)[:, -results.shape[1]:])
+            else:
+                Y = torch.cat((X[:, 1:, 0], Y[:, :1]), dim=1)
+                Y = Y[:, -self.number_steps_predict:]
+                loss = self.criterion(results, Y.unsqueeze(2))
 
         loss.backward()
         self.model_optimizer.step()
 
-        return loss.data[0], loss.data[0] * length
+        return loss.detach(), loss.detach() * length
 
     def evaluation_step(self):
 
-        X, Y = next(self.validation_generator)
+        X, Y, series = self.next_batch(self.validation_generator)
         length = X.shape[0]
-        Y = np.concatenate((X[:, 1:, 0], np.expand_dims(Y[:, 0], axis=1)), axis=1)
-        Y = Y[:, -self.number_steps_predict:]
-        X = Variable(torch.from_numpy(X), requires_grad=False, volatile=True).float().cuda()
-        Y = Variable(torch.from_numpy(Y), requires_grad=False, volatile=True).float().cuda()
 
-        results = self.model(X)
+        with torch.no_grad(), self.autocast():
+            results = self.model(X, series)
 
-        valid_loss = self.criterion(results, Y.unsqueeze(2))
+            if self.use_direct_head:
+                valid_loss = self.criterion(results, self.direct_targets(X, Y)[:, -results.shape[1]:])
+            else:
+                Y = torch.cat((X[:, 1:, 0], Y[:, :1]), dim=1)
+                Y = Y[:, -self.number_steps_predict:]
+                valid_loss = self.criterion(results, Y.unsqueeze(2))
 
-        return valid_loss.data[0], valid_loss.data[0] * length
+        return valid_loss.detach(), valid_loss.detach() * length
 
-    def prediction_step(self):
+    def prediction_step(self, number_steps_predict=None):
 
-        X, Y = next(self.test_generator)
-        X = Variable(torch.from_numpy(X), requires_grad=False, volatile=True).float().cuda()
+        X, Y, series = self.next_batch(self.test_generator)
 
-        results = self.model.predict(X)
+        with torch.no_grad(), self.autocast():
+            results = self.model.predict(X, series=series, number_steps_predict=number_steps_predict)
 
-        return results, Y
\ No newline at end of file
+        return results, Y, series
\ No newline at end of file
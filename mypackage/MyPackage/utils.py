@@ -9,6 +9,8 @@ from statsmodels.tsa.stattools  import adfuller, pacf
 def mean_predictions(predicted):
     """
     Calculate the mean of predictions that overlaps. This is donne mostly to be able to plot what the model is doing.
+    Row i predicts the steps i to i + predictions length - 1, so every step is the mean of an anti-diagonal,
+    computed with bincount over the flattened step offsets.
     -------------------------------------------------------
     Args:
         predicted : numpy array
@@ -16,22 +18,19 @@ def mean_predictions(predicted):
 
     -------------------------------------------------------
     return:
-        predictions_mean : list
-            list with len of number to predict where each position is the mean of all predictions to that step
+        predictions_mean : numpy array
+            Array with len of number to predict where each position is the mean of all predictions to that step.
+            Older versions returned a list with the same values
     """
 
-    array_global = [[] for _ in range((predicted.shape[0] + predicted.shape[1]))]
+    predicted = np.asarray(predicted, dtype='float64')
+    number_predictions, horizon = predicted.shape
 
-    for i in range(predicted.shape[0]):
-        for l, value in enumerate(predicted[i]):
-            array_global[i + l].append((float(value)))
+    steps = (np.arange(number_predictions)[:, None] + np.arange(horizon)).ravel()
+    sums = np.bincount(steps, weights=predicted.ravel())
+    counts = np.bincount(steps)
 
-    predictions_mean = []
-
-    for i in range(len(array_global) - 1):
-        predictions_mean.append(np.array(array_global[i]).mean())
-
-    return predictions_mean
+    return sums / counts
 
 
 def differentiate_timeseries(timeseries, diff_lag=1):
@@ -7,4 +7,5 @@ setup(name='MyPackage',
       license='MIT',
       packages=find_packages(),
       include_package_data=True,
+      extras_require={'cuda': ['cupy', 'pynvrtc']},
       zip_safe=False)
\ No newline at end of file
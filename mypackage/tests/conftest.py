@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def series_frame(periods=1200, seed=0):
+    rng = np.random.RandomState(seed)
+    index = pd.date_range('2014-01-01', periods=periods, freq='D', name='Date')
+    power = np.sin(np.arange(periods) / 20.) + 0.1 * rng.randn(periods)
+    wind = np.cos(np.arange(periods) / 30.) + 0.1 * rng.randn(periods)
+    return pd.DataFrame({'Power': power, 'Wind': wind}, index=index)
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    # Daily series from 2014 to 2017, splits at 2015-01-01 and 2016-01-01
+    path = str(tmp_path / 'series.csv')
+    series_frame().to_csv(path)
+    return path
+
+
+@pytest.fixture
+def wide_csv_path(tmp_path):
+    # Two series in columns x and y, stacked by the wide panel mode
+    frame = series_frame()
+    frame.columns = ['x', 'y']
+    frame['y'] = 10 * frame['y'] + 5
+    path = str(tmp_path / 'wide.csv')
+    frame.to_csv(path)
+    return path
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / 'cache')
+
+
+@pytest.fixture
+def trainer_kwargs(tmp_path, csv_path):
+    # Common trainer arguments, univariate on the Power column
+    return dict(data_path=csv_path,
+                logger_path=str(tmp_path / 'logs') + '/',
+                model_name='test',
+                lr=0.001,
+                batch_size=64,
+                num_epoch=1,
+                target_column='Power',
+                validation_date='2015-01-01',
+                test_date='2016-01-01',
+                train_log_interval=10,
+                valid_log_interval=10,
+                index_col=['Date'],
+                parse_dates=True,
+                usecols=['Date', 'Power'])
@@ -0,0 +1,51 @@
+import torch
+
+from MyPackage.models.EncoderDecoder.Model import Attn
+
+
+def concat_attention(attention, hidden, encoder_outputs):
+    # Reference weights, self.attn over the concatenated hidden state and encoder outputs
+    H = hidden.unsqueeze(1).repeat(1, encoder_outputs.size(1), 1)
+    energy = torch.tanh(attention.attn(torch.cat([H, encoder_outputs], 2)))
+    score = torch.bmm(attention.v.repeat(encoder_outputs.size(0), 1).unsqueeze(1), energy.transpose(2, 1))
+    return torch.softmax(score.squeeze(1), dim=1).unsqueeze(1)
+
+
+def test_split_projections_match_concatenation():
+    torch.manual_seed(0)
+    attention = Attn('concat', 6)
+    hidden, encoder_outputs = torch.randn(4, 6), torch.randn(4, 9, 6)
+
+    weights = attention(hidden, encoder_outputs)
+
+    assert weights.shape == (4, 1, 9)
+    torch.testing.assert_close(weights, concat_attention(attention, hidden, encoder_outputs))
+    torch.testing.assert_close(weights.sum(dim=2), torch.ones(4, 1))
+
+
+def test_projection_reused_across_steps():
+    torch.manual_seed(0)
+    attention = Attn('concat', 6)
+    encoder_outputs = torch.randn(4, 9, 6)
+    projected = attention.project(encoder_outputs)
+
+    for _ in range(3):
+        hidden = torch.randn(4, 6)
+        torch.testing.assert_close(attention(hidden, encoder_outputs, projected),
+                                   concat_attention(attention, hidden, encoder_outputs))
+
+
+def test_gradients_match_concatenation():
+    torch.manual_seed(0)
+    attention = Attn('concat', 6)
+    hidden, encoder_outputs = torch.randn(4, 6), torch.randn(4, 9, 6)
+    target = torch.randn(4, 1, 9)
+
+    gradients = []
+    for function in [attention, lambda h, e: concat_attention(attention, h, e)]:
+        attention.zero_grad()
+        ((function(hidden, encoder_outputs) - target) ** 2).sum().backward()
+        gradients.append([parameter.grad.clone() for parameter in attention.parameters()])
+
+    for gradient, target_gradient in zip(*gradients):
+        torch.testing.assert_close(gradient, target_gradient)
@@ -0,0 +1,121 @@
+import threading
+
+import numpy as np
+import pytest
+import torch
+
+from MyPackage.BatchPrefetcher import BatchPrefetcher
+from MyPackage.WindowDataset import WindowDataset
+
+
+BATCH_SIZE = 8
+
+
+def make_dataset(series=False):
+    rng = np.random.RandomState(0)
+    data = rng.randn(200, 2).astype('float32')
+    ids = np.repeat(np.arange(2), 100) if series else None
+    return WindowDataset(data, data[:, 0], 10, 3, series=ids)
+
+
+def make_positions(number_batches=12):
+    rng = np.random.RandomState(1)
+    return [rng.randint(0, 187, BATCH_SIZE) for _ in range(number_batches)]
+
+
+def expected(dataset, positions):
+    return [dataset.gather(batch_positions) for batch_positions in positions]
+
+
+def check_batches(prefetcher, dataset, positions):
+    # Compare each batch before asking for the next one, reused buffers are only valid until then
+    for target in expected(dataset, positions):
+        batch = next(prefetcher)
+        assert len(batch) == len(target)
+        for value, target_value in zip(batch, target):
+            np.testing.assert_array_equal(value, target_value)
+
+
+@pytest.mark.parametrize('worker_type', ['thread', 'process'])
+@pytest.mark.parametrize('reuse_buffer', [False, True])
+@pytest.mark.parametrize('series', [False, True])
+def test_batches_in_order(worker_type, reuse_buffer, series):
+    dataset = make_dataset(series)
+    positions = make_positions()
+
+    # One extra batch of positions, the prefetcher always keeps max_prefetch submitted
+    prefetcher = BatchPrefetcher(dataset, iter(positions + make_positions(4)), BATCH_SIZE, num_workers=2,
+                                 worker_type=worker_type, reuse_buffer=reuse_buffer)
+    try:
+        check_batches(prefetcher, dataset, positions)
+    finally:
+        prefetcher.close()
+
+
+def test_invalid_worker_type():
+    with pytest.raises(AssertionError):
+        BatchPrefetcher(make_dataset(), iter(make_positions()), BATCH_SIZE, worker_type='fiber')
+
+
+class FakeEvent(object):
+    # Stands in for torch.cuda.Event, records how many batches the consumer had taken
+    consumed = 0
+    waits = []
+
+    def record(self):
+        self.mark = FakeEvent.consumed
+
+    def synchronize(self):
+        FakeEvent.waits.append(self.mark)
+
+
+@pytest.fixture
+def fake_cuda(monkeypatch):
+    # Pinned paths without a GPU, pinning is a copy and events only record the order of the calls
+    threads = []
+
+    def pin(self, array):
+        threads.append(threading.current_thread())
+        return array.copy()
+
+    FakeEvent.consumed = 0
+    FakeEvent.waits = []
+    monkeypatch.setattr(torch.cuda, 'is_available', lambda: True)
+    monkeypatch.setattr(torch.cuda, 'Event', FakeEvent)
+    monkeypatch.setattr(BatchPrefetcher, 'pin', pin)
+    return threads
+
+
+@pytest.mark.parametrize('worker_type', ['thread', 'process'])
+def test_pinned_ring_waits_for_device_copies(fake_cuda, worker_type):
+    dataset = make_dataset()
+    positions = make_positions()
+    prefetcher = BatchPrefetcher(dataset, iter(positions + make_positions(4)), BATCH_SIZE, num_workers=2,
+                                 worker_type=worker_type, pin_memory=True, reuse_buffer=True)
+    try:
+        for number, target in enumerate(expected(dataset, positions)):
+            FakeEvent.consumed = number
+            batch = next(prefetcher)
+            np.testing.assert_array_equal(batch[0], target[0])
+            np.testing.assert_array_equal(batch[1], target[1])
+
+        for future in prefetcher.queue:
+            future.result()
+    finally:
+        prefetcher.close()
+
+    # Every batch request recorded one event, waited on by the next write into the slot it released
+    assert sorted(FakeEvent.waits) == list(range(len(positions)))
+
+
+def test_process_batches_pinned_off_the_consumer(fake_cuda):
+    dataset = make_dataset()
+    positions = make_positions()
+    prefetcher = BatchPrefetcher(dataset, iter(positions + make_positions(4)), BATCH_SIZE, num_workers=2,
+                                 worker_type='process', pin_memory=True)
+    try:
+        check_batches(prefetcher, dataset, positions)
+    finally:
+        prefetcher.close()
+
+    assert fake_cuda and threading.main_thread() not in fake_cuda
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from MyPackage import DataCache, DataReader
+
+from conftest import series_frame
+
+READ_KWARGS = dict(index_col=['Date'], parse_dates=True)
+
+
+def test_round_trip(csv_path, cache_dir):
+    frame = series_frame()
+    frame['Count'] = np.arange(len(frame), dtype='int32')
+    cache = DataCache(cache_dir, csv_path, **READ_KWARGS)
+
+    assert not cache.exists()
+    assert cache.save(frame)
+    assert cache.exists()
+
+    pd.testing.assert_frame_equal(cache.load_dataframe(), frame, check_freq=False)
+
+    values, index, columns = cache.load(mmap_mode='r')
+    assert isinstance(values, np.memmap)
+    assert columns == ['Power', 'Wind', 'Count']
+    assert index.equals(frame.index)
+
+
+def test_round_trip_timezone(csv_path, cache_dir):
+    frame = series_frame(periods=50)
+    frame.index = frame.index.tz_localize('Europe/Lisbon')
+    cache = DataCache(cache_dir, csv_path)
+
+    assert cache.save(frame)
+    pd.testing.assert_frame_equal(cache.load_dataframe(), frame, check_freq=False)
+
+
+def test_chunks_round_trip(csv_path, cache_dir):
+    frame = series_frame(periods=250)
+    cache = DataCache(cache_dir, csv_path, chunked=True)
+
+    assert cache.save_chunks(frame.iloc[start:start + 64] for start in range(0, len(frame), 64))
+    pd.testing.assert_frame_equal(cache.load_dataframe(), frame, check_freq=False)
+
+
+def test_non_numeric_frames_are_not_cached(csv_path, cache_dir):
+    frame = series_frame(periods=10).assign(name='farm')
+    cache = DataCache(cache_dir, csv_path)
+
+    assert not cache.save(frame)
+    assert not cache.exists()
+
+
+def test_key_follows_file_and_loader_arguments(csv_path, cache_dir):
+    key = DataCache(cache_dir, csv_path, **READ_KWARGS).key
+
+    assert DataCache(cache_dir, csv_path, **READ_KWARGS).key == key
+    assert DataCache(cache_dir, csv_path, index_col=['Date']).key != key
+    assert DataCache(cache_dir, csv_path, chunked=True, **READ_KWARGS).key != key
+
+    # A modified source file is a new entry
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert DataCache(cache_dir, csv_path, **READ_KWARGS).key != key
+
+
+def test_reader_loads_from_the_cache(csv_path, cache_dir, monkeypatch):
+    parsed = DataReader(csv_path, cache_dir=cache_dir, **READ_KWARGS)
+
+    def read_csv(*args, **kwargs):
+        raise AssertionError('The cached file was parsed again')
+
+    monkeypatch.setattr(pd, 'read_csv', read_csv)
+    cached = DataReader(csv_path, cache_dir=cache_dir, **READ_KWARGS)
+
+    pd.testing.assert_frame_equal(cached.data, parsed.data, check_freq=False)
+
+
+def test_reader_parses_a_modified_file(csv_path, cache_dir):
+    DataReader(csv_path, cache_dir=cache_dir, **READ_KWARGS)
+
+    frame = series_frame()
+    frame['Power'] += 1
+    frame.to_csv(csv_path)
+
+    reader = DataReader(csv_path, cache_dir=cache_dir, **READ_KWARGS)
+    np.testing.assert_allclose(reader.data['Power'].values, frame['Power'].values)
+    assert len(os.listdir(cache_dir)) == 2
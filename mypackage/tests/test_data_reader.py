@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from MyPackage import DataReader
+
+READ_KWARGS = dict(index_col=['Date'], parse_dates=True)
+
+
+def test_chunked_memmap_matches_full_load(csv_path, cache_dir):
+    full = DataReader(csv_path, **READ_KWARGS)
+    chunked = DataReader(csv_path, cache_dir=cache_dir, backend='memmap', chunksize=100, **READ_KWARGS)
+
+    assert isinstance(chunked.values, np.memmap)
+    np.testing.assert_array_equal(np.asarray(chunked.values), full.values)
+    assert list(chunked.index) == list(full.index)
+    assert chunked.columns == full.columns
+
+
+def test_chunked_loading_needs_memmap(csv_path, cache_dir):
+    with pytest.raises(AssertionError, match='memmap'):
+        DataReader(csv_path, cache_dir=cache_dir, chunksize=100, **READ_KWARGS)
+
+
+def test_incremental_normalizer_matches_full_fit(csv_path):
+    reader = DataReader(csv_path, **READ_KWARGS)
+    reader.preprocessing_data(10, 3, 32, '2015-01-01', '2016-01-01', normalizer='Standardization')
+
+    chunked = reader.fit_normalizer('Standardization', reader.train_indexes, chunk_size=50)
+    train = reader.values[reader.train_indexes]
+
+    np.testing.assert_allclose(chunked.mean_, train.mean(axis=0))
+    np.testing.assert_allclose(chunked.scale_, train.std(axis=0))
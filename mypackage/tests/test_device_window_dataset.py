@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+import torch
+
+from MyPackage import DataReader, DeviceWindowDataset, WindowDataset
+
+
+@pytest.mark.parametrize('series', [False, True])
+def test_gather_matches_window_dataset(series):
+    rng = np.random.RandomState(0)
+    data = rng.randn(100, 3)
+    ids = np.repeat(np.arange(2), 50) if series else None
+    positions = np.array([0, 5, 17, 60, 86])
+
+    device_dataset = DeviceWindowDataset(data, data[:, 1], 10, 3, 'cpu', series=ids)
+    dataset = WindowDataset(data, data[:, 1], 10, 3, series=ids)
+
+    assert len(device_dataset) == len(dataset)
+    for value, target in zip(device_dataset.gather(positions), dataset.gather(positions)):
+        assert isinstance(value, torch.Tensor)
+        np.testing.assert_array_equal(value.numpy(), target)
+
+    # Tensor positions gather the same windows
+    for value, target in zip(device_dataset.gather(torch.from_numpy(positions)), dataset.gather(positions)):
+        np.testing.assert_array_equal(value.numpy(), target)
+
+
+def test_device_generator_matches_host_generator(csv_path):
+    reader = DataReader(csv_path, index_col=['Date'], parse_dates=True)
+    reader.preprocessing_data(10, 3, 32, '2015-01-01', '2016-01-01', normalizer='Standardization')
+
+    host = reader.generator_validation(32, 'Power')
+    device = reader.generator_validation(32, 'Power', device='cpu')
+
+    for _ in range(reader.validation_steps + 1):
+        for value, target in zip(next(device), next(host)):
+            assert isinstance(value, torch.Tensor) and value.device.type == 'cpu'
+            np.testing.assert_array_equal(value.numpy(), target)
+
+    # Uploaded once and shared by the generators
+    next(reader.generator_train(32, 'Power', device='cpu'))
+    assert sorted(map(str, reader.window_datasets)) == ["('Power', True, False, 'cpu')",
+                                                        "('Power', True, False, False)"]
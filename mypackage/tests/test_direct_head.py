@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+import torch
+
+from MyPackage.models import RNNTrainer, EncoderDecoderTrainer, WaveNetContinuosTrainer
+from MyPackage.models.RNN.Model import RNNModel
+
+
+def make_trainer(kind, trainer_kwargs, number_steps_predict=8, use_direct_head=True):
+    torch.manual_seed(0)
+    if kind == 'rnn':
+        return RNNTrainer(number_steps_train=16, number_steps_predict=number_steps_predict, hidden_size=4,
+                          num_layers=1, cell_type='GRU', use_direct_head=use_direct_head, **trainer_kwargs)
+    if kind == 'ed':
+        return EncoderDecoderTrainer(number_steps_train=16, number_steps_predict=number_steps_predict,
+                                     hidden_size_encoder=4, hidden_size_decoder=4, num_layers=1,
+                                     cell_type_encoder='GRU', cell_type_decoder='GRU', use_attention=False,
+                                     use_direct_head=use_direct_head, **trainer_kwargs)
+    return WaveNetContinuosTrainer(n_residue=4, n_skip=4, dilation_depth=3, n_repeat=1,
+                                   number_steps_predict=number_steps_predict, use_direct_head=use_direct_head,
+                                   **trainer_kwargs)
+
+
+@pytest.mark.parametrize('kind', ['rnn', 'ed', 'wn'])
+def test_direct_head_serves_shorter_horizons(kind, trainer_kwargs):
+    trainer = make_trainer(kind, trainer_kwargs)
+
+    predictions, labels = trainer.predict()
+    short_predictions, short_labels = trainer.predict(number_steps_predict=3)
+
+    assert predictions.shape[1] == 8 and short_predictions.shape[1] == 3
+    assert short_labels.shape == short_predictions.shape
+    # The same windows start the test set, the short horizon is a prefix of the long one
+    np.testing.assert_allclose(short_predictions[:len(predictions)], predictions[:, :3], rtol=1e-5, atol=1e-6)
+    # The trainer keeps its horizon, postprocess uses the windows of the last prediction
+    assert trainer.number_steps_predict == 8 and trainer.model.number_steps_predict == 8
+    results, mse, mae = trainer.postprocess(short_predictions, short_labels)
+    assert len(results) == len(trainer.datareader.test_indexes) - 1
+
+
+@pytest.mark.parametrize('kind', ['rnn', 'ed', 'wn'])
+def test_direct_head_rejects_longer_horizons(kind, trainer_kwargs):
+    trainer = make_trainer(kind, trainer_kwargs)
+
+    with pytest.raises(AssertionError, match='Direct head trained for 8 steps'):
+        trainer.predict(number_steps_predict=9)
+
+
+@pytest.mark.parametrize('cell_type', ['GRU', 'QRNN', 'TCN'])
+def test_autoregressive_horizon_is_a_prefix(cell_type):
+    torch.manual_seed(0)
+    model = RNNModel(1, 1, 6, kernel_size=2, num_layers=2, hidden_size=4, cell_type=cell_type).eval()
+    x = torch.randn(3, 20, 1)
+
+    with torch.no_grad():
+        torch.testing.assert_close(model.predict(x, number_steps_predict=3), model.predict(x)[:, :3])
@@ -0,0 +1,64 @@
+import json
+import os
+
+import numpy as np
+
+from MyPackage import FileLogger
+from MyPackage.FileLogger import LOG_DTYPE
+
+
+def make_logger(tmp_path, flush_every=4):
+    logger = FileLogger(str(tmp_path), 'run', None, True, flush_every=flush_every)
+    logger.start()
+    return logger
+
+
+def test_binary_log_read_back(tmp_path):
+    logger = make_logger(tmp_path)
+
+    for step in range(10):
+        logger.write_train(1, step, step // 5, step % 5, step / 10.)
+        logger.write_valid(2, step, step // 5, step % 5, -step / 10.)
+
+    # Full buffers are on disk, the rest waits for a flush
+    assert os.path.getsize(logger.path + '/train_log.bin') == 8 * LOG_DTYPE.itemsize
+
+    train = logger.read_files('train_log')
+    valid = logger.read_files('valid_log.txt')
+
+    assert list(train.columns) == list(LOG_DTYPE.names)
+    np.testing.assert_array_equal(train['Step'], np.arange(10))
+    np.testing.assert_array_equal(train['Epoch_Number'], np.arange(10) // 5)
+    np.testing.assert_array_equal(train['Batch_number'], np.arange(10) % 5)
+    np.testing.assert_allclose(train['Loss'], np.arange(10) / 10.)
+    assert np.all(np.diff(train['Timestamp']) >= 0)
+
+    # Only batches on the log interval are written
+    np.testing.assert_array_equal(valid['Batch_number'] % 2, 0)
+    assert len(valid) == 6
+
+
+def test_start_opens_new_logs(tmp_path):
+    logger = make_logger(tmp_path)
+    logger.write_train(1, 0, 0, 0, 1.)
+
+    logger.start('Fold_Number1')
+    logger.write_train(1, 0, 0, 0, 2.)
+    logger.flush()
+
+    # The pending record of the first run went to the first run's log
+    np.testing.assert_array_equal(np.fromfile(str(tmp_path / 'run' / 'train_log.bin'), dtype=LOG_DTYPE)['Loss'], [1.])
+    np.testing.assert_array_equal(logger.read_files('train_log')['Loss'], [2.])
+    assert os.path.getsize(logger.path + '/valid_log.bin') == 0
+
+
+def test_reads_json_logs(tmp_path):
+    logger = make_logger(tmp_path)
+    os.remove(logger.path + '/test_log.bin')
+    with open(logger.path + '/test_log.txt', 'w') as file:
+        json.dump({'Step': [0, 1], 'Loss': [0.5, 0.25]}, file)
+
+    test = logger.read_files('test_log')
+
+    np.testing.assert_array_equal(test['Step'], [0, 1])
+    np.testing.assert_allclose(test['Loss'], [0.5, 0.25])
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from MyPackage import DataReader
+
+READ_KWARGS = dict(index_col=['Date'], parse_dates=True)
+LOOK_BACK, LOOK_FURTHER, BATCH_SIZE = 10, 3, 30
+
+
+def baseline_batches(data, target, positions, allow_smaller_batch=True):
+    # One epoch as the original generators built it, one DataFrame slice per window
+    batches = []
+    for start in range(0, len(positions), BATCH_SIZE):
+        batch_positions = positions[start:start + BATCH_SIZE]
+        if len(batch_positions) < BATCH_SIZE and not allow_smaller_batch:
+            break
+        batches.append((np.array([data.iloc[p:p + LOOK_BACK].values for p in batch_positions], dtype='float32'),
+                        np.array([data[target].iloc[p + LOOK_BACK:p + LOOK_BACK + LOOK_FURTHER].values
+                                  for p in batch_positions], dtype='float32')))
+    return batches
+
+
+def check_epochs(generator, batches, epochs=2):
+    for _ in range(epochs):
+        for batch_x, batch_y in batches:
+            value_x, value_y = next(generator)
+            np.testing.assert_array_equal(value_x, batch_x)
+            np.testing.assert_array_equal(value_y, batch_y)
+
+
+@pytest.fixture
+def reader(csv_path):
+    reader = DataReader(csv_path, **READ_KWARGS)
+    reader.preprocessing_data(LOOK_BACK, LOOK_FURTHER, BATCH_SIZE, '2015-01-01', '2016-01-01')
+    return reader
+
+
+@pytest.mark.parametrize('allow_smaller_batch', [True, False])
+def test_train_generator_matches_baseline(reader, csv_path, allow_smaller_batch):
+    data = pd.read_csv(csv_path, **READ_KWARGS)
+    positions = reader.train_indexes[:-LOOK_BACK - LOOK_FURTHER]
+    batches = baseline_batches(data, 'Power', positions, allow_smaller_batch)
+
+    assert len(positions) % BATCH_SIZE != 0
+    check_epochs(reader.generator_train(BATCH_SIZE, 'Power', shuffle=False, normalize=False,
+                                        allow_smaller_batch=allow_smaller_batch), batches)
+
+
+def test_validation_generator_matches_baseline(reader, csv_path):
+    data = pd.read_csv(csv_path, **READ_KWARGS)
+    positions = reader.validation_indexes[:-LOOK_FURTHER] - LOOK_BACK
+
+    check_epochs(reader.generator_validation(BATCH_SIZE, 'Power', normalize=False),
+                 baseline_batches(data, 'Power', positions))
+
+
+def test_shuffled_epoch_holds_every_window(reader):
+    positions = reader.train_indexes[:-LOOK_BACK - LOOK_FURTHER]
+    generator = reader.generator_train(BATCH_SIZE, 'Power', shuffle=True, normalize=False)
+
+    labels = np.concatenate([next(generator)[1] for _ in range(int(np.ceil(len(positions) / BATCH_SIZE)))])
+
+    # The first label of every window, each window exactly once
+    np.testing.assert_array_equal(np.sort(labels[:, 0]),
+                                  np.sort(reader.values[positions + LOOK_BACK, 0].astype('float32')))
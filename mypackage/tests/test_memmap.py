@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pytest
+
+from MyPackage import DataReader
+
+READ_KWARGS = dict(index_col=['Date'], parse_dates=True)
+
+
+def preprocessed(reader):
+    reader.preprocessing_data(10, 3, 32, '2015-01-01', '2016-01-01', normalizer='Standardization')
+    return reader
+
+
+def test_memmap_matches_pandas(csv_path, cache_dir):
+    full = DataReader(csv_path, **READ_KWARGS)
+    mapped = DataReader(csv_path, cache_dir=cache_dir, backend='memmap', **READ_KWARGS)
+
+    assert mapped.data is None
+    assert isinstance(mapped.values, np.memmap)
+    np.testing.assert_array_equal(np.asarray(mapped.values), full.values)
+    assert mapped.index.equals(full.index)
+    assert mapped.columns == full.columns
+
+    rows = np.array([3, 4, 5, 40])
+    assert mapped.frame(rows).equals(full.frame(rows))
+
+
+def test_memmap_batches_match_pandas(csv_path, cache_dir):
+    full = preprocessed(DataReader(csv_path, **READ_KWARGS))
+    mapped = preprocessed(DataReader(csv_path, cache_dir=cache_dir, backend='memmap', **READ_KWARGS))
+
+    for name in ['train_indexes', 'validation_indexes', 'test_indexes']:
+        np.testing.assert_array_equal(getattr(mapped, name), getattr(full, name))
+
+    for generator in ['generator_train', 'generator_validation', 'generator_test']:
+        kwargs = {'shuffle': False} if generator == 'generator_train' else {}
+        for target, value in zip(next(getattr(full, generator)(32, 'Power', **kwargs)),
+                                 next(getattr(mapped, generator)(32, 'Power', **kwargs))):
+            np.testing.assert_allclose(value, target, rtol=1e-6)
+
+
+def test_normalized_data_is_mapped_and_reused(csv_path, cache_dir):
+    mapped = preprocessed(DataReader(csv_path, cache_dir=cache_dir, backend='memmap', **READ_KWARGS))
+    data = mapped.normalized_data()
+
+    assert isinstance(data, np.memmap)
+    assert os.path.dirname(data.filename).startswith(mapped.cache.path)
+
+    # A new reader with the same normalizer maps the same file
+    again = preprocessed(DataReader(csv_path, cache_dir=cache_dir, backend='memmap', **READ_KWARGS))
+    assert again.normalized_data().filename == data.filename
+
+
+def test_memmap_needs_cache_dir(csv_path):
+    with pytest.raises(AssertionError, match='cache_dir'):
+        DataReader(csv_path, backend='memmap', **READ_KWARGS)
@@ -0,0 +1,50 @@
+import pytest
+import torch
+
+from MyPackage.models import RNNTrainer
+
+
+def make_trainer(trainer_kwargs):
+    torch.manual_seed(0)
+    return RNNTrainer(number_steps_train=16, number_steps_predict=4, hidden_size=4, num_layers=1,
+                      cell_type='GRU', mixed_precision=True, **trainer_kwargs)
+
+
+@pytest.fixture
+def checks(monkeypatch):
+    # Validation losses 1.0 in float32 and drift in bfloat16, and the precision of every fit
+    calls = {'drift': 0.0, 'validation': [], 'fit': []}
+
+    def validation_loss(self):
+        calls['validation'].append(self.mixed_precision)
+        return 1.0 + (calls['drift'] if self.mixed_precision else 0.0)
+
+    def fit(self, patience, leave=True, callback=None):
+        calls['fit'].append(self.mixed_precision)
+        return 1.0, False
+
+    monkeypatch.setattr(RNNTrainer, 'validation_loss', validation_loss)
+    monkeypatch.setattr(RNNTrainer, 'fit', fit)
+    return calls
+
+
+@pytest.mark.parametrize('drift, mixed_precision', [(0.01, True), (0.5, False)])
+def test_checked_once_before_training(checks, trainer_kwargs, drift, mixed_precision):
+    checks['drift'] = drift
+    trainer = make_trainer(trainer_kwargs)
+    trainer.train(patience=3)
+
+    # Both precisions evaluated before fit, which runs in float32 when bfloat16 drifts
+    assert checks['validation'] == [True, False]
+    assert checks['fit'] == [mixed_precision]
+    assert trainer.mixed_precision is mixed_precision
+
+
+@pytest.mark.parametrize('drift, mixed_precision', [(0.01, True), (0.5, False)])
+def test_checked_once_for_all_folds(checks, trainer_kwargs, drift, mixed_precision):
+    checks['drift'] = drift
+    trainer = make_trainer(trainer_kwargs)
+    trainer.train_cv(number_splits=3, days=100, patience=3)
+
+    assert checks['validation'] == [True, False]
+    assert checks['fit'] == [mixed_precision] * 3
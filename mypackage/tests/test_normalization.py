@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from MyPackage import DataReader
+
+READ_KWARGS = dict(index_col=['Date'], parse_dates=True)
+
+
+def preprocessed(csv_path, normalizer='Standardization'):
+    reader = DataReader(csv_path, **READ_KWARGS)
+    reader.preprocessing_data(10, 3, 32, '2015-01-01', '2016-01-01', normalizer=normalizer)
+    return reader
+
+
+@pytest.mark.parametrize('normalizer', ['Standardization', 'MixMaxScaler'])
+def test_normalized_once_like_the_transform(csv_path, normalizer):
+    reader = preprocessed(csv_path, normalizer)
+    data = reader.normalized_data()
+
+    assert data.dtype == np.float32
+    np.testing.assert_allclose(data, reader.normalizer.transform(reader.values), rtol=1e-5, atol=1e-6)
+    np.testing.assert_array_equal(reader.normalized_data(normalize=False), reader.values.astype('float32'))
+    # Computed once per preprocessing
+    assert reader.normalized_data() is data
+
+
+def test_generators_share_the_normalized_data(csv_path):
+    reader = preprocessed(csv_path)
+    data = reader.normalized_data()
+
+    next(reader.generator_train(32, 'Power'))
+    next(reader.generator_test(32, 'Power'))
+
+    assert len(reader.window_datasets) == 1
+    assert np.shares_memory(reader.window_dataset('Power').data, data)
+
+
+def test_preprocessing_renormalizes(csv_path):
+    reader = preprocessed(csv_path)
+    data = reader.normalized_data()
+
+    reader.preprocessing_data(10, 3, 32, '2015-06-01', '2016-01-01', normalizer='Standardization')
+
+    assert reader.normalized_data() is not data
+    np.testing.assert_allclose(reader.normalized_data(), reader.normalizer.transform(reader.values),
+                               rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize('normalizer', ['Standardization', 'MixMaxScaler'])
+def test_target_round_trip(csv_path, normalizer):
+    reader = preprocessed(csv_path, normalizer)
+    values = reader.values[:20, 0]
+
+    normalized = reader.normalize_target(values, 'Power')
+
+    np.testing.assert_allclose(normalized, reader.normalized_data()[:20, 0], rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(reader.denormalize_target(normalized, 'Power'), values)
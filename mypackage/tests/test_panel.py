@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from MyPackage import DataReader
+from MyPackage.models import RNNTrainer
+
+from conftest import series_frame
+
+READ_KWARGS = dict(index_col=['Date'], parse_dates=True)
+
+
+@pytest.fixture
+def long_csv_path(tmp_path):
+    # The wide panel as a long one, rows of both series interleaved
+    frame = series_frame()
+    long = pd.concat([pd.DataFrame({'farm': 'b', 'value': frame['Wind']}),
+                      pd.DataFrame({'farm': 'a', 'value': frame['Power']})]).sort_index(kind='stable')
+    path = str(tmp_path / 'long.csv')
+    long.to_csv(path)
+    return path
+
+
+def test_long_and_wide_panels_match(wide_csv_path, long_csv_path):
+    wide = DataReader(wide_csv_path, panel='wide', **READ_KWARGS)
+    long = DataReader(long_csv_path, panel='long', series_column='farm', **READ_KWARGS)
+
+    assert wide.number_series == long.number_series == 2
+    np.testing.assert_array_equal(wide.series, long.series)
+    # Each series is one block sorted by time
+    for reader in (wide, long):
+        for start, stop in reader.segments():
+            assert reader.index[start:stop].is_monotonic_increasing
+
+
+def test_windows_stay_inside_their_series(wide_csv_path):
+    reader = DataReader(wide_csv_path, panel='wide', **READ_KWARGS)
+    reader.preprocessing_data(10, 3, 32, '2015-01-01', '2016-01-01', normalizer='Standardization')
+
+    for indexes, shift in [(reader.train_indexes, 0), (reader.validation_indexes, 10), (reader.test_indexes, 10)]:
+        positions = reader.window_positions(indexes, 3 if shift else 13, shift)
+        # First and last row of every window belong to the same series
+        np.testing.assert_array_equal(reader.series[positions], reader.series[positions + 12])
+
+
+def baseline_folds(index, n_splits, days, test_date):
+    # Folds of a single series, as cross_validation_time_series built them before panels
+    length = int(index.get_loc(test_date))
+    last_index = index[length]
+    validation_range = index.searchsorted(last_index, side='right') - \
+        index.searchsorted(last_index - pd.Timedelta(days=days), side='left') - 1
+
+    cv = [np.arange(length - ((n_splits - i) * validation_range) + 1) for i in range(n_splits)]
+    cv_val = [np.arange(length - ((n_splits - i) * validation_range),
+                        length - ((n_splits - 1 - i) * validation_range) + 1) for i in range(n_splits)]
+    return cv, cv_val
+
+
+def test_cross_validation_single_series_unchanged(csv_path):
+    reader = DataReader(csv_path, **READ_KWARGS)
+
+    for fold, target in zip(reader.cross_validation_time_series(3, 100, '2016-01-01'),
+                            baseline_folds(reader.index, 3, 100, '2016-01-01')):
+        for indexes, target_indexes in zip(fold, target):
+            np.testing.assert_array_equal(indexes, target_indexes)
+
+
+def test_cross_validation_splits_every_series(wide_csv_path):
+    reader = DataReader(wide_csv_path, panel='wide', **READ_KWARGS)
+    cv, cv_val = reader.cross_validation_time_series(3, 100, '2016-01-01')
+    single_cv, single_cv_val = baseline_folds(reader.index[:reader.series_offsets[1]], 3, 100, '2016-01-01')
+
+    for folds, single_folds in [(cv, single_cv), (cv_val, single_cv_val)]:
+        assert len(folds) == 3
+        for fold, single_fold in zip(folds, single_folds):
+            # Every series gets the fold of the single series case, on its own rows
+            for number, (start, stop) in enumerate(reader.segments()):
+                np.testing.assert_array_equal(fold[reader.series[fold] == number], start + single_fold)
+
+
+def test_train_cv_on_panel(tmp_path, wide_csv_path, trainer_kwargs):
+    trainer_kwargs.update(data_path=wide_csv_path, target_column='value', usecols=None, panel='wide')
+    trainer = RNNTrainer(number_steps_train=16, number_steps_predict=4, hidden_size=4, num_layers=1,
+                         cell_type='GRU', **trainer_kwargs)
+
+    score = trainer.train_cv(number_splits=2, days=100, patience=3)
+
+    assert np.isfinite(score)
@@ -0,0 +1,97 @@
+import sys
+
+import pytest
+import torch
+
+from MyPackage.models.RNN.QRNN import CPUForgetMult, ForgetMult, GPUForgetMult, QRNN, QRNNLayer, \
+    cuda_kernel_available
+
+
+def loop_forget_mult(f, x, hidden_init=None):
+    # Reference recurrence, h_t = f_t * x_t + (1 - f_t) * h_{t-1}
+    h = hidden_init if hidden_init is not None else torch.zeros_like(f[0])
+    result = []
+    for t in range(f.size(0)):
+        h = f[t] * x[t] + (1 - f[t]) * h
+        result.append(h)
+    return torch.stack(result)
+
+
+def inputs(seq_len, dtype=torch.float32, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    f = torch.rand(seq_len, 3, 5, generator=generator, dtype=dtype)
+    x = torch.randn(seq_len, 3, 5, generator=generator, dtype=dtype)
+    hidden_init = torch.randn(3, 5, generator=generator, dtype=dtype)
+    return f, x, hidden_init
+
+
+@pytest.mark.parametrize('seq_len', [1, 2, 7, 16, 33])
+@pytest.mark.parametrize('with_hidden', [False, True])
+def test_scan_matches_loop(seq_len, with_hidden):
+    f, x, hidden_init = inputs(seq_len)
+    hidden_init = hidden_init if with_hidden else None
+
+    torch.testing.assert_close(ForgetMult()(f, x, hidden_init), loop_forget_mult(f, x, hidden_init))
+
+
+@pytest.mark.parametrize('with_hidden', [False, True])
+def test_scan_gradcheck(with_hidden):
+    f, x, hidden_init = inputs(9, dtype=torch.float64)
+    arguments = [f.requires_grad_(), x.requires_grad_()]
+    if with_hidden:
+        arguments.append(hidden_init.requires_grad_())
+
+    assert torch.autograd.gradcheck(CPUForgetMult.apply, arguments)
+
+
+def test_scan_is_stable_on_long_sequences():
+    # Forget gates near zero, the running product of (1 - f) underflows long before the end
+    f, x, hidden_init = inputs(4096)
+    f = f * 1e-3
+
+    h = ForgetMult()(f, x, hidden_init)
+    assert torch.isfinite(h).all()
+    torch.testing.assert_close(h, loop_forget_mult(f, x, hidden_init), rtol=1e-4, atol=1e-5)
+
+
+def test_qrnn_sizes():
+    # Layers take batch major inputs, as RNNModel feeds them
+    model = QRNN(2, 6, num_layers=2, kernel_size=2)
+    output, hidden = model(torch.randn(4, 10, 2))
+
+    assert output.shape == (4, 10, 6)
+    assert hidden.shape == (2, 4, 6)
+
+
+def test_no_cuda_kernel_without_cupy(monkeypatch):
+    monkeypatch.setattr(torch.cuda, 'is_available', lambda: True)
+    monkeypatch.setitem(sys.modules, 'cupy', None)
+
+    assert not cuda_kernel_available()
+
+
+def test_cpu_tensors_never_use_the_kernel(monkeypatch):
+    def apply(*args):
+        raise AssertionError('CUDA kernel used on CPU tensors')
+
+    monkeypatch.setattr(ForgetMult, 'use_cuda_kernel', True)
+    monkeypatch.setattr(GPUForgetMult, 'apply', apply)
+    f, x, hidden_init = inputs(5)
+
+    torch.testing.assert_close(ForgetMult()(f, x, hidden_init), loop_forget_mult(f, x, hidden_init))
+
+
+@pytest.mark.parametrize('window', [1, 2, 3])
+def test_layer_is_causal(window):
+    torch.manual_seed(0)
+    layer = QRNNLayer(2, 4, window=window)
+    x = torch.randn(3, 12, 2)
+    changed = x.clone()
+    changed[:, 8:] += 1
+
+    output, hidden = layer(x)
+    changed_output, _ = layer(changed)
+
+    assert output.shape == (3, 12, 4) and hidden.shape == (1, 3, 4)
+    torch.testing.assert_close(changed_output[:, :8], output[:, :8])
+    assert not torch.allclose(changed_output[:, 8:], output[:, 8:])
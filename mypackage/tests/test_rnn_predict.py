@@ -0,0 +1,37 @@
+import pytest
+import torch
+
+from MyPackage.models.RNN.Model import RNNModel
+
+
+def growing_history_predict(model, x, series=None):
+    # Reference forecast, the encoder run again over the whole growing history for every step
+    predictions = []
+    for step in range(model.number_steps_predict):
+        output, _ = model.encoder_cell(x)
+        result = model.output_layer(model.condition(output[:, -1, :], series))
+        x = torch.cat([x, result.unsqueeze(1)], dim=1)
+        predictions.append(result)
+    return torch.stack(predictions, dim=1)[:, :, 0]
+
+
+@pytest.mark.parametrize('cell_type', ['LSTM', 'GRU', 'RNN'])
+@pytest.mark.parametrize('num_layers', [1, 2])
+def test_stateful_decoding_matches_growing_history(cell_type, num_layers):
+    torch.manual_seed(0)
+    model = RNNModel(1, 1, 7, num_layers=num_layers, hidden_size=6, cell_type=cell_type).eval()
+    x = torch.randn(4, 25, 1)
+
+    with torch.no_grad():
+        torch.testing.assert_close(model.predict(x), growing_history_predict(model, x), rtol=1e-5, atol=1e-6)
+
+
+def test_stateful_decoding_with_series_embedding():
+    torch.manual_seed(0)
+    model = RNNModel(1, 1, 5, hidden_size=6, cell_type='GRU', number_series=3).eval()
+    x = torch.randn(4, 25, 1)
+    series = torch.tensor([0, 2, 1, 2])
+
+    with torch.no_grad():
+        torch.testing.assert_close(model.predict(x, series=series), growing_history_predict(model, x, series),
+                                   rtol=1e-5, atol=1e-6)
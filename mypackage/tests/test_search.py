@@ -0,0 +1,101 @@
+import multiprocessing as mp
+import os
+import time
+
+import pytest
+import torch
+
+from skopt.space import Integer
+
+from MyPackage.Search import Search, pin_worker
+
+SPACE = [Integer(0, 20), Integer(0, 10)]
+
+
+def quadratic(params, run_number):
+    return float((params[0] - 7) ** 2 + (params[1] - 3) ** 2)
+
+
+def slow_first(params, run_number):
+    # The initial point keeps its worker busy while the other worker evaluates several points
+    time.sleep(2.0 if list(params) == [0, 0] else 0.05)
+    return quadratic(params, run_number)
+
+
+def failing(params, run_number):
+    raise ValueError('objective failed')
+
+
+def test_sequential_search():
+    result = Search(quadratic, SPACE, n_calls=8, n_random_starts=3, x0=[10, 5], random_state=0, verbose=False).run()
+
+    assert len(result.func_vals) == 8
+    assert list(result.x_iters[0]) == [10, 5]
+    assert result.fun == min(result.func_vals)
+
+
+@pytest.mark.skipif('fork' not in mp.get_all_start_methods(), reason='needs fork')
+def test_parallel_search_is_asynchronous():
+    result = Search(slow_first, SPACE, n_calls=6, n_random_starts=3, x0=[0, 0], n_jobs=2, random_state=0,
+                    verbose=False).run()
+
+    # Points are told as they finish, the slow initial point last
+    assert len(result.func_vals) == 6
+    assert list(result.x_iters[-1]) == [0, 0]
+    # The running points are lied about, so the free worker gets new points
+    assert len(set(tuple(x) for x in result.x_iters)) == 6
+
+
+@pytest.mark.skipif('fork' not in mp.get_all_start_methods(), reason='needs fork')
+def test_parallel_search_raises_objective_errors():
+    with pytest.raises(ValueError, match='objective failed'):
+        Search(failing, SPACE, n_calls=4, n_jobs=2, random_state=0, verbose=False).run()
+
+
+def test_initial_points_and_run_numbers():
+    runs = []
+
+    def record(params, run_number):
+        runs.append((run_number, list(params)))
+        return quadratic(params, run_number)
+
+    result = Search(record, SPACE, n_calls=5, n_random_starts=2, x0=[[10, 5], [1, 1]], random_state=0,
+                    verbose=False).run()
+
+    # Initial points first and counted in n_calls, run numbers in proposal order
+    assert [run_number for run_number, _ in runs] == [1, 2, 3, 4, 5]
+    assert [params for _, params in runs[:2]] == [[10, 5], [1, 1]]
+    assert len(result.func_vals) == 5
+
+
+@pytest.mark.parametrize('n_jobs, cpu_sets', [(2, [{0, 1}, {2, 3}]),
+                                              (3, [{0, 1}, {2}, {3}]),
+                                              (6, [{0}, {1}, {2}, {3}, {0}, {1}])])
+def test_cpu_sets(monkeypatch, n_jobs, cpu_sets):
+    monkeypatch.setattr(os, 'sched_getaffinity', lambda pid: {0, 1, 2, 3}, raising=False)
+
+    assert Search(quadratic, SPACE, n_calls=1, n_jobs=n_jobs).cpu_sets() == cpu_sets
+
+
+def test_pin_worker(monkeypatch):
+    pinned = []
+    monkeypatch.setattr(os, 'sched_setaffinity', lambda pid, cpus: pinned.append(cpus), raising=False)
+    queue = mp.get_context().Queue()
+    queue.put({0, 1})
+
+    threads = torch.get_num_threads()
+    try:
+        pin_worker(queue, 1)
+        assert pinned == [{0, 1}]
+        assert torch.get_num_threads() == 2
+    finally:
+        torch.set_num_threads(threads)
+
+
+def test_pin_worker_without_free_cpus():
+    threads = torch.get_num_threads()
+    try:
+        pin_worker(mp.get_context().Queue(), 1)
+        assert torch.get_num_threads() == 1
+    finally:
+        torch.set_num_threads(threads)
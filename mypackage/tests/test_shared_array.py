@@ -0,0 +1,87 @@
+import multiprocessing as mp
+import pickle
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from MyPackage import DataReader, SharedArray, WindowDataset
+
+
+def checksum(handle):
+    # Worker side, attaches to the published block
+    array = handle.attach()
+    return float(array.sum()), array.flags.writeable
+
+
+def test_round_trip_through_pickle():
+    array = np.random.RandomState(0).randn(1000, 4).astype('float32')
+    handle = SharedArray(array)
+
+    data = pickle.dumps(handle)
+    attached = pickle.loads(data)
+
+    # Only the handle travels, not the array
+    assert len(data) < 1000
+    np.testing.assert_array_equal(attached.attach(), array)
+    assert not attached.attach().flags.writeable
+    attached.close()
+    handle.unlink()
+
+
+def test_workers_attach_to_the_same_memory():
+    array = np.arange(10000, dtype='float64')
+    handle = SharedArray(array)
+
+    with mp.get_context('spawn').Pool(1) as pool:
+        assert pool.apply(checksum, (handle,)) == (float(array.sum()), False)
+
+    # A worker never frees the block of its parent
+    name = handle.name
+    shared_memory.SharedMemory(name=name).close()
+    handle.unlink()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+
+def test_memmap_handle_points_at_the_file(tmp_path):
+    path = str(tmp_path / 'data.npy')
+    np.save(path, np.arange(20, dtype='float32').reshape(5, 4))
+    mapped = np.load(path, mmap_mode='r')
+
+    handle = pickle.loads(pickle.dumps(SharedArray(mapped)))
+
+    assert handle.name is None and handle.path == mapped.filename
+    np.testing.assert_array_equal(handle.attach(), mapped)
+
+
+def test_window_dataset_pickles_handles():
+    data = np.random.RandomState(0).randn(500, 3).astype('float32')
+    handle, labels = SharedArray(data), SharedArray(data[:, 0].copy())
+    dataset = WindowDataset(handle, labels, 10, 3)
+
+    loaded = pickle.loads(pickle.dumps(dataset))
+    positions = np.array([0, 100, 487])
+
+    assert len(pickle.dumps(dataset)) < 2000
+    for value, target in zip(loaded.gather(positions), dataset.gather(positions)):
+        np.testing.assert_array_equal(value, target)
+    handle.unlink()
+    labels.unlink()
+
+
+def test_reader_releases_shared_arrays(csv_path):
+    reader = DataReader(csv_path, index_col=['Date'], parse_dates=True)
+    reader.preprocessing_data(10, 3, 32, '2015-01-01', '2016-01-01', normalizer='Standardization')
+
+    data, labels = reader.share('Power')
+    names = [data.name, labels.name]
+    np.testing.assert_array_equal(data.attach(), reader.normalized_data())
+    assert reader.share('Power')[0] is data
+
+    reader.release_shared()
+
+    assert reader.shared_arrays == {}
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
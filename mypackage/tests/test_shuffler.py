@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from MyPackage import DataReader, Shuffler
+
+
+def epochs(shuffler, length, number_epochs=3):
+    # Copies, the permutation buffer is reused by the next epoch
+    return [shuffler.permutation(length).copy() for _ in range(number_epochs)]
+
+
+@pytest.mark.parametrize('block_size', [None, 8, 7])
+def test_reproducible_from_the_seed(block_size):
+    first = epochs(Shuffler(3, block_size), 100)
+    second = epochs(Shuffler(3, block_size), 100)
+
+    for permutation, again in zip(first, second):
+        np.testing.assert_array_equal(permutation, again)
+        np.testing.assert_array_equal(np.sort(permutation), np.arange(100))
+
+    # Every epoch has its own order
+    assert not np.array_equal(first[0], first[1])
+    assert not np.array_equal(first[0], epochs(Shuffler(4, block_size), 100)[0])
+
+
+def test_global_rng_untouched():
+    np.random.seed(0)
+    expected = np.random.rand(3)
+
+    np.random.seed(0)
+    epochs(Shuffler(3), 100)
+
+    np.testing.assert_array_equal(np.random.rand(3), expected)
+
+
+def test_buffer_is_reused():
+    shuffler = Shuffler(3)
+
+    assert shuffler.permutation(50) is shuffler.permutation(50)
+    assert shuffler.epoch == 2
+
+
+@pytest.mark.parametrize('length', [96, 100, 12])
+def test_blocks_stay_contiguous(length):
+    block_size = 8
+    permutation = Shuffler(3, block_size).permutation(length)
+
+    np.testing.assert_array_equal(np.sort(permutation), np.arange(length))
+    # Positions run in steps of one inside every block, the last block may be partial
+    starts = np.flatnonzero(np.diff(permutation) != 1) + 1
+    blocks = np.split(permutation, starts)
+    assert all(block[0] % block_size == 0 for block in blocks)
+    assert sum(len(block) < block_size for block in blocks) <= 1
+
+
+def test_reader_epochs_follow_the_seed(csv_path):
+    def first_labels(seed):
+        reader = DataReader(csv_path, index_col=['Date'], parse_dates=True, seed=seed)
+        reader.preprocessing_data(10, 3, 32, '2015-01-01', '2016-01-01', normalizer='Standardization')
+        generator = reader.generator_train(32, 'Power')
+        return [next(generator)[1].copy() for _ in range(2 * reader.train_steps)]
+
+    labels = first_labels(5)
+
+    for batch, again in zip(labels, first_labels(5)):
+        np.testing.assert_array_equal(batch, again)
+    assert not np.array_equal(labels[0], first_labels(6)[0])
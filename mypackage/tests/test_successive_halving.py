@@ -0,0 +1,59 @@
+import multiprocessing as mp
+
+import pytest
+import torch
+
+from MyPackage import SuccessiveHalving
+from MyPackage.models import RNNTrainer
+
+
+def test_rungs():
+    pruner = SuccessiveHalving(min_resource=2, reduction_factor=3, max_resource=50)
+
+    assert [resource for resource in range(1, 60) if pruner.is_rung(resource)] == [2, 6, 18]
+
+
+def test_only_the_best_trials_continue():
+    pruner = SuccessiveHalving(min_resource=1, reduction_factor=2)
+
+    # The first trial at a rung has nothing to compare with
+    assert not pruner.report(1, 0.5)
+    assert pruner.report(1, 0.9)
+    assert not pruner.report(1, 0.1)
+    # Losses between rungs are not recorded
+    assert not pruner.report(3, 100.)
+    assert dict(pruner.rungs) == {1: [0.5, 0.9, 0.1]}
+
+
+def report(pruner, loss):
+    return pruner.report(1, loss)
+
+
+def test_rungs_shared_between_processes():
+    with mp.Manager() as manager:
+        pruner = SuccessiveHalving(reduction_factor=2, manager=manager)
+        with mp.get_context().Pool(2) as pool:
+            pool.starmap(report, [(pruner, loss) for loss in [0.1, 0.2, 0.3, 0.4]])
+
+        assert sorted(pruner.rungs[1]) == [0.1, 0.2, 0.3, 0.4]
+        assert pruner.report(1, 0.9)
+
+
+@pytest.mark.parametrize('stop_at, folds', [(None, 3), (3, 2)])
+def test_train_cv_reports_and_prunes(trainer_kwargs, stop_at, folds):
+    trainer_kwargs.update(num_epoch=2)
+    torch.manual_seed(0)
+    trainer = RNNTrainer(number_steps_train=16, number_steps_predict=4, hidden_size=4, num_layers=1,
+                         cell_type='GRU', **trainer_kwargs)
+    resources = []
+
+    def callback(resource, loss):
+        resources.append(resource)
+        return resource == stop_at
+
+    score = trainer.train_cv(number_splits=3, days=100, patience=3, callback=callback, pruned_score=1e4)
+
+    # Epochs counted over the folds, as if every fold ran num_epoch epochs
+    assert resources == [1, 2, 3, 4, 5, 6][:2 * folds - (stop_at is not None)]
+    assert trainer.pruned is (stop_at is not None)
+    assert (score == 1e4) == trainer.pruned
@@ -0,0 +1,53 @@
+import pytest
+import torch
+
+from MyPackage.models.RNN.Model import RNNModel
+
+
+def window_predict(model, x):
+    # Reference forecast, the model run again over the last seq_len inputs for every step
+    predictions = []
+    seq_len = x.shape[1]
+    for step in range(model.number_steps_predict):
+        output, _ = model.encoder_cell(x[:, -seq_len:, :])
+        result = model.output_layer(output[:, -1, :])
+        x = torch.cat([x, result.unsqueeze(1)], dim=1)
+        predictions.append(result)
+    return torch.stack(predictions, dim=1)[:, :, 0]
+
+
+def tcn_model(num_layers, kernel_size, number_steps_predict=6):
+    torch.manual_seed(0)
+    model = RNNModel(1, 1, number_steps_predict, kernel_size, num_layers, hidden_size=8, cell_type='TCN')
+    return model.eval()
+
+
+def test_step_matches_forward():
+    model = tcn_model(num_layers=3, kernel_size=3)
+    x = torch.randn(4, 30, 1)
+
+    full, _ = model.encoder_cell(x)
+    output, state = model.encoder_cell.encode(x[:, :10])
+    steps = [output]
+    for t in range(10, 30):
+        output_t, state = model.encoder_cell.step(x[:, t], state)
+        steps.append(output_t.unsqueeze(1))
+
+    torch.testing.assert_close(torch.cat(steps, dim=1), full, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize('num_layers, kernel_size, seq_len', [(3, 3, 40),   # streamed, receptive field 29
+                                                              (3, 3, 29),   # streamed, receptive field == seq_len
+                                                              (4, 3, 20),   # window loop, receptive field 61
+                                                              (5, 4, 20)])  # window loop, receptive field 187
+def test_predict_matches_window_loop(num_layers, kernel_size, seq_len):
+    model = tcn_model(num_layers, kernel_size)
+    x = torch.randn(4, seq_len, 1)
+
+    with torch.no_grad():
+        torch.testing.assert_close(model.predict(x), window_predict(model, x), rtol=1e-5, atol=1e-6)
+
+
+def test_receptive_field():
+    model = tcn_model(num_layers=3, kernel_size=3)
+    assert model.encoder_cell.receptive_field == 1 + 2 * 2 * (1 + 2 + 4)
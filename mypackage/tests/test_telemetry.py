@@ -0,0 +1,70 @@
+import threading
+
+import numpy as np
+import torch
+
+from MyPackage import FileLogger, Telemetry
+
+
+class FakeWriter(object):
+    # Stands in for the TensorBoard SummaryWriter, fails on the tag 'broken'
+    def __init__(self):
+        self.scalars = []
+        self.threads = set()
+        self.closed = False
+
+    def add_scalar(self, tag, value, step):
+        self.threads.add(threading.current_thread())
+        if tag == 'broken':
+            raise ValueError('write failed')
+        self.scalars.append((tag, value, step))
+
+    def close(self):
+        self.closed = True
+
+
+def make_telemetry(tmp_path):
+    filelogger = FileLogger(str(tmp_path), 'run', None, True)
+    filelogger.start()
+    return Telemetry(FakeWriter(), filelogger), filelogger
+
+
+def test_records_written_in_order_by_the_writer_thread(tmp_path):
+    telemetry, filelogger = make_telemetry(tmp_path)
+
+    telemetry.add_scalar('lr', 0.1, 0)
+    for step in range(5):
+        telemetry.log('Train loss', 'train_log', step, 0, step, torch.tensor(step / 10.))
+    telemetry.close()
+
+    writer = telemetry.tensorboard
+    assert writer.closed
+    assert threading.main_thread() not in writer.threads
+    assert writer.scalars[0] == ('lr', 0.1, 0)
+    assert [scalar[0] for scalar in writer.scalars[1:]] == ['Train loss'] * 5
+    # Tensors are converted to floats by the writer
+    assert all(type(scalar[1]) is float for scalar in writer.scalars)
+
+    train = filelogger.read_files('train_log')
+    np.testing.assert_array_equal(train['Step'], np.arange(5))
+    np.testing.assert_allclose(train['Loss'], np.arange(5) / 10., rtol=1e-6)
+
+
+def test_failed_writes_do_not_stop_the_writer(tmp_path):
+    telemetry, filelogger = make_telemetry(tmp_path)
+
+    telemetry.add_scalar('broken', 1., 0)
+    telemetry.log('Validation loss', 'valid_log', 0, 0, 0, 0.5)
+    telemetry.close()
+
+    assert telemetry.tensorboard.scalars == [('Validation loss', 0.5, 0)]
+    np.testing.assert_allclose(filelogger.read_files('valid_log')['Loss'], [0.5])
+
+
+def test_close_twice(tmp_path):
+    telemetry, _ = make_telemetry(tmp_path)
+
+    telemetry.close()
+    telemetry.close()
+
+    assert not telemetry.thread.is_alive()
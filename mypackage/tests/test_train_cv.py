@@ -0,0 +1,48 @@
+import multiprocessing as mp
+
+import pytest
+import torch
+
+from MyPackage.models import RNNTrainer
+
+
+def make_trainer(trainer_kwargs):
+    torch.manual_seed(0)
+    return RNNTrainer(number_steps_train=16, number_steps_predict=4, hidden_size=4, num_layers=1,
+                      cell_type='GRU', **trainer_kwargs)
+
+
+@pytest.fixture
+def optimizers(monkeypatch):
+    # The optimizer every fold trained with, fit only records it
+    seen = []
+
+    def fit(self, patience, leave=True, callback=None):
+        seen.append(id(self.model_optimizer))
+        return 1.0, False
+
+    monkeypatch.setattr(RNNTrainer, 'fit', fit)
+    return seen
+
+
+def test_sequential_folds_keep_the_optimizer(optimizers, trainer_kwargs):
+    trainer = make_trainer(trainer_kwargs)
+    optimizer = trainer.model_optimizer
+
+    assert trainer.train_cv(number_splits=3, days=100, patience=3) == 1.0
+    assert optimizers == [id(optimizer)] * 3
+    assert trainer.model_optimizer is optimizer
+
+
+def test_forked_fold_resets_the_optimizer(optimizers, trainer_kwargs):
+    trainer = make_trainer(trainer_kwargs)
+    optimizer = trainer.model_optimizer
+    cv_train, cv_val = trainer.datareader.cross_validation_time_series(3, 100, trainer.test_date)
+
+    queue = mp.get_context().Queue()
+    trainer.run_fold(queue, 0, cv_train[0], cv_val[0], 3, None, torch.get_num_threads())
+
+    assert queue.get(timeout=10) == (0, 1.0, False, None)
+    assert trainer.model_optimizer is not optimizer
+    assert optimizers == [id(trainer.model_optimizer)]
+    assert trainer.model_optimizer.defaults == optimizer.defaults
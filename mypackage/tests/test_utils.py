@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from MyPackage import mean_predictions
+
+
+def loop_mean_predictions(predicted):
+    # The original implementation, one list of predictions per step
+    array_global = [[] for _ in range((predicted.shape[0] + predicted.shape[1]))]
+
+    for i in range(predicted.shape[0]):
+        for l, value in enumerate(predicted[i]):
+            array_global[i + l].append((float(value)))
+
+    return [np.array(array_global[i]).mean() for i in range(len(array_global) - 1)]
+
+
+@pytest.mark.parametrize('shape', [(1, 1), (1, 5), (7, 1), (20, 4), (3, 8)])
+def test_matches_loop(shape):
+    predicted = np.random.RandomState(0).randn(*shape).astype('float32')
+
+    means = mean_predictions(predicted)
+
+    assert isinstance(means, np.ndarray)
+    np.testing.assert_allclose(means, loop_mean_predictions(predicted), rtol=1e-12)
+
+
+def test_overlapping_steps_are_averaged():
+    predicted = np.array([[1., 2., 3.],
+                          [4., 5., 6.]])
+
+    np.testing.assert_allclose(mean_predictions(predicted), [1., 3., 4., 6.])
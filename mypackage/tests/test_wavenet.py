@@ -0,0 +1,41 @@
+import pytest
+import torch
+
+from MyPackage.models.wavenet.WaveNetContinuos import WaveNetModelContinuos
+
+
+def wavenet_model(number_steps_predict=6, dilation_depth=3, n_repeat=2, number_series=None):
+    torch.manual_seed(0)
+    model = WaveNetModelContinuos(1, number_steps_predict, n_residue=4, n_skip=8, dilation_depth=dilation_depth,
+                                  n_repeat=n_repeat, number_series=number_series)
+    model.calculate_receptive_field(number_steps_predict)
+    return model.eval()
+
+
+@pytest.mark.parametrize('dilation_depth, n_repeat, extra', [(3, 2, 0), (3, 2, 9), (4, 1, 3)])
+def test_incremental_matches_full_forward(dilation_depth, n_repeat, extra):
+    model = wavenet_model(dilation_depth=dilation_depth, n_repeat=n_repeat)
+    x = torch.randn(3, model.receptive_field + extra, 1)
+
+    with torch.no_grad():
+        torch.testing.assert_close(model.predict(x), model.predict(x, incremental=False), rtol=1e-5, atol=1e-6)
+
+
+def test_incremental_with_series_embedding():
+    model = wavenet_model(number_series=3)
+    x = torch.randn(3, model.receptive_field, 1)
+    series = torch.tensor([2, 0, 1])
+
+    with torch.no_grad():
+        torch.testing.assert_close(model.predict(x, series=series),
+                                   model.predict(x, incremental=False, series=series), rtol=1e-5, atol=1e-6)
+
+
+def test_incremental_horizon():
+    model = wavenet_model()
+    x = torch.randn(3, model.receptive_field, 1)
+
+    with torch.no_grad():
+        predictions = model.predict(x)
+        assert predictions.shape == (3, 6)
+        torch.testing.assert_close(model.predict(x, number_steps_predict=2), predictions[:, :2])
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from MyPackage import DataReader, WindowDataset
+
+READ_KWARGS = dict(index_col=['Date'], parse_dates=True)
+LOOK_BACK, LOOK_FURTHER, BATCH_SIZE = 10, 3, 32
+
+
+def baseline_test_batches(reader, csv_path, target):
+    # The test windows as the original generator built them, one DataFrame slice per sample
+    data = pd.read_csv(csv_path, **READ_KWARGS)
+    column = list(data.columns).index(target)
+    mean, scale = reader.normalizer.mean_[column], reader.normalizer.scale_[column]
+
+    batches_x, batches_y = [], []
+    for position in reader.test_indexes[:-LOOK_FURTHER] - LOOK_BACK:
+        batches_x.append(reader.normalizer.transform(data.iloc[position:position + LOOK_BACK].values))
+        batches_y.append((data[target].iloc[position + LOOK_BACK:position + LOOK_BACK + LOOK_FURTHER].values
+                          - mean) / scale)
+
+    return np.array(batches_x, dtype='float32'), np.array(batches_y, dtype='float32')
+
+
+@pytest.mark.parametrize('reuse_buffer', [False, True])
+def test_generator_matches_baseline_windows(csv_path, reuse_buffer):
+    reader = DataReader(csv_path, **READ_KWARGS)
+    reader.preprocessing_data(LOOK_BACK, LOOK_FURTHER, BATCH_SIZE, '2015-01-01', '2016-01-01',
+                              normalizer='Standardization')
+    target_x, target_y = baseline_test_batches(reader, csv_path, 'Power')
+
+    generator = reader.generator_test(BATCH_SIZE, 'Power', reuse_buffer=reuse_buffer)
+    batches_x, batches_y = [], []
+    while sum(len(batch) for batch in batches_x) < len(target_x):
+        batch_x, batch_y = next(generator)
+        # Copies, reused buffers are overwritten by the next batch
+        batches_x.append(np.array(batch_x))
+        batches_y.append(np.array(batch_y))
+
+    np.testing.assert_allclose(np.concatenate(batches_x), target_x, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(np.concatenate(batches_y), target_y, rtol=1e-5, atol=1e-6)
+
+
+def make_dataset(series=False):
+    rng = np.random.RandomState(0)
+    data = rng.randn(100, 3)
+    ids = np.repeat(np.arange(2), 50) if series else None
+    return WindowDataset(data, data[:, 1], LOOK_BACK, LOOK_FURTHER, series=ids)
+
+
+def test_windows_are_views():
+    dataset = make_dataset()
+
+    assert len(dataset) == 100 - LOOK_BACK - LOOK_FURTHER + 1
+    assert np.shares_memory(dataset.windows_x, dataset.data)
+    assert np.shares_memory(dataset.windows_y, dataset.labels)
+    np.testing.assert_array_equal(dataset.windows_x[5], dataset.data[5:5 + LOOK_BACK])
+    np.testing.assert_array_equal(dataset.windows_y[5], dataset.labels[5 + LOOK_BACK:5 + LOOK_BACK + LOOK_FURTHER])
+
+
+@pytest.mark.parametrize('series', [False, True])
+def test_gather_into_buffers(series):
+    dataset = make_dataset(series)
+    out = dataset.allocate(8)
+    positions = np.array([0, 3, 7, 50, len(dataset) - 1])
+
+    batch = dataset.gather(positions, out=out)
+
+    # Written into the preallocated buffers, with the values of the allocating gather
+    for value, buffer, target in zip(batch, out[:2] + out[4:], dataset.gather(positions)):
+        assert np.shares_memory(value, buffer)
+        np.testing.assert_array_equal(value, target)
+
+
+def test_gather_rejects_positions_out_of_range():
+    dataset = make_dataset()
+
+    with pytest.raises(IndexError):
+        dataset.gather(np.array([0, len(dataset)]), out=dataset.allocate(2))
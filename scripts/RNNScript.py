@@ -1,41 +1,41 @@
 import warnings, os, argparse, sys
+import multiprocessing as mp
 
-from skopt import gp_minimize
 from skopt.space import Integer
 
 warnings.filterwarnings("ignore")
 
+from MyPackage import SuccessiveHalving
+from MyPackage.Search import Search
 from MyPackage.models import RNNTrainer
 
-global run_number
 
 
-def objective(params):
+def objective(params, run_number):
     try:
-        model = get_model(params)
-        scores = model.train_cv(args.folds, args.fold_size, args.patience)
+        model = get_model(params, run_number)
+        scores = model.train_cv(args.folds, args.fold_size, args.patience,
+                                callback=pruner.report if pruner is not None else None,
+                                n_jobs=args.fold_jobs)
         return scores
 
     except:
         return 10000.0
 
 
-def get_model(params):
+def get_model(params, run_number):
     x, y, z, k = params
     number_steps_train = int(x)
     hidden_size = int(y)
     num_layers = int(z)
     kernel_size = int(k)
 
-    global run_number
-    run_number = run_number + 1
-
     model = RNNTrainer(data_path=args.data_path,
                        logger_path=path,
                        model_name='Run_number_' + str(run_number),
                        lr=args.lr,
                        number_steps_train=number_steps_train,
-                       number_steps_predict=args.predict_steps,
+                       number_steps_predict=horizon,
                        batch_size=args.batch_size,
                        num_epoch=args.epochs,
                        hidden_size=hidden_size,
@@ -51,8 +51,11 @@ def get_model(params):
                        target_column='Power',
                        validation_date='2015-01-01 00:00:00',
                        test_date='2016-01-01 00:00:00',
+                       cache_dir=args.cache_dir,
                        index_col=['Date'],
-                       parse_dates=True)
+                       parse_dates=True,
+                       use_direct_head=args.direct_head,
+                       mixed_precision=args.mixed_precision)
 
     return model
 
@@ -64,6 +67,8 @@ if __name__ == "__main__":
                         help='Main Folder to save all files')
     parser.add_argument('--data_path', default='/datadrive/wind_power/data/wind_15min.csv', type=str,
                         help='path for data file')
+    parser.add_argument('--cache_dir', default=None, type=str,
+                        help='Directory for the binary cache of the parsed data file')
     parser.add_argument('--file', default='runs', type=str,
                         help='Directory to store files')
     parser.add_argument('--folds', default=3, type=int,
@@ -104,6 +109,14 @@ if __name__ == "__main__":
                         help='Number of calls for optmization')
     parser.add_argument('--RANDOM_STARTS', default=10, type=int,
                         help='Number of random starts for optimization')
+    parser.add_argument('--n_jobs', default=1, type=int,
+                        help='Number of optimization points evaluated in parallel, each on its own CPU subset')
+    parser.add_argument('--fold_jobs', default=1, type=int,
+                        help='Number of cross validation folds trained in parallel, when n_jobs is 1')
+    parser.add_argument('--prune', default=False, type=bool,
+                        help='Flag to stop unpromising optimization points early with successive halving')
+    parser.add_argument('--reduction_factor', default=3, type=int,
+                        help='Only 1 / reduction_factor of the points keep training at each successive halving rung')
     parser.add_argument('--optimizer', default='Adam', type=str,
                         choices=['Adam', 'SGD', 'RMSProp', 'Adadelta', 'Adagrad'],
                         help='Optimizer to use')
@@ -111,6 +124,10 @@ if __name__ == "__main__":
                         help='Number of steps to stop train loop after no improvment in validation set')
     parser.add_argument('--steps_to_predict', type=int, default=[4, 24, 96], nargs=3,
                         help='Steps for predict using best model after optimization')
+    parser.add_argument('--direct_head', default=False, type=bool,
+                        help='Flag to predict all steps in one forward pass with a direct multi-horizon head')
+    parser.add_argument('--mixed_precision', default=False, type=bool,
+                        help='Flag to train and predict with bfloat16 autocast, weights stay in float32')
 
 
     args = parser.parse_args()
@@ -126,7 +143,15 @@ if __name__ == "__main__":
     NCALLS = args.N_CALLS
     NRANDOMSTARTS = args.RANDOM_STARTS
 
-    run_number = 0
+    pruner = None
+    if args.prune:
+        # rungs shared by the search and fold workers
+        pruner = SuccessiveHalving(reduction_factor=args.reduction_factor,
+                                   max_resource=args.folds * args.epochs,
+                                   manager=mp.Manager() if args.n_jobs > 1 or args.fold_jobs > 1 else None)
+
+    # A direct head is trained for the longest horizon and serves all of steps_to_predict
+    horizon = max(args.steps_to_predict) if args.direct_head else args.predict_steps
 
     if args.model in ['TCN', 'QRNN']:
         space = [Integer(args.train_steps[0], args.train_steps[1]),  # number_steps_train
@@ -141,13 +166,14 @@ if __name__ == "__main__":
                  Integer(10, 11)]                                    # kernel_size
         initial_point = args.initial_point
 
-    res_gp = gp_minimize(objective,
-                         space,
-                         x0=initial_point,
-                         n_calls=NCALLS,
-                         random_state=SEED,
-                         verbose=True,
-                         n_random_starts=NRANDOMSTARTS)
+    res_gp = Search(objective,
+                    space,
+                    x0=initial_point,
+                    n_calls=NCALLS,
+                    random_state=SEED,
+                    verbose=True,
+                    n_random_starts=NRANDOMSTARTS,
+                    n_jobs=args.n_jobs).run()
 
     best_number_steps_train = int(res_gp.x[0])
     best_hidden_size = int(res_gp.x[1])
@@ -163,7 +189,7 @@ if __name__ == "__main__":
                        model_name='Run_Best_Model',
                        lr=args.lr,
                        number_steps_train=best_number_steps_train,
-                       number_steps_predict=args.predict_steps,
+                       number_steps_predict=horizon,
                        batch_size=args.batch_size,
                        num_epoch=args.epochs,
                        hidden_size=best_hidden_size,
@@ -179,11 +205,26 @@ if __name__ == "__main__":
                        target_column='Power',
                        validation_date='2015-01-01 00:00:00',
                        test_date='2016-01-01 00:00:00',
+                       cache_dir=args.cache_dir,
                        index_col=['Date'],
-                       parse_dates=True)
+                       parse_dates=True,
+                       use_direct_head=args.direct_head,
+                       mixed_precision=args.mixed_precision)
 
     model.train(args.patience)
 
+    if args.direct_head:
+        # one model for all horizons, only the test windows change
+        model.get_best(path + '/Run_Best_Model')
+
+        for range in args.steps_to_predict:
+            model.filelogger.start('Best_Model_Predictions_' + str(range))
+            predictions, labels = model.predict(number_steps_predict=range)
+            final_df, mse, mae = model.postprocess(predictions, labels)
+            model.filelogger.write_results(predictions, labels, final_df, mse, mae)
+
+        sys.exit()
+
     for range in args.steps_to_predict:
 
         model = RNNTrainer(data_path=args.data_path,
@@ -207,6 +248,7 @@ if __name__ == "__main__":
                            target_column='Power',
                            validation_date='2015-01-01 00:00:00',
                            test_date='2016-01-01 00:00:00',
+                           cache_dir=args.cache_dir,
                            index_col=['Date'],
                            parse_dates=True)
 
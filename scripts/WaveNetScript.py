@@ -1,33 +1,33 @@
 import warnings, os, argparse, sys
+import multiprocessing as mp
 
-from skopt import gp_minimize
 from skopt.space import Integer
 
 warnings.filterwarnings("ignore")
 
+from MyPackage import SuccessiveHalving
+from MyPackage.Search import Search
 from MyPackage.models import WaveNetContinuosTrainer
 
-global run_number
 
-def objective(params):
+def objective(params, run_number):
     try:
-        model = get_model(params)
-        scores = model.train_cv(args.folds, args.fold_size, args.patience)
+        model = get_model(params, run_number)
+        scores = model.train_cv(args.folds, args.fold_size, args.patience,
+                                callback=pruner.report if pruner is not None else None,
+                                n_jobs=args.fold_jobs)
         return scores
     except:
         return 10000.0
 
 
-def get_model(params):
+def get_model(params, run_number):
     x, y, z, k = params
     num_residue = int(x)
     num_skip = int(y)
     dilation_depth = int(z)
     num_repeat = int(k)
 
-    global run_number
-    run_number = run_number + 1
-
     model = WaveNetContinuosTrainer(data_path=args.data_path,
                                     logger_path=path,
                                     model_name='Run_number_' + str(run_number),
@@ -35,7 +35,7 @@ def get_model(params):
                                     n_skip=num_skip,
                                     dilation_depth=dilation_depth,
                                     n_repeat=num_repeat,
-                                    number_steps_predict=args.predict_steps,
+                                    number_steps_predict=horizon,
                                     lr=args.lr,
                                     batch_size=args.batch_size,
                                     num_epoch=args.epochs,
@@ -47,8 +47,11 @@ def get_model(params):
                                     valid_log_interval=args.valid_log,
                                     validation_date='2015-01-01 00:00:00',
                                     test_date='2016-01-01 00:00:00',
+                                    cache_dir=args.cache_dir,
                                     index_col=['Date'],
-                                    parse_dates=True)
+                                    parse_dates=True,
+                                    use_direct_head=args.direct_head,
+                                    mixed_precision=args.mixed_precision)
 
     return model
 
@@ -59,6 +62,8 @@ if __name__ == "__main__":
                         help='Main Folder to save all files')
     parser.add_argument('--data_path', default='/datadrive/wind_power/data/wind_15min.csv', type=str,
                         help='path for data file')
+    parser.add_argument('--cache_dir', default=None, type=str,
+                        help='Directory for the binary cache of the parsed data file')
     parser.add_argument('--file', default='runs', type=str,
                         help='Directory to store files')
     parser.add_argument('--folds', default=3, type=int,
@@ -96,11 +101,25 @@ if __name__ == "__main__":
                         help='Number of calls for optmization')
     parser.add_argument('--RANDOM_STARTS', default=10, type=int,
                         help='Number of random starts for optimization')
+    parser.add_argument('--n_jobs', default=1, type=int,
+                        help='Number of optimization points evaluated in parallel, each on its own CPU subset')
+    parser.add_argument('--fold_jobs', default=1, type=int,
+                        help='Number of cross validation folds trained in parallel, when n_jobs is 1')
+    parser.add_argument('--prune', default=False, type=bool,
+                        help='Flag to stop unpromising optimization points early with successive halving')
+    parser.add_argument('--reduction_factor', default=3, type=int,
+                        help='Only 1 / reduction_factor of the points keep training at each successive halving rung')
     parser.add_argument('--optimizer' ,default='Adam', type=str,
                         choices=['Adam', 'SGD', 'RMSProp', 'Adadelta', 'Adagrad'],
                         help='Optimizer to use')
     parser.add_argument('--patience', default=3, type=int,
                         help='Number of steps to stop train loop after no improvment in validation set')
+    parser.add_argument('--steps_to_predict', type=int, default=[4, 24, 96], nargs=3,
+                        help='Steps for predict using best model after optimization, with direct_head')
+    parser.add_argument('--direct_head', default=False, type=bool,
+                        help='Flag to predict all steps in one forward pass with a direct multi-horizon head')
+    parser.add_argument('--mixed_precision', default=False, type=bool,
+                        help='Flag to train and predict with bfloat16 autocast, weights stay in float32')
 
     args = parser.parse_args()
 
@@ -115,7 +134,15 @@ if __name__ == "__main__":
     NCALLS = args.N_CALLS
     NRANDOMSTARTS = args.RANDOM_STARTS
 
-    run_number = 0
+    # A direct head is trained for the longest horizon and serves all of steps_to_predict
+    horizon = max(args.steps_to_predict) if args.direct_head else args.predict_steps
+
+    pruner = None
+    if args.prune:
+        # rungs shared by the search and fold workers
+        pruner = SuccessiveHalving(reduction_factor=args.reduction_factor,
+                                   max_resource=args.folds * args.epochs,
+                                   manager=mp.Manager() if args.n_jobs > 1 or args.fold_jobs > 1 else None)
 
     space = [Integer(args.num_residue[0], args.num_residue[1]),# number_steps_train
              Integer(args.num_skip[0], args.num_skip[1]), # hidden_size
@@ -124,13 +151,14 @@ if __name__ == "__main__":
 
     initial_point = args.initial_point
 
-    res_gp = gp_minimize(objective,
-                         space,
-                         x0=initial_point,
-                         n_calls=NCALLS,
-                         random_state=SEED,
-                         verbose=True,
-                         n_random_starts=NRANDOMSTARTS)
+    res_gp = Search(objective,
+                    space,
+                    x0=initial_point,
+                    n_calls=NCALLS,
+                    random_state=SEED,
+                    verbose=True,
+                    n_random_starts=NRANDOMSTARTS,
+                    n_jobs=args.n_jobs).run()
 
     best_num_residue = int(res_gp.x[0])
     best_num_skip = int(res_gp.x[1])
@@ -144,7 +172,7 @@ if __name__ == "__main__":
                                     n_skip=best_num_skip,
                                     dilation_depth=best_dilation_depth,
                                     n_repeat=best_num_repeat,
-                                    number_steps_predict=args.predict_steps,
+                                    number_steps_predict=horizon,
                                     lr=args.lr,
                                     batch_size=args.batch_size,
                                     num_epoch=args.epochs,
@@ -156,11 +184,25 @@ if __name__ == "__main__":
                                     valid_log_interval=args.valid_log,
                                     validation_date='2015-01-01 00:00:00',
                                     test_date='2016-01-01 00:00:00',
+                                    cache_dir=args.cache_dir,
                                     index_col=['Date'],
-                                    parse_dates=True)
+                                    parse_dates=True,
+                                    use_direct_head=args.direct_head,
+                                    mixed_precision=args.mixed_precision)
 
     model.train(args.patience)
     model.get_best()
+
+    if args.direct_head:
+        # one model for all horizons, only the test windows change
+        for range in args.steps_to_predict:
+            model.filelogger.start('Best_Model_Predictions_' + str(range))
+            predictions, labels = model.predict(number_steps_predict=range)
+            final_df, mse, mae = model.postprocess(predictions, labels)
+            model.filelogger.write_results(predictions, labels, final_df, mse, mae)
+
+        sys.exit()
+
     predictions, labels = model.predict()
     final_df, mse, mae = model.postprocess(predictions, labels)
     model.filelogger.write_results(predictions, labels, final_df, mse, mae)